@@ -0,0 +1,99 @@
+"""
+Index build time of the VectorSpaceModel with 1..n worker processes.
+
+CISI.ALL is replicated ``scale`` times into a temporary file (document ids
+renumbered, so every copy is a distinct set of documents) and indexed with
+the serial reader and with open_and_read(processes=p) for p = 2, 4, ... up
+to the number of CPUs. Every parallel index is checked against the serial
+one (term order, postings, positions and document norms).
+
+Workers return their partial index as flat arrays (compact_postings), so
+sending it costs little; the parent still merges the ranges and computes the
+norms alone. A parallel build is only faster than the serial one with free
+CPUs for the workers; on a single CPU it is slower by the cost of the
+process pool and the transfer, which is why processes=1 stays the default.
+
+The default scale of 100 needs several GB of memory for the Python posting
+objects; use a smaller scale on small machines.
+
+Usage: python benchmarks/bench_parallel_build.py [scale] [max processes]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "ir_systems"))
+
+from vec_space_model import VectorSpaceModel  # noqa: E402
+
+COLLECTION_FILE = os.path.join(ROOT, "cisi", "CISI.ALL")
+
+
+def replicate_collection(target, scale):
+    """Writes scale copies of CISI.ALL to target, renumbering the .I lines consecutively."""
+    with open(COLLECTION_FILE, "r") as file:
+        lines = file.readlines()
+    doc_id = 0
+    with open(target, "w") as file:
+        for _ in range(scale):
+            for line in lines:
+                if line.startswith(".I"):
+                    doc_id += 1
+                    line = f".I {doc_id}\n"
+                file.write(line)
+    return doc_id
+
+
+def index_summary(model):
+    vocabulary = model.vocabulary
+    postinglists = model.postinglists
+    return ([(term, vocabulary.occurences[term_id], postinglists[term_id].get_postinglist(),
+              [postinglists[term_id].get_positions_in_document(doc_id).tolist()
+               for doc_id in postinglists[term_id].get_postinglist()])
+             for term, term_id in vocabulary.items()],
+            list(model.doc_id_length_mapping.items()),
+            list(model.document_vector_length.items()))
+
+
+def build(file_path, processes):
+    model = VectorSpaceModel()
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.open_and_read(file_path, processes=processes)
+    return model, time.perf_counter() - start_time
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    max_processes = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    process_counts = [1]
+    while process_counts[-1] * 2 <= max_processes:
+        process_counts.append(process_counts[-1] * 2)
+    if process_counts[-1] != max_processes:
+        process_counts.append(max_processes)
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "CISI.ALL")
+        number_of_documents = replicate_collection(file_path, scale)
+        print(f"{scale} x CISI: {number_of_documents} documents, {os.path.getsize(file_path) / 2 ** 20:.1f} MiB, "
+              f"{os.cpu_count()} CPUs\n")
+
+        serial, serial_time = build(file_path, 1)
+        reference = index_summary(serial)
+        del serial
+
+        print(f"{'processes':>9} | {'build s':>8} | {'speedup':>7} | identical")
+        print(f"{1:>9} | {serial_time:>8.2f} | {1.0:>7.2f} | -")
+        for processes in process_counts[1:]:
+            model, elapsed = build(file_path, processes)
+            identical = index_summary(model) == reference
+            del model
+            print(f"{processes:>9} | {elapsed:>8.2f} | {serial_time / elapsed:>7.2f} | {identical}")
+
+
+if __name__ == '__main__':
+    main()
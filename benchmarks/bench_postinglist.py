@@ -0,0 +1,85 @@
+"""
+Memory and decode throughput of Postinglist vs. CompactPostinglist on CISI.
+
+Memory of Postinglist objects is measured as their deep size (the slotted
+objects with their doc id, offset and position arrays, see
+ir_common.memory.deep_getsizeof). The compact variant is measured as the
+shared CompactPostingStore plus one slotted view object per term.
+
+Usage: python benchmarks/bench_postinglist.py
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "ir_systems"))
+
+from postinglist import CompactPostingStore  # noqa: E402
+from vec_space_model import VectorSpaceModel  # noqa: E402
+from ir_common.memory import deep_getsizeof  # noqa: E402
+
+COLLECTION_FILE = os.path.join(ROOT, "cisi", "CISI.ALL")
+REPETITIONS = 5
+
+
+def decode_throughput(postinglists):
+    """Postings per second for get_postinglist + get_positions_in_document over all lists."""
+    best = float("inf")
+    postings = 0
+    for _ in range(REPETITIONS):
+        postings = 0
+        start_time = time.perf_counter()
+        for postinglist in postinglists:
+            for doc_id in postinglist.get_postinglist():
+                postinglist.get_positions_in_document(doc_id)
+                postings += 1
+        best = min(best, time.perf_counter() - start_time)
+    return postings / best
+
+
+def block_throughput(postinglists):
+    """Postings per second when decoding doc ids and term frequencies block by block."""
+    best = float("inf")
+    postings = 0
+    for _ in range(REPETITIONS):
+        postings = 0
+        start_time = time.perf_counter()
+        for postinglist in postinglists:
+            for docs, _ in postinglist.iter_blocks():
+                postings += len(docs)
+        best = min(best, time.perf_counter() - start_time)
+    return postings / best
+
+
+def main():
+    model = VectorSpaceModel()
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.open_and_read(COLLECTION_FILE)
+    postinglists = model.postinglists
+    terms = [postinglist.term for postinglist in postinglists]
+    number_of_postings = sum(len(postinglist) for postinglist in postinglists)
+    number_of_positions = sum(len(postinglist.positions) for postinglist in postinglists)
+    print(f"{len(postinglists)} posting lists, {number_of_postings} postings, {number_of_positions} positions\n")
+
+    seen = set(id(term) for term in terms)
+    size = sum(deep_getsizeof(postinglist, seen) for postinglist in postinglists)
+    rows = [("Postinglist", size, decode_throughput(postinglists), None)]
+    for compression in (None, "varint"):
+        store = CompactPostingStore(postinglists, compression)
+        compact_lists = store.postinglists(terms)
+        size = store.nbytes() + sum(sys.getsizeof(compact_list) for compact_list in compact_lists)
+        rows.append((f"CompactPostinglist ({compression or 'uint32'})", size, decode_throughput(compact_lists),
+                     block_throughput(compact_lists)))
+
+    print(f"{'representation':<30} | {'bytes':>10} | {'bytes/posting':>13} | {'lookup postings/s':>17} | "
+          f"{'block postings/s':>16}")
+    for name, size, lookup, blocks in rows:
+        blocks = f"{blocks:>16,.0f}" if blocks is not None else f"{'-':>16}"
+        print(f"{name:<30} | {size:>10,} | {size / number_of_postings:>13.1f} | {lookup:>17,.0f} | {blocks}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+End-to-end benchmark of the VectorSpaceModel and the boolean QueryProcessor.
+
+For every scale a synthetic Zipfian collection of scale x CISI is generated
+(see zipf_corpus.py). Each system is then measured in its own worker
+process (both systems have a module named config, and the peak memory of a
+fresh process belongs to one build only):
+
+- build_seconds: reading and indexing the collection (VectorSpaceModel with CSR index, as in main.py)
+- peak_rss_bytes: maximum resident set size of the worker
+- index_bytes: size of the serialized index (VectorSpaceModel: snapshot
+  file, QueryProcessor: pickled PositionalIndex)
+- latency_ms: p50/p95/p99/mean of single queries (retrieve_k with k=10 and process_query)
+
+The results are written as JSON (one entry per scale and system, plus the
+commit and environment), so runs of different commits can be compared with
+--compare.
+
+The default scales 1 10 100 1000 need a large machine for the upper end
+(1000 x CISI has about 1.5 million documents); pass smaller scales on small machines.
+
+Usage: python benchmarks/bench_suite.py [--scales 1 10 ...] [--systems vsm boolean] [--queries n]
+                                        [--seed s] [--output file.json] [--compare old.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import pickle
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SYSTEM_DIRECTORIES = {"vsm": "ir_systems", "boolean": "boolean_ir_system"}
+SCALES = [1, 10, 100, 1000]
+# Anfragen vor der Messung (Caches, Lazy-Initialisierung)
+WARMUP_QUERIES = 5
+TOP_K = 10
+
+
+def peak_rss_bytes():
+    # ru_maxrss ist unter Linux in KiB angegeben
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def latency_summary(latencies):
+    latencies = np.asarray(latencies) * 1e3
+    return {
+        "queries": len(latencies),
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "p99": float(np.percentile(latencies, 99)),
+        "mean": float(latencies.mean()),
+    }
+
+
+def measure_queries(run_query, queries):
+    for query in queries[:WARMUP_QUERIES]:
+        run_query(query)
+    latencies = []
+    for query in queries:
+        start_time = time.perf_counter()
+        run_query(query)
+        latencies.append(time.perf_counter() - start_time)
+    return latency_summary(latencies)
+
+
+def run_vsm(corpus_directory, scratch_directory):
+    from vec_space_model import VectorSpaceModel
+    from ir_common.cisi_reader import read_records, QUERY_MARKERS
+
+    collection_file = os.path.join(corpus_directory, "CISI.ALL")
+    queries = [fields[".W"].strip()
+               for _, fields in read_records(os.path.join(corpus_directory, "CISI.QRY"), QUERY_MARKERS)]
+
+    model = VectorSpaceModel(use_csr_index=True)
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.open_and_read(collection_file)
+    build_seconds = time.perf_counter() - start_time
+
+    snapshot_file = os.path.join(scratch_directory, "vsm.snapshot")
+    model.save_snapshot(snapshot_file)
+    return {
+        "documents": model.get_document_count(),
+        "terms": len(model.vocabulary),
+        "build_seconds": build_seconds,
+        "index_bytes": os.path.getsize(snapshot_file),
+        "latency_ms": measure_queries(lambda query: model.retrieve_k(query, TOP_K), queries),
+    }
+
+
+def run_boolean(corpus_directory, scratch_directory):
+    from Collection import Collection
+    from QueryProcessor import QueryProcessor
+    from config import r_index
+
+    with open(os.path.join(corpus_directory, "CISI.BOOL"), "r") as file:
+        queries = [line.strip() for line in file if line.strip()]
+
+    collection = Collection(os.path.join(corpus_directory, "CISI.ALL"))
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        collection.open_and_read()
+    build_seconds = time.perf_counter() - start_time
+
+    query_processor = QueryProcessor(collection.index, collection.get_document_count())
+    # Anfragen mit seltenen Termen würden die Rechtschreibkorrektur (mit Eingabeaufforderung) auslösen
+    known_queries = [query for query in queries
+                     if all(len(collection.index.get_document_list(term)) >= r_index
+                            for and_operand in query_processor.tokenizer.tokenizeQuery(query)
+                            for operand in and_operand if type(operand) is list
+                            for term in operand if not term.startswith("\\"))]
+    return {
+        "documents": collection.get_document_count(),
+        "terms": len(collection.dictionary),
+        "build_seconds": build_seconds,
+        "index_bytes": len(pickle.dumps(collection.index, protocol=pickle.HIGHEST_PROTOCOL)),
+        "skipped_queries": len(queries) - len(known_queries),
+        "latency_ms": measure_queries(query_processor.process_query, known_queries),
+    }
+
+
+def run_worker(system, corpus_directory, result_file):
+    """Measures one system on one corpus (inside the worker process) and writes the JSON result."""
+    sys.path.insert(0, os.path.join(ROOT, SYSTEM_DIRECTORIES[system]))
+    with tempfile.TemporaryDirectory() as scratch_directory:
+        result = (run_vsm if system == "vsm" else run_boolean)(corpus_directory, scratch_directory)
+    result["peak_rss_bytes"] = peak_rss_bytes()
+    with open(result_file, "w") as file:
+        json.dump(result, file)
+
+
+def measure(system, corpus_directory):
+    """Runs the worker for one system in a fresh process and returns its result."""
+    with tempfile.NamedTemporaryFile(suffix=".json") as result_file:
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", system, corpus_directory,
+                        result_file.name], check=True, cwd=os.path.join(ROOT, SYSTEM_DIRECTORIES[system]))
+        with open(result_file.name, "r") as file:
+            return json.load(file)
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(old_results, new_results):
+    """Prints the relative change of every metric between two result files (new / old)."""
+    old_entries = {(entry["scale"], entry["system"]): entry for entry in old_results["results"]}
+    print(f"{old_results['environment']['commit']} -> {new_results['environment']['commit']}")
+    print(f"{'scale':>6} | {'system':>7} | {'build':>7} | {'memory':>7} | {'index':>7} | {'p50':>7} | {'p95':>7} | "
+          f"{'p99':>7}")
+    for entry in new_results["results"]:
+        old = old_entries.get((entry["scale"], entry["system"]))
+        if old is None:
+            continue
+        ratios = [entry[name] / old[name] for name in ("build_seconds", "peak_rss_bytes", "index_bytes")]
+        ratios += [entry["latency_ms"][name] / old["latency_ms"][name] for name in ("p50", "p95", "p99")]
+        print(f"{entry['scale']:>6} | {entry['system']:>7} | " + " | ".join(f"{ratio:>7.2f}" for ratio in ratios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of both retrieval systems.")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+    parser.add_argument("--systems", nargs="+", choices=sorted(SYSTEM_DIRECTORIES), default=["vsm", "boolean"])
+    parser.add_argument("--queries", type=int, default=200, help="queries per system and scale")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON result file (default: bench_suite_<commit>.json)")
+    parser.add_argument("--compare", default=None, help="earlier result file to compare with")
+    parser.add_argument("--worker", nargs=3, metavar=("SYSTEM", "CORPUS", "RESULT"), help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.worker:
+        run_worker(*arguments.worker)
+        return
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from zipf_corpus import ZipfCorpus
+
+    results = {"environment": environment(), "results": []}
+    for scale in arguments.scales:
+        with tempfile.TemporaryDirectory() as corpus_directory:
+            start_time = time.perf_counter()
+            ZipfCorpus.scaled(scale, arguments.seed).write(corpus_directory, arguments.queries)
+            generation_seconds = time.perf_counter() - start_time
+            collection_bytes = os.path.getsize(os.path.join(corpus_directory, "CISI.ALL"))
+            for system in arguments.systems:
+                entry = {"scale": scale, "system": system, "seed": arguments.seed,
+                         "collection_bytes": collection_bytes, "generation_seconds": generation_seconds}
+                entry.update(measure(system, corpus_directory))
+                results["results"].append(entry)
+                latency = entry["latency_ms"]
+                print(f"{scale:>5} x CISI | {system:>7} | build {entry['build_seconds']:8.2f} s | "
+                      f"peak {entry['peak_rss_bytes'] / 2 ** 20:8.1f} MiB | index {entry['index_bytes'] / 2 ** 20:8.1f} "
+                      f"MiB | p50 {latency['p50']:8.2f} ms | p95 {latency['p95']:8.2f} ms | p99 {latency['p99']:8.2f} ms")
+
+    output = arguments.output or f"bench_suite_{(results['environment']['commit'] or 'unknown')[:10]}.json"
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Ergebnisse in {output}")
+
+    if arguments.compare:
+        with open(arguments.compare, "r") as file:
+            compare(json.load(file), results)
+
+
+if __name__ == '__main__':
+    main()
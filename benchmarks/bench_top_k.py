@@ -0,0 +1,77 @@
+"""
+Benchmark of the top-k selection in CSRIndex.rank.
+
+Builds synthetic CSR indexes of growing size N where every term has the same
+number of postings, so a query touches the same number of documents for every
+N. Compares the former strategy (normalize and stable-sort all N documents)
+with the current one (argpartition over the touched documents only).
+
+Usage: python benchmarks/bench_top_k.py [k]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ir_systems"))
+
+from csr_index import CSRIndex  # noqa: E402
+from vocabulary import Vocabulary  # noqa: E402
+from scoring import TfIdfScoring  # noqa: E402
+
+POSTINGS_PER_TERM = 500
+VOCABULARY_SIZE = 200
+QUERY_LENGTH = 20
+REPETITIONS = 50
+
+
+def build_index(number_of_documents, rng):
+    term_offsets = [0]
+    posting_docs = []
+    for _ in range(VOCABULARY_SIZE):
+        docs = np.sort(rng.choice(number_of_documents, size=min(POSTINGS_PER_TERM, number_of_documents),
+                                  replace=False))
+        posting_docs.append(docs)
+        term_offsets.append(term_offsets[-1] + len(docs))
+    posting_docs = np.concatenate(posting_docs)
+    posting_tfs = rng.integers(1, 5, size=len(posting_docs))
+    doc_lengths = rng.integers(20, 200, size=number_of_documents)
+    term_rows = Vocabulary()
+    for i in range(VOCABULARY_SIZE):
+        term_rows.add(f"t{i}")
+    return CSRIndex(np.arange(1, number_of_documents + 1), doc_lengths, term_rows, term_offsets, posting_docs,
+                    posting_tfs, TfIdfScoring(0.01))
+
+
+def full_sort(index, query_terms, k):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scores = np.nan_to_num(index.cosine_scores(query_terms))
+    return index.doc_ids[np.argsort(-scores, kind="stable")[:k]].tolist()
+
+
+def median_latency_ms(function, *args):
+    timings = []
+    for _ in range(REPETITIONS):
+        start_time = time.perf_counter()
+        function(*args)
+        timings.append((time.perf_counter() - start_time) * 1e3)
+    return float(np.median(timings))
+
+
+def main():
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rng = np.random.default_rng(42)
+    print(f"k = {k}, {POSTINGS_PER_TERM} postings per term, {QUERY_LENGTH} query terms")
+    print(f"{'N':>10} | {'full sort [ms]':>15} | {'top-k [ms]':>11}")
+    for number_of_documents in (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6):
+        index = build_index(number_of_documents, rng)
+        query_terms = [f"t{i}" for i in rng.choice(VOCABULARY_SIZE, size=QUERY_LENGTH, replace=False)]
+        # Nicht gescorte Dokumente haben Norm 0; nur die Auswahl unter gescorten Dokumenten wird verglichen
+        assert full_sort(index, query_terms, k) == index.rank(query_terms, k)
+        print(f"{number_of_documents:>10} | {median_latency_ms(full_sort, index, query_terms, k):>15.3f} | "
+              f"{median_latency_ms(index.rank, query_terms, k):>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""
+Query replay load generator for both retrieval systems.
+
+Replays the queries of CISI.QRY (or a query log with one query per line)
+against an engine, cycling through them until --requests queries were sent
+or --duration seconds passed:
+
+- vsm: an in-process VectorSpaceModel (snapshot or CISI.ALL), VectorSpaceModel.retrieve_k
+- boolean: an in-process boolean Collection, QueryProcessor.process_query
+- http: a local query server (POST {"query": ..., "k": ...} to --url, see ir_systems/query_server.py)
+
+Two load models are supported:
+
+- closed loop (default): --concurrency workers each send the next query as
+  soon as the previous one is answered.
+- open loop (--qps): queries are scheduled at a fixed rate independent of
+  the answers; up to --concurrency of them are in flight.
+
+Besides the service time (answer - send) the report contains latencies
+corrected for coordinated omission. In the open loop they are measured from
+the scheduled send time, so queueing behind slow queries is included. In
+the closed loop the missing samples are added like HdrHistogram does: a
+sample of latency L with expected interval I also records L - I, L - 2I, ...
+while they are > I (the expected interval is the median service time, or
+--expected-interval-ms).
+
+In-process engines run in worker threads of this process, so they share
+the GIL; the numbers show queueing behavior rather than parallel speedup.
+CISI.QRY is free text: for the boolean engine every query becomes the AND
+of its first BOOLEAN_TERMS distinct indexed terms. Queries of a log are sent
+as they are, except those with rare terms, which are skipped (they would
+start the interactive spelling correction).
+
+Usage: python benchmarks/load_generator.py [--engine vsm|boolean|http] [--url URL] [--queries FILE]
+                                           [--concurrency n] [--qps rate] [--requests n] [--duration s]
+                                           [--k k] [--json file]
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SYSTEM_DIRECTORIES = {"vsm": "ir_systems", "boolean": "boolean_ir_system"}
+QUERY_FILE = os.path.join(ROOT, "cisi", "CISI.QRY")
+COLLECTION_FILE = os.path.join(ROOT, "cisi", "CISI.ALL")
+SNAPSHOT_FILE = os.path.join(ROOT, "cisi", "CISI.ALL.snapshot")
+BOOLEAN_TERMS = 3
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+def is_cisi_query_file(file_path):
+    with open(file_path, "r") as file:
+        return file.readline().startswith(".I")
+
+
+def read_queries(file_path):
+    """Queries of a CISI query file (.I/.W records) or of a query log (one query per line)."""
+    sys.path.insert(0, ROOT)
+    from ir_common.cisi_reader import read_records, QUERY_MARKERS
+
+    if is_cisi_query_file(file_path):
+        return [fields[".W"].strip() for _, fields in read_records(file_path, QUERY_MARKERS)]
+    with open(file_path, "r") as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def vsm_engine(k):
+    sys.path.insert(0, os.path.join(ROOT, SYSTEM_DIRECTORIES["vsm"]))
+    from vec_space_model import VectorSpaceModel
+    from index_snapshot import SnapshotError
+
+    model = VectorSpaceModel(use_csr_index=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            model.load_snapshot(SNAPSHOT_FILE, COLLECTION_FILE)
+        except SnapshotError:
+            model.open_and_read(COLLECTION_FILE)
+    return lambda query: model.retrieve_k(query, k)
+
+
+def boolean_engine(queries, free_text):
+    """
+    Returns the engine and the queries it can answer without the interactive
+    spelling correction; free-text queries are rewritten as conjunctions of indexed terms.
+    """
+    sys.path.insert(0, os.path.join(ROOT, SYSTEM_DIRECTORIES["boolean"]))
+    from Collection import Collection
+    from QueryProcessor import QueryProcessor
+    from config import r_index
+
+    collection = Collection(COLLECTION_FILE)
+    with contextlib.redirect_stdout(io.StringIO()):
+        collection.open_and_read()
+    query_processor = QueryProcessor(collection.index, collection.get_document_count())
+
+    def indexed(term):
+        return term.startswith("\\") or len(collection.index.get_document_list(term)) >= r_index
+
+    boolean_queries = []
+    for query in queries:
+        if not free_text:
+            # Anfragen des Logs mit seltenen Termen werden übersprungen
+            if all(indexed(term) for and_operand in query_processor.tokenizer.tokenizeQuery(query)
+                   for operand in and_operand if type(operand) is list for term in operand):
+                boolean_queries.append(query)
+            continue
+        terms = []
+        for term in collection.tokenizer.tokenize(query):
+            if term not in terms and indexed(term):
+                terms.append(term)
+        if terms:
+            boolean_queries.append(" AND ".join(terms[:BOOLEAN_TERMS]))
+    return query_processor.process_query, boolean_queries
+
+
+def http_engine(url, k, timeout):
+    """Sends queries to a local server; every worker thread keeps its own connection."""
+    parsed = urllib.parse.urlsplit(url)
+    local = threading.local()
+
+    def run_query(query):
+        if getattr(local, "connection", None) is None:
+            local.connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+        body = json.dumps({"query": query, "k": k})
+        try:
+            local.connection.request("POST", parsed.path or "/", body, {"Content-Type": "application/json"})
+            response = local.connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            local.connection.close()
+            local.connection = None
+            raise
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {payload[:200]!r}")
+        return json.loads(payload)
+
+    return run_query
+
+
+class LoadResult:
+    """
+    Samples of one load run.
+
+    Attributes
+    ----------
+    scheduled, started, finished : list(float)
+        perf_counter times per completed query (scheduled = started in the closed loop).
+    errors : int
+        Queries that raised an exception.
+    elapsed : float
+        Wall time of the run in seconds.
+    """
+
+    def __init__(self):
+        self.scheduled = []
+        self.started = []
+        self.finished = []
+        self.errors = 0
+        self.elapsed = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, scheduled, started, finished):
+        with self.lock:
+            self.scheduled.append(scheduled)
+            self.started.append(started)
+            self.finished.append(finished)
+
+    def add_error(self):
+        with self.lock:
+            self.errors += 1
+
+
+def run_load(run_query, queries, concurrency, requests=None, duration=None, qps=None):
+    """
+    Replays queries with concurrency worker threads (closed loop, or open loop with qps).
+
+    Stops after requests queries or duration seconds, whichever comes first.
+    """
+    result = LoadResult()
+    counter = itertools.count()
+    start_time = time.perf_counter()
+    deadline = start_time + duration if duration is not None else None
+
+    def worker():
+        while True:
+            i = next(counter)
+            if requests is not None and i >= requests:
+                return
+            scheduled = start_time + i / qps if qps is not None else None
+            if scheduled is not None:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            started = time.perf_counter()
+            if deadline is not None and started >= deadline:
+                return
+            try:
+                run_query(queries[i % len(queries)])
+            except Exception:
+                result.add_error()
+                continue
+            result.add(scheduled if scheduled is not None else started, started, time.perf_counter())
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - start_time
+    return result
+
+
+def corrected_latencies(latencies, expected_interval):
+    """Latencies with the samples a closed loop omitted while it waited (HdrHistogram correction)."""
+    corrected = [latencies]
+    if expected_interval > 0:
+        for latency in latencies[latencies > expected_interval]:
+            # Wie recordValueWithExpectedInterval: Werte latency - I, latency - 2I, ... solange sie >= I sind
+            corrected.append(np.arange(latency - expected_interval, expected_interval - 1e-12, -expected_interval))
+    return np.concatenate(corrected)
+
+
+def percentiles(latencies):
+    if len(latencies) == 0:
+        return {}
+    summary = {f"p{percentile:g}": float(np.percentile(latencies, percentile)) * 1e3 for percentile in PERCENTILES}
+    summary["max"] = float(latencies.max()) * 1e3
+    summary["mean"] = float(latencies.mean()) * 1e3
+    return summary
+
+
+def report(result, qps=None, expected_interval=None):
+    """Summary of a load run as a dict (latencies in ms)."""
+    scheduled = np.array(result.scheduled)
+    started = np.array(result.started)
+    finished = np.array(result.finished)
+    service = finished - started
+    if qps is not None:
+        corrected = finished - scheduled
+    else:
+        if expected_interval is None:
+            expected_interval = float(np.median(service)) if len(service) else 0.0
+        corrected = corrected_latencies(service, expected_interval)
+    return {
+        "mode": "open" if qps is not None else "closed",
+        "target_qps": qps,
+        "completed": len(service),
+        "errors": result.errors,
+        "elapsed_seconds": result.elapsed,
+        "throughput_qps": len(service) / result.elapsed if result.elapsed else 0.0,
+        "service_ms": percentiles(service),
+        "corrected_ms": percentiles(corrected),
+    }
+
+
+def print_report(summary):
+    print(f"{summary['mode']} loop: {summary['completed']} Anfragen, {summary['errors']} Fehler in "
+          f"{summary['elapsed_seconds']:.2f} s, {summary['throughput_qps']:.1f} Anfragen/s"
+          + (f" (Ziel {summary['target_qps']:g}/s)" if summary["target_qps"] else ""))
+    names = list(summary["service_ms"].keys())
+    print(f"{'ms':>10} | " + " | ".join(f"{name:>8}" for name in names))
+    for label in ("service", "corrected"):
+        values = summary[f"{label}_ms"]
+        print(f"{label:>10} | " + " | ".join(f"{values[name]:>8.2f}" for name in names))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays queries against a retrieval engine.")
+    parser.add_argument("--engine", choices=["vsm", "boolean", "http"], default="vsm")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/search")
+    parser.add_argument("--queries", default=QUERY_FILE, help="CISI query file or query log (one per line)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--qps", type=float, default=None, help="open loop with this target rate")
+    parser.add_argument("--requests", type=int, default=None)
+    parser.add_argument("--duration", type=float, default=None, help="seconds")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=30.0, help="HTTP timeout in seconds")
+    parser.add_argument("--expected-interval-ms", type=float, default=None)
+    parser.add_argument("--json", default=None, help="write the report to this file")
+    arguments = parser.parse_args()
+    if arguments.requests is None and arguments.duration is None:
+        arguments.requests = 1000
+
+    queries = read_queries(arguments.queries)
+    if arguments.engine == "vsm":
+        run_query = vsm_engine(arguments.k)
+    elif arguments.engine == "boolean":
+        run_query, queries = boolean_engine(queries, is_cisi_query_file(arguments.queries))
+    else:
+        run_query = http_engine(arguments.url, arguments.k, arguments.timeout)
+
+    result = run_load(run_query, queries, arguments.concurrency, arguments.requests, arguments.duration,
+                      arguments.qps)
+    expected_interval = arguments.expected_interval_ms / 1e3 if arguments.expected_interval_ms else None
+    summary = report(result, arguments.qps, expected_interval)
+    summary.update({"engine": arguments.engine, "concurrency": arguments.concurrency, "k": arguments.k})
+    print_report(summary)
+    if arguments.json:
+        with open(arguments.json, "w") as file:
+            json.dump(summary, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Synthetic CISI-format collections with Zipfian term distributions.
+
+A corpus of ``scale`` times the size of CISI is written as CISI.ALL (documents
+with .I/.T/.A/.W/.X fields, CRLF line ends like the original), CISI.QRY
+(free-text queries for the VectorSpaceModel) and CISI.BOOL (one boolean
+query per line for the QueryProcessor).
+
+Term frequencies follow Zipf's law with the exponent fitted to CISI; the
+vocabulary grows with Heaps' law, and abstract and query lengths are drawn
+from log-normal distributions fitted to CISI.ALL and CISI.QRY. Terms are
+random lowercase words (shorter for frequent ranks), so both tokenizers
+keep them unchanged.
+
+Usage: python benchmarks/zipf_corpus.py <directory> [scale] [seed]
+"""
+import os
+import sys
+
+import numpy as np
+
+# Statistiken von CISI.ALL und CISI.QRY (Tokenizer des Vektorraummodells)
+CISI_DOCUMENTS = 1460
+CISI_VOCABULARY = 10822
+CISI_LOG_DOCUMENT_LENGTH = (4.63, 0.59)  # Mittelwert und Standardabweichung von log(Länge des Abstracts)
+CISI_LOG_QUERY_LENGTH = (3.95, 1.09)
+ZIPF_EXPONENT = 0.99
+HEAPS_EXPONENT = 0.5
+
+NUMBER_OF_QUERIES = 200
+# Boolesche Anfragen verwenden nur Terme mit mindestens so vielen erwarteten Vorkommen,
+# damit die Rechtschreibkorrektur des QueryProcessors nicht anspringt
+BOOLEAN_MIN_EXPECTED_COUNT = 50
+BOOLEAN_TEMPLATES = (
+    "{0} AND {1}",
+    "{0} OR {1} AND {2}",
+    "{0} {1}",
+    "{0} \\3 {1}",
+    "{0} AND NOT {1}",
+    "NOT {0} OR {1} AND {2}",
+)
+# Dokumente, die zusammen erzeugt und geschrieben werden
+CHUNK_SIZE = 10000
+WORDS_PER_LINE = 10
+
+
+class ZipfCorpus:
+    """
+    Generator of a synthetic collection.
+
+    Parameters
+    ----------
+    number_of_documents : int
+        Number of documents.
+    vocabulary_size : int
+        Number of distinct terms that can be drawn (the realized vocabulary is smaller).
+    seed : int
+        Seed of the random generator; equal parameters give equal files.
+    """
+
+    def __init__(self, number_of_documents, vocabulary_size, seed=0, exponent=ZIPF_EXPONENT):
+        self.number_of_documents = number_of_documents
+        self.vocabulary_size = vocabulary_size
+        self.rng = np.random.default_rng(seed)
+
+        weights = 1.0 / np.arange(1, vocabulary_size + 1) ** exponent
+        self.probabilities = weights / weights.sum()
+        self.cumulative = np.cumsum(self.probabilities)
+        self.words = self.make_words(vocabulary_size)
+        self.expected_tokens = number_of_documents * np.exp(CISI_LOG_DOCUMENT_LENGTH[0] +
+                                                            CISI_LOG_DOCUMENT_LENGTH[1] ** 2 / 2)
+
+    @classmethod
+    def scaled(cls, scale, seed=0):
+        """A corpus with scale times the documents of CISI (vocabulary grown with Heaps' law)."""
+        return cls(CISI_DOCUMENTS * scale, int(CISI_VOCABULARY * scale ** HEAPS_EXPONENT), seed)
+
+    def make_words(self, count):
+        """count distinct lowercase words; the length grows with the rank."""
+        lengths = 2 + np.log2(np.arange(count) + 2).astype(np.int64) // 2 + self.rng.integers(0, 4, count)
+        letters = (self.rng.integers(0, 26, (count, int(lengths.max()))) + ord("a")).astype(np.uint8)
+        words = []
+        seen = set()
+        for row, length in zip(letters, lengths):
+            word = row[:length].tobytes().decode("ascii")
+            while word in seen:
+                word += chr(ord("a") + int(self.rng.integers(0, 26)))
+            seen.add(word)
+            words.append(word)
+        return np.array(words)
+
+    def sample_terms(self, count, max_rank=None):
+        """count term ranks drawn from the Zipf distribution (optionally only ranks below max_rank)."""
+        limit = 1.0 if max_rank is None else self.cumulative[max_rank - 1]
+        ranks = np.searchsorted(self.cumulative, self.rng.random(count) * limit, side="right")
+        return np.minimum(ranks, self.vocabulary_size - 1)
+
+    def sample_lengths(self, count, log_length):
+        return np.maximum(1, np.rint(self.rng.lognormal(log_length[0], log_length[1], count))).astype(np.int64)
+
+    def text(self, ranks):
+        words = self.words[ranks]
+        return "\n".join(" ".join(words[i:i + WORDS_PER_LINE]) for i in range(0, len(words), WORDS_PER_LINE))
+
+    def write_collection(self, file_path):
+        with open(file_path, "w", newline="\r\n") as file:
+            for start in range(0, self.number_of_documents, CHUNK_SIZE):
+                count = min(CHUNK_SIZE, self.number_of_documents - start)
+                lengths = self.sample_lengths(count, CISI_LOG_DOCUMENT_LENGTH)
+                terms = self.sample_terms(int(lengths.sum()))
+                offsets = np.concatenate(([0], np.cumsum(lengths)))
+                for i in range(count):
+                    doc_id = start + i + 1
+                    file.write(f".I {doc_id}\n.T\n{self.text(self.sample_terms(6))}\n.A\nAuthor, A.\n"
+                               f".W\n{self.text(terms[offsets[i]:offsets[i + 1]])}\n.X\n{doc_id}\t5\t{doc_id}\n")
+
+    def write_queries(self, file_path, number_of_queries=NUMBER_OF_QUERIES):
+        lengths = self.sample_lengths(number_of_queries, CISI_LOG_QUERY_LENGTH)
+        with open(file_path, "w", newline="\r\n") as file:
+            for query_id, length in enumerate(lengths, start=1):
+                file.write(f".I {query_id}\n.W\n{self.text(self.sample_terms(length))}\n")
+
+    def write_boolean_queries(self, file_path, number_of_queries=NUMBER_OF_QUERIES):
+        max_rank = int(np.searchsorted(-self.probabilities * self.expected_tokens, -BOOLEAN_MIN_EXPECTED_COUNT))
+        templates = self.rng.integers(0, len(BOOLEAN_TEMPLATES), number_of_queries)
+        with open(file_path, "w") as file:
+            for template in templates:
+                terms = self.words[self.sample_terms(3, max(1, max_rank))]
+                file.write(BOOLEAN_TEMPLATES[template].format(*terms) + "\n")
+
+    def write(self, directory, number_of_queries=NUMBER_OF_QUERIES):
+        """Writes CISI.ALL, CISI.QRY and CISI.BOOL to directory and returns their paths."""
+        os.makedirs(directory, exist_ok=True)
+        paths = tuple(os.path.join(directory, name) for name in ("CISI.ALL", "CISI.QRY", "CISI.BOOL"))
+        self.write_collection(paths[0])
+        self.write_queries(paths[1], number_of_queries)
+        self.write_boolean_queries(paths[2], number_of_queries)
+        return paths
+
+
+def main():
+    directory = sys.argv[1]
+    scale = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    corpus = ZipfCorpus.scaled(scale, seed)
+    for path in corpus.write(directory):
+        print(f"{path}: {os.path.getsize(path) / 2 ** 20:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
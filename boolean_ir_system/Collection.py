@@ -1,8 +1,14 @@
+import sys
+
 from Tokenizer import *
 from Document import *
 from Index import *
 from KGramIndex import *
 from config import *
+from ir_common.cisi_reader import read_records
+from ir_common.parallel_build import run_partial_builds
+from ir_common.positional_postings import compact_postings, iter_compact_postings
+from ir_common.memory import structure_sizes
 
 class Collection:
     def __init__(self, file_path):
@@ -25,44 +31,66 @@ class Collection:
             else:
                 self.dictionary[term] = 1
 
-    def open_and_read(self):
-        with open(self.file_path, "r") as file:
-            lines = file.readlines()
-            num_lines = len(lines)
+    def open_and_read(self, processes=1):
+        # Mit mehreren Prozessen: Dateibereiche parallel indexieren und in Dateireihenfolge zusammenführen
+        if processes > 1:
+            for documents, postings in run_partial_builds(self.file_path, build_partial_collection, processes,
+                                                          self.tokenizer):
+                for document in documents:
+                    document.abstract = intern_terms(document.abstract)
+                    self.documents[document.doc_id] = document
+                for term, doc_ids, term_frequencies, positions in iter_compact_postings(postings):
+                    term = sys.intern(term)
+                    self.index.merge(term, doc_ids, term_frequencies, positions)
+                    self.dictionary[term] = self.dictionary.get(term, 0) + len(positions)
+            print("Dokumente eingelesen:", len(self.documents))
+            return
 
-            i = 0
-            while i < num_lines:
-                if lines[i].startswith(".I"):
-                    # Hole Dokumenten-ID aus der Zeile (letztes Zeichen)
-                    doc_id = int(lines[i].split()[-1])
-                    i += 1
+        for doc_id, fields in read_records(self.file_path):
+            # Packe den Abstract in den Tokenizer (ohne führende und nachfolgende Leerzeichen)
+            abstract = intern_terms(self.tokenizer.tokenize(fields[".W"].strip()))
 
-                    while not lines[i].startswith(".W"):
-                        i += 1
+            document = Document(doc_id, abstract)
+            self.documents[doc_id] = document
 
-                    # Zur nächsten Zeile nach einem ".W" (Beginn eines Abstract)
-                    i += 1
+            # Index und Dictionary aktualisieren
+            self.update_index(doc_id, abstract)
+            self.update_dictionary(abstract)
 
-                    abstract = ""
+        print("Dokumente eingelesen:", len(self.documents))
 
-                    # Füge alle Zeilen bis zur Referenzsektion (.X) dem Abstract hinzu
-                    while not lines[i].startswith(".X"):
-                        abstract += lines[i]
-                        i += 1
+    def get_document_count(self):
+        return len(self.documents)
 
-                    # Packe den Abstract in den Tokenizer (ohne führende und nachfolgende Leerzeichen)
-                    abstract = self.tokenizer.tokenize(abstract.strip())
+    def memory_report(self):
+        """
+        Bytes of the in-memory index by structure.
 
-                    document = Document(doc_id, abstract)
-                    self.documents[doc_id] = document
+        vocabulary: term dictionary and the Index objects of the terms,
+        postings: doc ids and position offsets, positions: token positions,
+        documents: Document objects with their abstracts, k-grams: the k-gram index.
+        Objects shared by several structures (e.g. term strings) are counted once.
+        """
+        indexes = self.index.index.values()
+        # Arrays zuerst, damit sie nicht über die Index-Objekte dem Vokabular zugerechnet werden
+        sizes = structure_sizes([
+            ("postings", [array for index in indexes for array in (index.doc_ids, index.position_offsets)]),
+            ("positions", [index.positions for index in indexes]),
+            ("vocabulary", [self.index.index, self.dictionary]),
+            ("documents", [self.documents]),
+            ("k-grams", [self.k_gram_index]),
+        ])
+        return {name: sizes[name] for name in ("vocabulary", "postings", "positions", "documents", "k-grams")}
 
-                    # Index und Dictionary aktualisieren
-                    self.update_index(doc_id, abstract)
-                    self.update_dictionary(abstract)
 
-                i += 1
+def intern_terms(abstract):
+    # Gleiche Terme aller Abstracts teilen sich ein String-Objekt (auch mit den Schlüsseln des Index)
+    return list(map(sys.intern, abstract))
 
-            print("Dokumente eingelesen:", len(self.documents))
 
-    def get_document_count(self):
-        return len(self.documents)
\ No newline at end of file
+def build_partial_collection(records, tokenizer):
+    # Teilindex eines Dateibereichs: Dokumente und die Positionen pro Term als flache Arrays (compact_postings)
+    records = list(records)
+    abstracts = tokenizer.tokenize_batch([fields[".W"].strip() for _, fields in records])
+    documents = [Document(doc_id, intern_terms(abstract)) for (doc_id, _), abstract in zip(records, abstracts)]
+    return documents, compact_postings((document.doc_id, document.abstract) for document in documents)
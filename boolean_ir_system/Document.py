@@ -1,4 +1,6 @@
 class Document:
+    __slots__ = ("doc_id", "abstract")
+
     def __init__(self, doc_id, abstract):
         self.doc_id = doc_id
         self.abstract = abstract
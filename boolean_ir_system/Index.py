@@ -1,42 +1,38 @@
-import sys
-# Class to safe the term frequency and the positions of the term in the document
-class TermDocumentIndex:
-    def __init__(self, first_position):
-        self.termFrequency = 1
-        self.positions = [first_position]
+import config  # ergänzt sys.path um das Paket ir_common
+from ir_common.positional_postings import PositionalPostings
 
-    def add_position(self, position):
-        self.termFrequency += 1
-        self.positions.append(position)
 
+# Class to safe a token, the Documents it is in and the positions of the token in every document
+# Die Postings liegen in flachen Arrays (PositionalPostings) statt in einem Objekt pro Term und Dokument
+class Index(PositionalPostings):
+    __slots__ = ("term", "k_gram_size")
 
-# Class to safe a token, the Documents it is in and the document frequency
-class Index:
-    def __init__(self, term, k_gram_size, first_document, first_position):
+    def __init__(self, term, k_gram_size, first_document=None, first_position=None):
+        super().__init__()
         self.term = term
         self.k_gram_size = k_gram_size
-        self.document_frequency = 1
-        self.documents = {first_document: TermDocumentIndex(first_position)}
+        if first_document is not None:
+            self.add_position(first_document, first_position)
 
-    def add_position(self, doc_id, position):
-        if doc_id in self.documents:
-            self.documents[doc_id].add_position(position)
-        else:
-            self.documents[doc_id] = TermDocumentIndex(position)
-            self.document_frequency += 1
+    @property
+    def document_frequency(self):
+        return len(self.doc_ids)
 
     def get_document_list(self):
-        return list(self.documents.keys())
+        return self.doc_ids.tolist()
 
     def get_positions_in_document(self, doc_id):
-        if doc_id in self.documents:
-            return self.documents[doc_id].positions
+        positions = self.positions_in_document(doc_id)
+        if positions is not None:
+            return positions
         else:
             return []
 
 
 # Class to safe the Indexes of all terms
 class PositionalIndex:
+    __slots__ = ("index", "k_gram_index")
+
     def __init__(self, k_gram_index):
         self.index = {}
         self.k_gram_index = k_gram_index
@@ -48,6 +44,12 @@ class PositionalIndex:
             k_gram_size = self.k_gram_index.add_term(term)
             self.index[term] = Index(term, k_gram_size, doc_id, position)
 
+    # Postings eines Terms aus einem Teilindex (flache Arrays, siehe compact_postings) übernehmen
+    def merge(self, term, doc_ids, term_frequencies, positions):
+        if term not in self.index:
+            self.index[term] = Index(term, self.k_gram_index.add_term(term))
+        self.index[term].extend(doc_ids, term_frequencies, positions)
+
     def get_document_list(self, term):
         if term in self.index:
             return self.index[term].get_document_list()
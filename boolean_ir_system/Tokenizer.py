@@ -1,8 +1,13 @@
 import re
 
+import config  # ergänzt sys.path um das Paket ir_common
+from ir_common.tokenizer_engine import TokenizerEngine
+
 class Tokenizer:
     def __init__(self):
-        pass
+        self.engine = TokenizerEngine()
+        # Operanden von Anfragen behalten den Backslash der Abstandsoperatoren (\3)
+        self.query_engine = TokenizerEngine(keep_characters="\\")
 
     # Methode zum Aufteilen von Text in Wörter
     def tokenize(self, text):
@@ -10,10 +15,11 @@ class Tokenizer:
         Diese Methode nimmt einen Text als Eingabe, konvertiert ihn in Kleinbuchstaben,
         entfernt Sonderzeichen und Unterstriche und gibt eine Liste von Wörtern zurück.
         """
-        text = text.lower()
-        text = re.sub(r'[^\w\s\']|_', '', text)
-        text = re.sub(r"\s'|'\s", ' ', text)
-        return text.split()
+        return self.engine.tokenize(text)
+
+    def tokenize_batch(self, texts):
+        """Tokenisiert viele Texte auf einmal (gleiche Tokens wie tokenize)."""
+        return self.engine.tokenize_batch(texts)
 
     # (information OR data) AND analysis AND NOT retrieval AND Information \10 retrieval AND "library of congress"
     def tokenizeQuery(self, text):
@@ -74,18 +80,14 @@ class Tokenizer:
 
                         # Normalize all tokens in range
                         for j in range(a, b):
-                            subtokens[j] = subtokens[j].lower()
-                            subtokens[j] = re.sub(r'[^\w\s\'\\]|_', '', subtokens[j])
-                            subtokens[j] = re.sub(r"\s'|'\s", ' ', subtokens[j])
+                            subtokens[j] = self.query_engine.normalize(subtokens[j])
                             connected.append(subtokens[j])
 
                         new_subtokens.append(connected)
                         a = b
                     subtokens = new_subtokens
             else:
-                subtokens[0] = subtokens[0].lower()
-                subtokens[0] = re.sub(r'[^\w\s\']|_', '', subtokens[0])
-                subtokens[0] = re.sub(r"\s'|'\s", ' ', subtokens[0])
+                subtokens[0] = self.engine.normalize(subtokens[0])
                 subtokens = [subtokens]
             tokens[i] = subtokens
         return tokens
@@ -1,4 +1,10 @@
+import os
+import sys
+
+# Gemeinsame Module beider Systeme (Paket ir_common) liegen im Wurzelverzeichnis des Repositories
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 jaccard_threshold = 0.5
 k_gram = 2
 r_index = 5
-collection_file = "../cisi/CISI.ALL"
\ No newline at end of file
+collection_file = "../cisi/CISI.ALL"
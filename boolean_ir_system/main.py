@@ -3,6 +3,7 @@ import time
 from QueryProcessor import *
 from Collection import *
 from config import *
+from ir_common.memory import print_memory_report
 
 
 def print_docs(documents):
@@ -52,6 +53,10 @@ def main():
     elapsed_time = (time.perf_counter() - start_time) * 1e3
     print(f"Zeit zum Aufbau des Index: {elapsed_time:.2f} ms")
 
+    # Speicherbedarf des Index nach Struktur
+    print("\nSpeicherbedarf des Index:\n")
+    print_memory_report(collection.memory_report())
+
     # Ausgabe der eingelesenen Dokumente
     print_docs(collection.documents)
     print_index(collection.index)
@@ -0,0 +1 @@
+# Gemeinsame Bausteine des Vektorraummodells (ir_systems) und des booleschen Systems (boolean_ir_system)
@@ -0,0 +1,68 @@
+"""
+Streaming reader for files in the CISI record format.
+
+A record starts with an ".I <id>" line and consists of fields introduced by
+marker lines (".T" title, ".A" author, ".B" source, ".W" abstract, ".X"
+cross references). The text of a field runs up to the next marker line or
+the next record. Marker lines that are not in ``markers`` are kept as text
+of the current field, e.g. the ".K"/".C" sections inside a CISI.ALL
+abstract or the ".B" line after a CISI.QRY query.
+"""
+
+# Felder der Dokumente in CISI.ALL
+DOCUMENT_MARKERS = (".T", ".A", ".B", ".W", ".X")
+
+# Felder der Anfragen in CISI.QRY: ".B" gehört (wie bisher) zum Anfragetext
+QUERY_MARKERS = (".T", ".A", ".W")
+
+
+def read_records(file_path, markers=DOCUMENT_MARKERS):
+    """
+    Yields (record_id, fields) for every record of the file.
+
+    The file is read line by line through the buffered text reader, so only
+    the current record is held in memory.
+
+    Parameters
+    ----------
+    file_path : str
+        Path of the CISI-format file.
+    markers : tuple of str
+        Marker lines that start a new field.
+
+    Yields
+    ------
+    tuple of (int, dict)
+        The record id and a dict mapping each marker found to the raw text of
+        its field (lines joined, not stripped). Repeated markers (several
+        ".A" lines) are concatenated.
+    """
+    with open(file_path, "r") as file:
+        yield from iter_records(file, markers)
+
+
+def iter_records(lines, markers=DOCUMENT_MARKERS):
+    """Yields (record_id, fields) for the records in an iterable of lines (see read_records)."""
+    record_id = None
+    fields = {}
+    field = None
+    for line in lines:
+        # Marker ist das ganze erste Wort einer Zeile mit "." (".Txt" ist Text, kein ".T")
+        marker = line.split(None, 1)[0] if line.startswith(".") else None
+        if marker == ".I":
+            if record_id is not None:
+                yield record_id, join_fields(fields)
+            # Hole Dokumenten-ID aus der Zeile (letztes Zeichen)
+            record_id = int(line.split()[-1])
+            fields = {}
+            field = None
+        elif marker in markers:
+            field = fields.setdefault(marker, [])
+        elif field is not None:
+            field.append(line)
+    if record_id is not None:
+        yield record_id, join_fields(fields)
+
+
+def join_fields(fields):
+    return {marker: "".join(field_lines) for marker, field_lines in fields.items()}
@@ -0,0 +1,52 @@
+import sys
+
+# Diese kleinen Ganzzahlen hält CPython einmal vor; sie belegen pro Verwendung keinen eigenen Speicher
+SMALL_INT_RANGE = range(-5, 257)
+
+
+def deep_getsizeof(obj, seen):
+    """
+    Bytes of obj and of everything it references that is not in seen.
+
+    Follows dicts, lists, tuples, sets, the __dict__ and the __slots__ of
+    objects; arrays (array.array, np.ndarray) are counted with their buffer
+    by sys.getsizeof. The ids of all counted objects are added to seen, so
+    shared objects are counted once across several calls.
+    """
+    if id(obj) in seen or isinstance(obj, type) or (type(obj) is int and obj in SMALL_INT_RANGE):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_getsizeof(key, seen) + deep_getsizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_getsizeof(item, seen) for item in obj)
+    else:
+        if hasattr(obj, "__dict__"):
+            size += deep_getsizeof(vars(obj), seen)
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if hasattr(obj, name):
+                    size += deep_getsizeof(getattr(obj, name), seen)
+    return size
+
+
+def structure_sizes(structures):
+    """
+    Bytes per named structure for (name, objects) pairs.
+
+    Objects shared between structures are counted for the first structure
+    that references them.
+    """
+    seen = set()
+    return {name: sum(deep_getsizeof(obj, seen) for obj in objects) for name, objects in structures}
+
+
+def print_memory_report(report, number_of_postings=None):
+    """Prints a memory_report() as a table (MiB and share, optionally bytes per posting)."""
+    total = sum(report.values())
+    for name, size in list(report.items()) + [("total", total)]:
+        line = f"{name:>16} | {size / 2 ** 20:>9.2f} MiB | {size / total if total else 0.0:>6.1%}"
+        if number_of_postings:
+            line += f" | {size / number_of_postings:>7.1f} B/Posting"
+        print(line)
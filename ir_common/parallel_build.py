@@ -0,0 +1,70 @@
+import io
+import locale
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from ir_common.cisi_reader import iter_records
+
+# Byte-Bereiche pro Prozess; mehrere Bereiche je Prozess gleichen unterschiedlich teure Bereiche aus
+RANGES_PER_PROCESS = 4
+
+
+def split_collection(file_path, number_of_ranges):
+    """
+    Splits a CISI-format file into byte ranges that start at ".I" record lines.
+
+    Returns a list of (start, end) byte offsets covering the whole file; ranges
+    are never empty, so fewer than number_of_ranges may be returned.
+    """
+    size = os.path.getsize(file_path)
+    boundaries = [0]
+    with open(file_path, "rb") as file:
+        for i in range(1, number_of_ranges):
+            target = max(size * i // number_of_ranges, boundaries[-1])
+            file.seek(target)
+            # Rest der angeschnittenen Zeile überspringen, dann bis zur nächsten .I-Zeile lesen
+            if target > 0:
+                file.readline()
+            while True:
+                offset = file.tell()
+                line = file.readline()
+                if not line:
+                    offset = size
+                    break
+                if is_record_start(line):
+                    break
+            boundaries.append(offset)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def is_record_start(line):
+    fields = line.split()
+    return len(fields) > 0 and fields[0] == b".I"
+
+
+def read_range(file_path, start, end):
+    """Returns a text stream over a byte range, decoded like a file opened in text mode."""
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    return io.StringIO(data.decode(locale.getpreferredencoding(False)), newline=None)
+
+
+def _build_range(build_partial, file_path, start, end, args):
+    return build_partial(iter_records(read_range(file_path, start, end)), *args)
+
+
+def run_partial_builds(file_path, build_partial, processes, *args):
+    """
+    Runs build_partial(records, *args) for byte ranges of file_path in a process pool.
+
+    records iterates over the (record_id, fields) of one range (see
+    cisi_reader.iter_records). Yields the partial results in file order while
+    the remaining ranges are still being built.
+    """
+    ranges = split_collection(file_path, processes * RANGES_PER_PROCESS)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(_build_range, build_partial, file_path, start, end, args) for start, end in ranges]
+        for future in futures:
+            yield future.result()
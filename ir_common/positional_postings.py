@@ -0,0 +1,158 @@
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+# Doc ids, Positionen und Offsets als vorzeichenlose 32-Bit-Werte (4 Bytes pro Eintrag)
+TYPECODE = "I"
+
+
+class PositionalPostings:
+    """
+    Postings of one term with positions, stored as three flat arrays.
+
+    doc_ids holds the documents of the term in ascending order; the positions
+    of doc_ids[i] are positions[position_offsets[i]:position_offsets[i + 1]].
+    A posting costs 4 bytes for the doc id and the offset plus 4 bytes per
+    position, instead of one object with a list of positions per posting.
+    Documents with a higher id than the last one (file order of CISI) are
+    appended; other documents are inserted at their place, so the doc ids
+    stay sorted.
+    """
+    __slots__ = ("doc_ids", "position_offsets", "positions")
+
+    def __init__(self):
+        self.doc_ids = array(TYPECODE)
+        self.position_offsets = array(TYPECODE, [0])
+        self.positions = array(TYPECODE)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def positions_in_document(self, doc_id):
+        """Positions of doc_id (an array), or None if the term does not occur in the document."""
+        doc_ids = self.doc_ids
+        i = bisect_left(doc_ids, doc_id)
+        if i < len(doc_ids) and doc_ids[i] == doc_id:
+            offsets = self.position_offsets
+            return self.positions[offsets[i]:offsets[i + 1]]
+        return None
+
+    def iter_term_frequencies(self):
+        """Yields (doc_id, tf) for all documents of the term in ascending doc id order, without searching."""
+        offsets = self.position_offsets
+        return zip(self.doc_ids, map(int.__sub__, offsets[1:], offsets))
+
+    def add_position(self, doc_id, position):
+        """Adds one position; returns True if doc_id is a new document of the term."""
+        doc_ids = self.doc_ids
+        if doc_ids and doc_ids[-1] == doc_id:
+            self.positions.append(position)
+            self.position_offsets[-1] += 1
+            return False
+        if not doc_ids or doc_ids[-1] < doc_id:
+            doc_ids.append(doc_id)
+            self.positions.append(position)
+            self.position_offsets.append(len(self.positions))
+            return True
+        return self.insert_positions(doc_id, array(TYPECODE, [position]))
+
+    def add_positions(self, doc_id, positions):
+        """Adds the positions (a sequence) of doc_id; returns True if doc_id is a new document of the term."""
+        doc_ids = self.doc_ids
+        if doc_ids and doc_ids[-1] == doc_id:
+            self.positions.extend(positions)
+            self.position_offsets[-1] = len(self.positions)
+            return False
+        if not doc_ids or doc_ids[-1] < doc_id:
+            doc_ids.append(doc_id)
+            self.positions.extend(positions)
+            self.position_offsets.append(len(self.positions))
+            return True
+        return self.insert_positions(doc_id, array(TYPECODE, positions))
+
+    def extend(self, doc_ids, term_frequencies, positions):
+        """
+        Adds several documents at once (arrays as in compact_postings).
+
+        doc_ids are ascending; the term_frequencies[i] positions of doc_ids[i]
+        follow each other in positions. If all documents come after the last
+        one, the arrays are appended as a whole; otherwise every document is
+        added with add_positions.
+        """
+        if not doc_ids:
+            return
+        if self.doc_ids and self.doc_ids[-1] >= doc_ids[0]:
+            start = 0
+            for doc_id, term_frequency in zip(doc_ids, term_frequencies):
+                self.add_positions(doc_id, positions[start:start + term_frequency])
+                start += term_frequency
+            return
+        self.doc_ids.extend(doc_ids)
+        offsets = accumulate(term_frequencies, initial=self.position_offsets[-1])
+        next(offsets)
+        self.position_offsets.extend(offsets)
+        self.positions.extend(positions)
+
+    def insert_positions(self, doc_id, positions):
+        # Langsamer Weg für Dokumente vor dem letzten: einfügen und alle folgenden Offsets verschieben
+        doc_ids = self.doc_ids
+        offsets = self.position_offsets
+        i = bisect_left(doc_ids, doc_id)
+        new_document = doc_ids[i] != doc_id
+        if new_document:
+            doc_ids.insert(i, doc_id)
+            offsets.insert(i, offsets[i])
+        end = offsets[i + 1]
+        self.positions[end:end] = positions
+        for j in range(i + 1, len(offsets)):
+            offsets[j] += len(positions)
+        return new_document
+
+
+def compact_postings(documents):
+    """
+    Groups the token positions of (doc_id, tokens) documents by term into flat arrays.
+
+    Partial indexes of parallel builds are sent to the parent process in this
+    form: a few arrays pickle as raw bytes, where a dict of position lists per
+    term and document costs one object per posting and position.
+
+    Returns
+    -------
+    tuple
+        (terms, posting_offsets, position_offsets, doc_ids, term_frequencies,
+        positions): terms in order of first appearance; the postings of
+        terms[i] are doc_ids[posting_offsets[i]:posting_offsets[i + 1]] (ascending)
+        with their term_frequencies, and their positions are
+        positions[position_offsets[i]:position_offsets[i + 1]], document after document.
+    """
+    postings = {}
+    for doc_id, tokens in documents:
+        for position, token in enumerate(tokens):
+            term_postings = postings.get(token)
+            if term_postings is None:
+                term_postings = postings[token] = PositionalPostings()
+            term_postings.add_position(doc_id, position)
+
+    posting_offsets = array("Q", [0])
+    position_offsets = array("Q", [0])
+    doc_ids = array(TYPECODE)
+    term_frequencies = array(TYPECODE)
+    positions = array(TYPECODE)
+    for term_postings in postings.values():
+        doc_ids.extend(term_postings.doc_ids)
+        offsets = term_postings.position_offsets
+        term_frequencies.extend(map(int.__sub__, offsets[1:], offsets))
+        positions.extend(term_postings.positions)
+        posting_offsets.append(len(doc_ids))
+        position_offsets.append(len(positions))
+    return list(postings), posting_offsets, position_offsets, doc_ids, term_frequencies, positions
+
+
+def iter_compact_postings(compact):
+    """Yields (term, doc_ids, term_frequencies, positions) per term of a compact_postings result (array slices)."""
+    terms, posting_offsets, position_offsets, doc_ids, term_frequencies, positions = compact
+    for i, term in enumerate(terms):
+        start, end = posting_offsets[i], posting_offsets[i + 1]
+        yield term, doc_ids[start:end], term_frequencies[start:end], \
+            positions[position_offsets[i]:position_offsets[i + 1]]
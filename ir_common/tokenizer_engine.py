@@ -0,0 +1,133 @@
+"""
+Tokenizer engine shared by the vector space model and the boolean system.
+
+Produces exactly the tokens of the original two-pass normalization
+
+    text = text.lower()
+    text = re.sub(r'[^\\w\\s\\']|_', '', text)
+    text = re.sub(r"\\s'|'\\s", ' ', text)
+    text.split()
+
+but deletes the characters of the first pass with str.translate (a table
+that is filled lazily from the same pattern, so Unicode classes stay
+identical) and replaces the second regex by a scan over the apostrophes of
+the text with the same leftmost, non-overlapping matching.
+"""
+import re
+from collections import OrderedDict
+
+# Sonderzeichen (außer Leerzeichen und Apostroph) sowie Unterstriche
+REMOVED_CHARACTERS = r"[^\w\s'{keep}]|_"
+
+# Trennzeichen von tokenize_batch; es wird von der Normalisierung entfernt und kann daher in keinem Token vorkommen
+BATCH_SEPARATOR = "\x00"
+
+
+class _DeletionTable(dict):
+    """str.translate table that maps removed characters to None; decided per character on first use."""
+
+    def __init__(self, pattern):
+        super().__init__()
+        self.pattern = pattern
+
+    def __missing__(self, code_point):
+        if self.pattern.fullmatch(chr(code_point)):
+            self[code_point] = None
+            return None
+        # LookupError: Zeichen bleibt unverändert
+        raise LookupError(code_point)
+
+    def __reduce__(self):
+        return type(self), (self.pattern,)
+
+
+class TokenizerEngine:
+    """
+    Fast, output-identical replacement for the regex tokenizers of both systems.
+
+    Parameters
+    ----------
+    keep_characters : str
+        Additional characters that survive the normalization (the boolean
+        query parser keeps "\\" for proximity operators).
+    cache_size : int
+        Number of tokenized strings kept in an LRU memo cache (0 disables it).
+        Useful for repeated query strings; cached results are copied on return.
+    """
+
+    def __init__(self, keep_characters="", cache_size=0):
+        self.keep_characters = keep_characters
+        self.pattern = re.compile(REMOVED_CHARACTERS.format(keep=re.escape(keep_characters)))
+        self.table = _DeletionTable(self.pattern)
+        # Nur ASCII-Zeichen: vollständige Tabelle, die str.translate ohne Rückfall auf __missing__ nutzt
+        self.ascii_table = {code_point: None for code_point in range(128) if self.pattern.fullmatch(chr(code_point))}
+        self.batch_table = {code_point: None for code_point in self.ascii_table if chr(code_point) != BATCH_SEPARATOR}
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    def normalize(self, text):
+        """Lower-cases text and removes special characters and word-initial/-final apostrophes."""
+        text = text.lower()
+        text = text.translate(self.ascii_table if text.isascii() else self.table)
+        return strip_edge_apostrophes(text)
+
+    def tokenize(self, text):
+        """Returns the list of tokens of text."""
+        if not self.cache_size:
+            return self.normalize(text).split()
+        try:
+            tokens = self.cache[text]
+            self.cache.move_to_end(text)
+        except KeyError:
+            tokens = self.normalize(text).split()
+            self.cache[text] = tokens
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return list(tokens)
+
+    def tokenize_batch(self, texts):
+        """
+        Returns the token lists of many texts.
+
+        ASCII texts are normalized together as one string, joined by a separator
+        that the normalization removes and that does not touch the apostrophe
+        pass, so every text gets exactly the tokens of tokenize.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        joined = BATCH_SEPARATOR.join(texts)
+        if not joined.isascii() or any(BATCH_SEPARATOR in text for text in texts):
+            return [self.normalize(text).split() for text in texts]
+
+        # Das Trennzeichen bleibt beim Entfernen der Sonderzeichen erhalten
+        normalized = strip_edge_apostrophes(joined.lower().translate(self.batch_table))
+        return [text.split() for text in normalized.split(BATCH_SEPARATOR)]
+
+
+def strip_edge_apostrophes(text):
+    """
+    Returns re.sub(r"\\s'|'\\s", " ", text).
+
+    Only positions next to an apostrophe can start a match, so the text is
+    scanned with str.find; str.isspace is the predicate of \\s for str patterns.
+    """
+    apostrophe = text.find("'")
+    if apostrophe < 0:
+        return text
+    pieces = []
+    copied = 0  # Beginn des noch nicht übernommenen Texts
+    resume = 0  # Treffer überlappen nicht: frühester Beginn des nächsten Treffers
+    length = len(text)
+    while apostrophe >= 0:
+        if apostrophe - 1 >= resume and text[apostrophe - 1].isspace():
+            pieces.append(text[copied:apostrophe - 1])
+            pieces.append(" ")
+            copied = resume = apostrophe + 1
+        elif apostrophe >= resume and apostrophe + 1 < length and text[apostrophe + 1].isspace():
+            pieces.append(text[copied:apostrophe])
+            pieces.append(" ")
+            copied = resume = apostrophe + 2
+        apostrophe = text.find("'", apostrophe + 1)
+    pieces.append(text[copied:])
+    return "".join(pieces)
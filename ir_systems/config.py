@@ -1,4 +1,26 @@
+import os
+import sys
+
+# Gemeinsame Module beider Systeme (Paket ir_common) liegen im Wurzelverzeichnis des Repositories
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 collection_file = "../cisi/CISI.ALL"
 query_file = "../cisi/CISI.QRY"
 relevant_documents_file = "../cisi/CISI.REL"
+index_snapshot_file = "../cisi/CISI.ALL.snapshot"
+trec_run_file = "../cisi/CISI.QRY.run"
 config_k = 0.01
+# Raster für parameter_sweep.py
+weighting_parameter_grid = [0.001, 0.01, 0.1, 0.25, 0.5, 1.0, 2.0]
+# Adresse von query_server.py
+server_host = "127.0.0.1"
+server_port = 8080
+# Dimensionen des LSI-Index (VectorSpaceModel mit use_lsi) und Raster für lsi_index.py
+lsi_dimensions = 100
+lsi_dimension_grid = [25, 50, 100, 200, 400]
+# Erste Stufe des VectorSpaceModel mit use_tiered_index: Postings pro Term (None = alle) und Mindestbeitrag w / |d|
+champion_list_size = 50
+pruning_weight_threshold = None
+# Raster für static_pruning.py
+champion_list_grid = [10, 25, 50, 100, 200]
+pruning_weight_threshold_grid = [0.01, 0.02, 0.05]
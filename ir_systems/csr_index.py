@@ -0,0 +1,404 @@
+import copy
+import threading
+
+import numpy as np
+
+# Obergrenze für die Zellen der dichten Score-Matrix eines Batches (Anfragen x Dokumente)
+MAX_BATCH_CELLS = 1 << 24
+
+
+class CSRIndex:
+    """
+    NumPy-backed term-document index in CSR layout.
+
+    The postings of term ``t`` are stored contiguously in
+    ``posting_docs[term_offsets[t]:term_offsets[t + 1]]`` (document positions in
+    file order), ``posting_tfs`` (term frequencies) and ``posting_weights``
+    (precomputed weights w(t, d)). Document lengths and vector norms are held as
+    arrays indexed by the document position, so a query is scored with a few
+    vectorized gathers and adds.
+
+    Attributes
+    ----------
+    doc_ids : np.ndarray
+        Document ids in file order.
+    doc_lengths : np.ndarray
+        Number of tokens per document.
+    term_rows : BaseVocabulary
+        Maps a term to its row in the CSR arrays, which is its term id (any
+        mapping that raises KeyError for unknown terms).
+    term_offsets : np.ndarray
+        Start of each row in the posting arrays (length: vocabulary size + 1).
+    document_frequency : np.ndarray
+        Document frequency per row.
+    scoring : ScoringFunction
+        The weighting scheme of posting_weights and document_vector_length.
+    posting_weights : np.ndarray
+        w(t, d) for every posting, computed with the scoring function.
+    document_vector_length : np.ndarray
+        Euclidean norm of every document vector (1 if the scoring function does not normalize).
+    posting_length_ratios : np.ndarray
+        len(d) / avg_len per posting; independent of the scoring function, so it
+        is computed on the first reweight and then reused.
+    collection_size, collection_document_frequency
+        Number of documents and document frequency per row of the whole
+        collection. They equal number_of_documents and document_frequency
+        unless the index holds only a shard of the collection (see
+        collection_statistics).
+    """
+
+    def __init__(self, doc_ids, doc_lengths, term_rows, term_offsets, posting_docs, posting_tfs, scoring,
+                 posting_weights=None, document_vector_length=None, collection_statistics=None):
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.int64)
+        self.term_rows = term_rows
+        self.term_offsets = np.asarray(term_offsets, dtype=np.int64)
+        self.posting_docs = np.asarray(posting_docs, dtype=np.int64)
+        self.posting_tfs = np.asarray(posting_tfs, dtype=np.int64)
+
+        self.number_of_documents = len(self.doc_ids)
+        self.document_frequency = np.diff(self.term_offsets)
+        # Bei einem Shard gelten N, avg_len und df der ganzen Sammlung (Anzahl, mittlere Länge, df pro Zeile)
+        if collection_statistics is None:
+            self.collection_size = self.number_of_documents
+            self.average_doc_len = self.doc_lengths.sum() / self.number_of_documents
+            self.collection_document_frequency = self.document_frequency
+        else:
+            self.collection_size, self.average_doc_len, document_frequency = collection_statistics
+            self.collection_document_frequency = np.asarray(document_frequency, dtype=np.int64)
+        self.posting_length_ratios = None
+        # Wiederverwendeter Akkumulator pro Thread (siehe accumulate_touched)
+        self.accumulators = threading.local()
+
+        # Gespeicherte Gewichte und Normen (z.B. aus einem Snapshot) werden übernommen, nicht neu berechnet
+        if posting_weights is None or document_vector_length is None:
+            self.scoring = None
+            self.posting_weights = None
+            self.document_vector_length = None
+            self.reweight(scoring)
+        else:
+            self.scoring = scoring
+            self.posting_weights = np.asarray(posting_weights, dtype=np.float64)
+            self.document_vector_length = np.asarray(document_vector_length, dtype=np.float64)
+
+    @classmethod
+    def from_model(cls, model, scoring):
+        """
+        Builds the CSR arrays from the posting lists of a VectorSpaceModel.
+
+        Row ``i`` holds the postings of term id ``i`` of ``model.vocabulary`` and
+        documents follow the order of ``model.doc_id_length_mapping``, so every
+        sum is accumulated in the same order as in the dictionary-based reference path.
+        """
+        doc_ids = list(model.doc_id_length_mapping.keys())
+        doc_lengths = list(model.doc_id_length_mapping.values())
+        doc_positions = model.doc_positions
+
+        term_offsets = [0]
+        posting_docs = []
+        posting_tfs = []
+        for postinglist in model.postinglists:
+            # Postings einer Zeile nach Dokumentposition (Dateireihenfolge) sortieren
+            row = sorted((doc_positions[doc_id], term_frequency)
+                         for doc_id, term_frequency in postinglist.iter_term_frequencies())
+            posting_docs.extend(position for position, _ in row)
+            posting_tfs.extend(term_frequency for _, term_frequency in row)
+            term_offsets.append(len(posting_docs))
+
+        return cls(doc_ids, doc_lengths, model.vocabulary, term_offsets, posting_docs, posting_tfs, scoring)
+
+    def weights(self, scoring):
+        """
+        Computes the posting weights and document norms for a scoring function.
+
+        The per-term part (idf) is computed once per row and repeated over the
+        postings of the row; the per-posting part is one vectorized kernel over
+        the term frequencies and length ratios. The index itself is not changed
+        (see reweight).
+
+        Returns
+        -------
+        tuple of np.ndarray
+            (posting weights, document vector lengths).
+        """
+        if self.posting_length_ratios is None:
+            self.posting_length_ratios = self.doc_lengths[self.posting_docs] / self.average_doc_len
+        posting_idf = np.repeat(scoring.idf(self.collection_document_frequency, self.collection_size),
+                                self.document_frequency)
+        posting_weights = scoring.term_frequency_weight(self.posting_tfs, self.posting_length_ratios) * posting_idf
+        if not scoring.normalize:
+            return posting_weights, np.ones(self.number_of_documents)
+        # Quadratsummen werden pro Dokument in Zeilenreihenfolge aufaddiert
+        document_vector_length = np.sqrt(np.bincount(self.posting_docs, weights=posting_weights * posting_weights,
+                                                     minlength=self.number_of_documents))
+        return posting_weights, document_vector_length
+
+    def reweight(self, scoring):
+        """Recomputes all posting weights and document norms for a scoring function."""
+        self.posting_weights, self.document_vector_length = self.weights(scoring)
+        self.scoring = scoring
+
+    def reweighted(self, scoring):
+        """
+        Returns a copy of the index with the weights of a scoring function.
+
+        The copy shares the posting, vocabulary and document arrays with this
+        index; only the weights and norms are new arrays.
+        """
+        index = copy.copy(self)
+        index.reweight(scoring)
+        return index
+
+    def get_row(self, term):
+        try:
+            return self.term_rows[term]
+        except KeyError:
+            return None
+
+    def postings(self, row):
+        """Returns (document positions, term frequencies, weights) of a row."""
+        start, end = self.term_offsets[row], self.term_offsets[row + 1]
+        return self.posting_docs[start:end], self.posting_tfs[start:end], self.posting_weights[start:end]
+
+    def query_rows(self, query_terms):
+        """Returns the rows of all known query terms in query order (duplicates are kept)."""
+        return self.term_rows.ids(query_terms)
+
+    def accumulate(self, query_terms):
+        """
+        Sums w(t, d) over all query terms (unknown terms are ignored).
+
+        Duplicate query terms are added once per occurrence, in query order.
+        """
+        return self.accumulate_rows(self.query_rows(query_terms))
+
+    def accumulate_rows(self, rows):
+        scores = np.zeros(self.number_of_documents)
+        for row in rows:
+            start, end = self.term_offsets[row], self.term_offsets[row + 1]
+            scores[self.posting_docs[start:end]] += self.posting_weights[start:end]
+        return scores
+
+    def accumulate_touched(self, rows):
+        """
+        accumulate_rows for the touched documents only.
+
+        The weights are added into an accumulator of length N that is
+        allocated once per thread and reset afterwards at the touched
+        positions only, so a query costs O(postings + touched documents)
+        instead of a new array of N zeros.
+
+        Returns
+        -------
+        tuple of np.ndarray
+            (sorted touched positions, their sums of w(t, d)).
+        """
+        return accumulate_touched(self.accumulators, self.number_of_documents, self.term_offsets, self.posting_docs,
+                                  self.posting_weights, rows)
+
+    def accumulate_candidates(self, rows, candidates):
+        """
+        Sums w(t, d) over the rows for the sorted candidate positions only.
+
+        Every distinct row is searched for the candidates with one binary
+        search; the weights are added row by row in query order (a missing
+        posting adds 0), so the sums equal those of accumulate_rows at the
+        candidate positions.
+        """
+        accumulated = np.zeros(len(candidates))
+        if len(candidates) == 0:
+            return accumulated
+        # Gewichte wiederholter Terme nur einmal nachschlagen
+        row_weights = {}
+        for row in rows:
+            weights = row_weights.get(row)
+            if weights is None:
+                start, end = self.term_offsets[row], self.term_offsets[row + 1]
+                if start == end:
+                    continue
+                docs = self.posting_docs[start:end]
+                found = np.minimum(np.searchsorted(docs, candidates), end - start - 1)
+                weights = row_weights[row] = np.where(docs[found] == candidates,
+                                                      self.posting_weights[start:end][found], 0.0)
+            accumulated += weights
+        return accumulated
+
+    def touched_documents(self, rows):
+        """Returns the sorted positions of all documents in the posting lists of the rows."""
+        return touched_documents(self.term_offsets, self.posting_docs, rows)
+
+    def cosine_scores(self, query_terms):
+        return self.accumulate(query_terms) / self.document_vector_length
+
+    def rank(self, query_terms, k):
+        """
+        Returns the ids of the k best documents.
+
+        Only documents in the posting lists of the query terms are normalized and
+        considered; the k best are picked with argpartition. Ties are broken by
+        file order, exactly like the stable sort of the dictionary-based path.
+        Documents without a positive score follow in file order if fewer than k
+        documents scored.
+        """
+        return self.rank_rows(self.query_rows(query_terms), k)
+
+    def rank_rows(self, rows, k, with_scores=False, trace=None):
+        """rank for a query given as term ids (rows); trace (a QueryTrace) records the stage times."""
+        candidates, accumulated = self.accumulate_touched(rows)
+        if trace is not None:
+            trace.lap("accumulate")
+            trace.count(postings_scanned=int(self.document_frequency[rows].sum()),
+                        accumulators_touched=len(candidates))
+        return self.top_k_of_candidates(candidates, accumulated, k, with_scores, trace)
+
+    def rank_many(self, queries_terms, k):
+        """
+        Returns the ids of the k best documents for every query of a batch.
+
+        The batch is scored as one sparse matrix product: every (query, term)
+        entry of the query matrix is expanded to the postings of the term, and
+        the products are summed per (query, document) cell with np.bincount.
+        Entries are summed in query order, so each ranking is identical to rank.
+        """
+        return self.rank_many_rows([self.query_rows(query_terms) for query_terms in queries_terms], k)
+
+    def rank_many_rows(self, rows_per_query, k, with_scores=False):
+        """rank_many for queries given as term ids (rows)."""
+        batch_size = max(1, MAX_BATCH_CELLS // max(1, self.number_of_documents))
+
+        results = []
+        for start in range(0, len(rows_per_query), batch_size):
+            scores = self.accumulate_batch(rows_per_query[start:start + batch_size])
+            for query_scores in scores:
+                candidates = np.flatnonzero(query_scores)
+                results.append(self.top_k_of_candidates(candidates, query_scores[candidates], k, with_scores))
+        return results
+
+    def accumulate_batch(self, rows_per_query):
+        """Returns the matrix of accumulated weights (queries x documents) for a batch of row lists."""
+        query_index = np.repeat(np.arange(len(rows_per_query)), [len(rows) for rows in rows_per_query])
+        rows = np.fromiter((row for rows in rows_per_query for row in rows), dtype=np.int64, count=len(query_index))
+
+        # Alle Postings der Zeilen hintereinander: Indizes start..end-1 je (Anfrage, Term)-Eintrag
+        lengths = self.document_frequency[rows]
+        ends = np.cumsum(lengths)
+        posting_index = np.arange(ends[-1] if len(ends) else 0) + np.repeat(self.term_offsets[rows] - (ends - lengths),
+                                                                            lengths)
+        cells = np.repeat(query_index, lengths) * self.number_of_documents + self.posting_docs[posting_index]
+        scores = np.bincount(cells, weights=self.posting_weights[posting_index],
+                             minlength=len(rows_per_query) * self.number_of_documents)
+        return scores.reshape(len(rows_per_query), self.number_of_documents)
+
+    def top_k_of_candidates(self, candidates, accumulated, k, with_scores=False, trace=None):
+        """
+        Normalizes the accumulated weights of the candidate positions and returns the ids of the k best.
+
+        Documents without a positive score follow in file order if fewer than k
+        documents scored. With with_scores, (doc_id, score) pairs are returned;
+        the appended documents have score 0.
+        """
+        candidate_scores = accumulated / self.document_vector_length[candidates]
+        positive = candidate_scores > 0
+        candidates, candidate_scores = candidates[positive], candidate_scores[positive]
+        if trace is not None:
+            trace.lap("normalize")
+
+        order = top_k_order(candidates, candidate_scores, k)
+        top_k = self.doc_ids[candidates[order]].tolist()
+        scores = candidate_scores[order].tolist()
+        if len(top_k) < k:
+            # Unter den ersten (fehlende + Kandidaten) Positionen liegen genug Dokumente ohne Score
+            missing = k - len(top_k)
+            positions = np.arange(min(self.number_of_documents, missing + len(candidates)))
+            padding = self.doc_ids[np.setdiff1d(positions, candidates, assume_unique=True)[:missing]].tolist()
+            top_k.extend(padding)
+            scores.extend([0.0] * len(padding))
+        if trace is not None:
+            trace.lap("select")
+        if with_scores:
+            return list(zip(top_k, scores))
+        return top_k
+
+
+def touched_documents(term_offsets, posting_docs, rows):
+    """Returns the sorted positions of all documents in the posting lists of the rows of a CSR layout."""
+    if not rows:
+        return np.empty(0, dtype=np.int64)
+    documents = np.sort(np.concatenate([posting_docs[term_offsets[row]:term_offsets[row + 1]] for row in rows]))
+    if len(documents) == 0:
+        # Zeilen ohne Postings (z.B. vollständig beschnittene Terme einer ersten Stufe)
+        return documents
+    return documents[np.concatenate(([True], documents[1:] != documents[:-1]))]
+
+
+def accumulate_touched(accumulators, number_of_documents, term_offsets, posting_docs, posting_weights, rows):
+    """
+    Sums the weights of the rows of a CSR layout for the touched documents only.
+
+    The weights are added into an accumulator of length number_of_documents
+    that is kept per thread in accumulators (a threading.local) and reset
+    afterwards at the touched positions only.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        (sorted touched positions, their sums of the weights).
+    """
+    candidates = touched_documents(term_offsets, posting_docs, rows)
+    accumulator = getattr(accumulators, "scores", None)
+    if accumulator is None:
+        accumulator = accumulators.scores = np.zeros(number_of_documents)
+    try:
+        for row in rows:
+            start, end = term_offsets[row], term_offsets[row + 1]
+            accumulator[posting_docs[start:end]] += posting_weights[start:end]
+        return candidates, accumulator[candidates]
+    finally:
+        accumulator[candidates] = 0.0
+
+
+def permute_rows(term_offsets, row_order):
+    """
+    Returns the term offsets and the posting permutation that put the rows of
+    a CSR layout into row_order (new row i is old row row_order[i]).
+    """
+    row_lengths = np.diff(term_offsets)[row_order]
+    new_offsets = np.concatenate(([0], np.cumsum(row_lengths))).astype(np.int64)
+    posting_order = (np.arange(new_offsets[-1]) - np.repeat(new_offsets[:-1], row_lengths)
+                     + np.repeat(np.asarray(term_offsets)[:-1][row_order], row_lengths))
+    return new_offsets, posting_order
+
+
+def select_top_k(positions, scores, k):
+    """
+    Returns the k entries of ``positions`` with the highest scores.
+
+    Ties are broken by the smaller position. Uses argpartition, so only the
+    entries at or above the k-th largest score are sorted.
+
+    Parameters
+    ----------
+    positions : np.ndarray
+        Document positions (unique).
+    scores : np.ndarray
+        Score per position.
+    k : int
+        Number of entries to return.
+
+    Returns
+    -------
+    np.ndarray
+        The selected positions, best first.
+    """
+    return positions[top_k_order(positions, scores, k)]
+
+
+def top_k_order(positions, scores, k):
+    """Returns the indices (into positions and scores) of the entries select_top_k selects, best first."""
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        keep = np.flatnonzero(scores >= threshold)
+        return keep[np.lexsort((positions[keep], -scores[keep]))[:k]]
+    return np.lexsort((positions, -scores))[:k]
@@ -0,0 +1,226 @@
+import bisect
+import heapq
+
+import numpy as np
+
+# Relative Toleranz für Schranken: Summe normierter Beiträge vs. (Summe der Gewichte) / Norm
+BOUND_SLACK = 1e-9
+
+
+class PruningStatistics:
+    """
+    Counters of one pruned query.
+
+    Attributes
+    ----------
+    postings_total : int
+        Postings in the lists of all (distinct) query terms.
+    postings_scored : int
+        Postings whose weight was read for a candidate document.
+    postings_skipped : int
+        postings_total - postings_scored.
+    candidates : int
+        Documents that were fully scored.
+    """
+
+    def __init__(self, postings_total=0, postings_scored=0, candidates=0):
+        self.postings_total = postings_total
+        self.postings_scored = postings_scored
+        self.postings_skipped = postings_total - postings_scored
+        self.candidates = candidates
+
+    def __repr__(self):
+        return (f"PruningStatistics(postings_total={self.postings_total}, postings_scored={self.postings_scored}, "
+                f"postings_skipped={self.postings_skipped}, candidates={self.candidates})")
+
+
+class _Cursor:
+    """Document-at-a-time cursor over the posting list of one distinct query term."""
+
+    def __init__(self, index, row, multiplicity, pruning_index):
+        start, end = index.term_offsets[row], index.term_offsets[row + 1]
+        self.row = row
+        self.docs = index.posting_docs[start:end].tolist()
+        self.weights = index.posting_weights[start:end].tolist()
+        self.contributions = pruning_index.contributions[start:end].tolist()
+        block_start, block_end = pruning_index.row_block_offsets[row], pruning_index.row_block_offsets[row + 1]
+        self.block_max = (pruning_index.block_max[block_start:block_end] * multiplicity).tolist()
+        self.block_last_doc = pruning_index.block_last_doc[block_start:block_end].tolist()
+        self.upper_bound = pruning_index.term_max[row] * multiplicity
+        self.multiplicity = multiplicity
+        self.pointer = 0
+        self.block_pointer = 0
+
+    def block_bound(self, doc):
+        """Upper bound of the block that could contain doc (0 if the list has no such block)."""
+        self.block_pointer = bisect.bisect_left(self.block_last_doc, doc, self.block_pointer)
+        if self.block_pointer == len(self.block_last_doc):
+            return 0.0
+        return self.block_max[self.block_pointer]
+
+    def seek(self, doc):
+        """Moves to the first posting >= doc and returns its index if it belongs to doc, else None."""
+        self.pointer = bisect.bisect_left(self.docs, doc, self.pointer)
+        if self.pointer < len(self.docs) and self.docs[self.pointer] == doc:
+            return self.pointer
+        return None
+
+
+class DynamicPruningIndex:
+    """
+    Upper bounds for MaxScore with block-max refinement over a CSRIndex.
+
+    Bounds are kept for the normalized contribution w(t, d) / |d| of a posting,
+    because that is what a document's cosine score sums up: one maximum per term
+    and one per block of ``block_size`` consecutive postings.
+
+    Query processing is document-at-a-time in file order. Terms are sorted by
+    their upper bound; the lists whose bounds together cannot reach the current
+    top-k threshold are non-essential and only probed for candidates that come
+    from the essential lists and survive the bound checks. Every candidate that
+    could enter the top-k is scored exactly like CSRIndex.accumulate, so the
+    result equals exhaustive scoring.
+
+    Parameters
+    ----------
+    index : CSRIndex
+        The index to prune over. Bounds are rebuilt when its scoring function changes.
+    block_size : int
+        Number of postings per block.
+    """
+
+    def __init__(self, index, block_size=64):
+        self.index = index
+        self.block_size = block_size
+        self.scoring = None
+        self.contributions = None
+        self.term_max = None
+        self.row_block_offsets = None
+        self.block_max = None
+        self.block_last_doc = None
+        self.build()
+
+    def build(self):
+        index = self.index
+        self.contributions = index.posting_weights / index.document_vector_length[index.posting_docs]
+        self.term_max = np.maximum.reduceat(self.contributions, index.term_offsets[:-1])
+
+        # Blockanfänge pro Zeile: start, start + B, ... < end
+        blocks_per_row = -(-index.document_frequency // self.block_size)
+        self.row_block_offsets = np.concatenate(([0], np.cumsum(blocks_per_row)))
+        block_rows = np.repeat(np.arange(len(blocks_per_row)), blocks_per_row)
+        block_number = np.arange(len(block_rows)) - self.row_block_offsets[block_rows]
+        block_starts = index.term_offsets[block_rows] + block_number * self.block_size
+        block_ends = np.minimum(block_starts + self.block_size, index.term_offsets[block_rows + 1])
+        self.block_max = np.maximum.reduceat(self.contributions, block_starts)
+        self.block_last_doc = index.posting_docs[block_ends - 1]
+        self.scoring = index.scoring
+
+    def rank(self, query_terms, k):
+        """
+        Returns the ids of the k best documents and the PruningStatistics of the query.
+
+        The ranking is identical to CSRIndex.rank.
+        """
+        return self.rank_rows(self.index.query_rows(query_terms), k)
+
+    def rank_rows(self, rows, k):
+        """rank for a query given as term ids (rows)."""
+        if k <= 0:
+            return [], PruningStatistics()
+        if self.scoring != self.index.scoring:
+            self.build()
+        index = self.index
+
+        multiplicities = {}
+        for row in rows:
+            multiplicities[row] = multiplicities.get(row, 0) + 1
+        cursors = sorted((_Cursor(index, row, multiplicity, self) for row, multiplicity in multiplicities.items()),
+                         key=lambda cursor: cursor.upper_bound)
+        postings_total = sum(len(cursor.docs) for cursor in cursors)
+
+        # prefix_bounds[i]: Summe der Schranken der Terme 0..i-1
+        prefix_bounds = [0.0]
+        for cursor in cursors:
+            prefix_bounds.append(prefix_bounds[-1] + cursor.upper_bound)
+
+        heap = []  # (score, -position), kleinstes Element = schwächstes Ergebnis
+        threshold = 0.0
+        first_essential = 0
+        postings_scored = 0
+        candidates = 0
+        norms = index.document_vector_length
+
+        # Heap der essentiellen Listen nach aktuellem Dokument; nicht mehr essentielle Listen werden verworfen
+        essential = [(cursor.docs[0], i) for i, cursor in enumerate(cursors)]
+        heapq.heapify(essential)
+
+        while essential and first_essential < len(cursors):
+            doc = essential[0][0]
+            found = {}
+            bound = prefix_bounds[first_essential]
+            while essential and essential[0][0] == doc:
+                _, i = heapq.heappop(essential)
+                if i < first_essential:
+                    continue
+                cursor = cursors[i]
+                found[cursor.row] = cursor.weights[cursor.pointer]
+                bound += cursor.contributions[cursor.pointer] * cursor.multiplicity
+                cursor.pointer += 1
+                postings_scored += 1
+                if cursor.pointer < len(cursor.docs):
+                    heapq.heappush(essential, (cursor.docs[cursor.pointer], i))
+            if not found:
+                continue
+
+            # Nicht-essentielle Listen absteigend nach Schranke prüfen, Schranke blockweise verschärfen
+            for i in range(first_essential - 1, -1, -1):
+                if bound * (1 + BOUND_SLACK) <= threshold:
+                    break
+                cursor = cursors[i]
+                bound -= cursor.upper_bound
+                block_bound = cursor.block_bound(doc)
+                if (bound + block_bound) * (1 + BOUND_SLACK) <= threshold:
+                    bound += block_bound
+                    break
+                position = cursor.seek(doc)
+                if position is not None:
+                    found[cursor.row] = cursor.weights[position]
+                    bound += cursor.contributions[position] * cursor.multiplicity
+                    postings_scored += 1
+
+            if bound * (1 + BOUND_SLACK) <= threshold:
+                continue
+
+            # Exakter Score in Anfragereihenfolge, wie in CSRIndex.accumulate
+            candidates += 1
+            score = 0.0
+            for row in rows:
+                if row in found:
+                    score += found[row]
+            score = score / norms[doc]
+            if score <= 0:
+                continue
+            if len(heap) < k:
+                heapq.heappush(heap, (score, -doc))
+            elif (score, -doc) > heap[0]:
+                heapq.heapreplace(heap, (score, -doc))
+            else:
+                continue
+
+            if len(heap) == k:
+                threshold = heap[0][0]
+                while first_essential < len(cursors) and prefix_bounds[first_essential + 1] * (1 + BOUND_SLACK) <= threshold:
+                    first_essential += 1
+
+        ranked = sorted(heap, key=lambda entry: (-entry[0], -entry[1]))
+        top_k = [int(index.doc_ids[-position]) for _, position in ranked]
+        if len(top_k) < k:
+            # Weniger als k Dokumente mit positivem Score: keines wurde ausgeschlossen
+            scored = {-position for _, position in ranked}
+            for position in range(index.number_of_documents):
+                if len(top_k) >= k:
+                    break
+                if position not in scored:
+                    top_k.append(int(index.doc_ids[position]))
+        return top_k, PruningStatistics(postings_total, postings_scored, candidates)
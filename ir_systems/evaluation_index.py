@@ -1,4 +1,5 @@
 from config import *
+from ir_common.cisi_reader import read_records, QUERY_MARKERS
 
 
 class EvaluationIndex:
@@ -9,35 +10,13 @@ class EvaluationIndex:
         self.extract_relevant_documents(relevant_documents_file)
 
     def extract_queries(self, file_path):
-        with open(file_path, "r") as file:
-            lines = file.readlines()
-            num_lines = len(lines)
-
-            print(f"Öffne Datei {file_path}")
-            print(f"Datei enthält {num_lines} Zeilen.")
-
-            i = 0
-            while i < num_lines:
-                if lines[i].startswith(".I"):
-                    # Hole Dokumenten-ID aus der Zeile (letztes Zeichen)
-                    query_id = int(lines[i].split()[-1])
-                    i += 1
-
-                    while not lines[i].startswith(".W"):
-                        i += 1
-
-                    # Zur nächsten Zeile nach einem ".W" (Beginn eines Abstract)
-                    i += 1
-
-                    abstract = ""
+        print(f"Öffne Datei {file_path}")
 
-                    # Füge alle Zeilen bis zur Referenzsektion (.X) dem Abstract hinzu
-                    while i < num_lines and not lines[i].startswith(".I"):
-                        abstract += lines[i]
-                        i += 1
+        # Der Anfragetext reicht von ".W" bis zur nächsten Anfrage
+        for query_id, fields in read_records(file_path, QUERY_MARKERS):
+            self.queries[query_id] = fields[".W"].strip()
 
-                    # Mapping zwischen doc_id und Länge des Abstracts
-                    self.queries[query_id] = abstract.strip()
+        print(f"Datei enthält {len(self.queries)} Anfragen.")
 
     def extract_relevant_documents(self, file_path):
         with open(file_path, "r") as file:
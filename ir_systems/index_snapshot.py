@@ -0,0 +1,245 @@
+import bisect
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+
+from csr_index import CSRIndex
+from scoring import make_scoring
+from vocabulary import BaseVocabulary
+
+SNAPSHOT_MAGIC = b"VSMSNAP\0"
+SNAPSHOT_VERSION = 2
+# Arrays beginnen an Vielfachen von 64 Byte, damit sie ausgerichtet gemappt werden
+ARRAY_ALIGNMENT = 64
+
+# Arrays des CSR-Index, die im Snapshot abgelegt werden (Name -> dtype)
+SNAPSHOT_ARRAYS = {
+    "doc_ids": np.int64,
+    "doc_lengths": np.int64,
+    "term_offsets": np.int64,
+    "posting_docs": np.int64,
+    "posting_tfs": np.int64,
+    "posting_weights": np.float64,
+    "document_vector_length": np.float64,
+}
+# Arrays des Vokabulars (Termbytes, Offsets, alphabetische Reihenfolge der Zeilen)
+VOCABULARY_ARRAYS = ("vocabulary_blob", "vocabulary_offsets", "vocabulary_sorted_rows")
+# Einträge, die jeder Header der aktuellen Version enthält
+HEADER_KEYS = ("version", "collection", "tokenizer", "scoring", "average_doc_len", "arrays")
+
+
+class SnapshotError(Exception):
+    """The snapshot file is missing, unreadable or of another format version."""
+
+
+class StaleSnapshotError(SnapshotError):
+    """The snapshot was built from another collection file or with another tokenizer."""
+
+
+def collection_fingerprint(file_path):
+    """Size, modification time and SHA-256 of the collection file."""
+    stat = os.stat(file_path)
+    return {"path": os.path.realpath(file_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_sha256(file_path)}
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tokenizer_fingerprint(tokenizer):
+    """Class name and SHA-256 of the sources of the modules that define the tokenizer and its engine."""
+    tokenizer_class = type(tokenizer)
+    source = inspect.getsource(inspect.getmodule(tokenizer_class))
+    # Die Normalisierung selbst liegt in der gemeinsamen TokenizerEngine
+    engine = getattr(tokenizer, "engine", None)
+    if engine is not None:
+        source += inspect.getsource(inspect.getmodule(type(engine)))
+    return {"class": f"{tokenizer_class.__module__}.{tokenizer_class.__qualname__}",
+            "sha256": hashlib.sha256(source.encode("utf-8")).hexdigest()}
+
+
+class MappedVocabulary(BaseVocabulary):
+    """
+    Read-only term -> row (term id) mapping over the memory-mapped vocabulary of a snapshot.
+
+    Terms are stored as one UTF-8 blob with offsets (in row order) plus the rows
+    sorted by term, so a lookup is a binary search and nothing is decoded at load time.
+    """
+
+    def __init__(self, blob, offsets, sorted_rows):
+        # memoryviews liefern beim Indizieren Python-Objekte statt NumPy-Skalaren (schnellere Binärsuche)
+        self.blob = memoryview(blob)
+        self.offsets = memoryview(offsets)
+        self.sorted_rows = memoryview(sorted_rows)
+        # Bereits nachgeschlagene Terme (höchstens das Vokabular)
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def term(self, row):
+        return bytes(self.blob[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+    def _term_bytes(self, i):
+        row = self.sorted_rows[i]
+        return self.blob[self.offsets[row]:self.offsets[row + 1]].tobytes()
+
+    def __getitem__(self, term):
+        try:
+            return self.cache[term]
+        except KeyError:
+            pass
+        encoded = term.encode("utf-8")
+        i = bisect.bisect_left(range(len(self)), encoded, key=self._term_bytes)
+        if i < len(self) and self._term_bytes(i) == encoded:
+            self.cache[term] = self.sorted_rows[i]
+            return self.cache[term]
+        raise KeyError(term)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.term(row)
+
+
+def save_snapshot(index, file_path, collection_file, tokenizer):
+    """
+    Writes a CSRIndex to a versioned binary snapshot.
+
+    Layout: magic, header length (8 bytes, little endian), JSON header, then
+    all arrays, each aligned to 64 bytes. The header records the format version,
+    the fingerprints of the collection file and the tokenizer, the scoring
+    function (name and parameters) and dtype, shape and offset of every array.
+    """
+    terms = [None] * len(index.term_rows)
+    for term, row in index.term_rows.items():
+        terms[row] = term.encode("utf-8")
+    term_offsets = np.concatenate(([0], np.cumsum([len(term) for term in terms]))).astype(np.int64)
+    sorted_rows = np.array(sorted(range(len(terms)), key=terms.__getitem__), dtype=np.int64)
+
+    arrays = {name: np.ascontiguousarray(getattr(index, name), dtype=dtype) for name, dtype in SNAPSHOT_ARRAYS.items()}
+    arrays["vocabulary_blob"] = np.frombuffer(b"".join(terms), dtype=np.uint8)
+    arrays["vocabulary_offsets"] = term_offsets
+    arrays["vocabulary_sorted_rows"] = sorted_rows
+
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "collection": collection_fingerprint(collection_file),
+        "tokenizer": tokenizer_fingerprint(tokenizer),
+        "scoring": {"name": index.scoring.name, "parameters": index.scoring.parameters},
+        "average_doc_len": float(index.average_doc_len),
+        "arrays": {},
+    }
+    # Offsets hängen von der Länge des Headers ab: mit Platzhaltern so lange auslegen, bis sie stabil sind
+    while True:
+        offset = _align(len(SNAPSHOT_MAGIC) + 8 + len(json.dumps(header).encode("utf-8")))
+        layout = {}
+        for name, array in arrays.items():
+            layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset = _align(offset + array.nbytes)
+        if layout == header["arrays"]:
+            break
+        header["arrays"] = layout
+    encoded_header = json.dumps(header).encode("utf-8")
+
+    temporary_path = file_path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(SNAPSHOT_MAGIC)
+        file.write(len(encoded_header).to_bytes(8, "little"))
+        file.write(encoded_header)
+        for name, array in arrays.items():
+            file.seek(layout[name]["offset"])
+            file.write(array.tobytes())
+        file.truncate(offset)
+    # Erst vollständig geschriebene Snapshots ersetzen den alten (atomar)
+    os.replace(temporary_path, file_path)
+
+
+def load_snapshot(file_path, collection_file, tokenizer):
+    """
+    Memory-maps a snapshot and returns it as CSRIndex.
+
+    All arrays are read-only memory maps, so several processes that load the
+    same snapshot share its pages.
+
+    Raises
+    ------
+    SnapshotError
+        If the file is missing, truncated or corrupt, or not a snapshot of the current version.
+    StaleSnapshotError
+        If it was built from another collection file or with another tokenizer.
+    """
+    header = read_header(file_path)
+    check_fingerprints(header, collection_file, tokenizer)
+
+    try:
+        file_size = os.path.getsize(file_path)
+        arrays = {name: _map_array(file_path, header["arrays"][name], file_size)
+                  for name in (*SNAPSHOT_ARRAYS, *VOCABULARY_ARRAYS)}
+    except (OSError, ValueError, TypeError, KeyError) as error:
+        raise SnapshotError(f"Arrays des Snapshots {file_path} können nicht gelesen werden: {error!r}") from error
+    vocabulary = MappedVocabulary(arrays["vocabulary_blob"], arrays["vocabulary_offsets"],
+                                  arrays["vocabulary_sorted_rows"])
+    return CSRIndex(arrays["doc_ids"], arrays["doc_lengths"], vocabulary, arrays["term_offsets"],
+                    arrays["posting_docs"], arrays["posting_tfs"],
+                    make_scoring(header["scoring"]["name"], **header["scoring"]["parameters"]),
+                    posting_weights=arrays["posting_weights"],
+                    document_vector_length=arrays["document_vector_length"])
+
+
+def read_header(file_path):
+    try:
+        with open(file_path, "rb") as file:
+            if file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise SnapshotError(f"{file_path} ist kein Index-Snapshot")
+            header_length = int.from_bytes(file.read(8), "little")
+            header = json.loads(file.read(header_length).decode("utf-8"))
+    # ValueError umfasst json.JSONDecodeError und UnicodeDecodeError (abgeschnittener oder beschädigter Header)
+    except (OSError, ValueError) as error:
+        raise SnapshotError(f"Snapshot {file_path} kann nicht gelesen werden: {error}") from error
+    if not isinstance(header, dict):
+        raise SnapshotError(f"Header des Snapshots {file_path} ist beschädigt")
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Snapshot-Version {header.get('version')} wird nicht unterstützt "
+                            f"(erwartet: {SNAPSHOT_VERSION})")
+    missing = [key for key in HEADER_KEYS if key not in header]
+    if missing:
+        raise SnapshotError(f"Header des Snapshots {file_path} ist unvollständig: {', '.join(missing)} fehlt")
+    return header
+
+
+def check_fingerprints(header, collection_file, tokenizer):
+    recorded = header["collection"]
+    if os.path.realpath(collection_file) != recorded["path"]:
+        raise StaleSnapshotError(f"Snapshot wurde aus {recorded['path']} aufgebaut, nicht aus {collection_file}")
+    stat = os.stat(collection_file)
+    if stat.st_size != recorded["size"]:
+        raise StaleSnapshotError(f"{collection_file} hat sich seit dem Snapshot geändert")
+    # Nur bei geänderter Änderungszeit wird der Inhalt gehasht
+    if stat.st_mtime_ns != recorded["mtime_ns"] and file_sha256(collection_file) != recorded["sha256"]:
+        raise StaleSnapshotError(f"{collection_file} hat sich seit dem Snapshot geändert")
+    if tokenizer_fingerprint(tokenizer) != header["tokenizer"]:
+        raise StaleSnapshotError("Snapshot wurde mit einem anderen Tokenizer aufgebaut")
+
+
+def _map_array(file_path, spec, file_size):
+    dtype = np.dtype(spec["dtype"])
+    shape = tuple(spec["shape"])
+    if 0 in shape:
+        return np.empty(shape, dtype=dtype)
+    offset = spec["offset"]
+    if offset < 0 or offset + int(np.prod(shape)) * dtype.itemsize > file_size:
+        raise ValueError(f"Array an Offset {offset} reicht über das Dateiende ({file_size} Bytes)")
+    # Einfache ndarray-Sicht auf die Memory-Map: Indizieren ohne den Overhead der memmap-Unterklasse
+    return np.asarray(np.memmap(file_path, dtype=dtype, mode="r", offset=offset, shape=shape))
+
+
+def _align(offset):
+    return -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
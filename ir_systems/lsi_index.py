@@ -0,0 +1,247 @@
+import sys
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from csr_index import MAX_BATCH_CELLS
+from config import *
+
+# Zusätzliche Zufallsvektoren und Potenziterationen der randomisierten SVD
+OVERSAMPLING = 10
+POWER_ITERATIONS = 2
+# Kandidaten für die exakte Nachbewertung: max(CANDIDATE_FACTOR * k, MIN_CANDIDATES)
+CANDIDATE_FACTOR = 10
+MIN_CANDIDATES = 100
+# Höchstens so viele Postings werden in einem Schritt der dünnen Matrixprodukte ausmultipliziert
+PRODUCT_CHUNK_CELLS = 1 << 22
+# Schnitt-Tiefe des Recalls in der Tabelle
+RECALL_CUTOFF = 10
+
+
+class LSIIndex:
+    """
+    Approximate candidate generation with latent semantic indexing over a CSRIndex.
+
+    The term-document matrix A with the entries w(t, d) / |d| (the document
+    vectors of the CSR index, normalized like the cosine score) is factorized
+    with a randomized truncated SVD, A ~ U S V^T (Halko, Martinsson and
+    Tropp). Documents are embedded as the rows of V S and terms as the rows of
+    U (both float32); a query is the sum of the embeddings of its terms, so its
+    dot product with a document embedding approximates the cosine score.
+
+    At query time the documents with the highest dot products are the
+    candidates, and only they are scored exactly with
+    CSRIndex.accumulate_candidates, which gives the scores of
+    CSRIndex.rank_rows bit for bit. Relevant documents outside the
+    candidates are missed; recall_at_k measures how many. More dimensions
+    approximate the scores better at the cost of a larger dense product.
+
+    Parameters
+    ----------
+    index : CSRIndex
+        The exact index (weights and norms of its scoring function).
+    dimensions : int
+        Number of singular vectors (at most the smaller side of A).
+    candidate_factor, min_candidates : int
+        A query for k documents reranks max(candidate_factor * k, min_candidates) candidates.
+    seed : int
+        Seed of the random projection of the SVD.
+    """
+
+    def __init__(self, index, dimensions, candidate_factor=CANDIDATE_FACTOR, min_candidates=MIN_CANDIDATES, seed=0):
+        self.index = index
+        self.candidate_factor = candidate_factor
+        self.min_candidates = min_candidates
+
+        start_time = time.perf_counter()
+        term_embeddings, self.singular_values, document_embeddings = randomized_svd(index, dimensions, seed)
+        self.dimensions = len(self.singular_values)
+        self.term_embeddings = term_embeddings.astype(np.float32)
+        self.document_embeddings = (document_embeddings * self.singular_values).astype(np.float32)
+        self.build_seconds = time.perf_counter() - start_time
+
+    def number_of_candidates(self, k):
+        return min(self.index.number_of_documents, max(self.candidate_factor * k, self.min_candidates))
+
+    def query_embeddings(self, rows_per_query):
+        """Sum of the term embeddings of every query (duplicate terms counted per occurrence)."""
+        embeddings = np.zeros((len(rows_per_query), self.dimensions), dtype=np.float32)
+        for i, rows in enumerate(rows_per_query):
+            if rows:
+                embeddings[i] = self.term_embeddings[rows].sum(axis=0)
+        return embeddings
+
+    def candidates(self, approximate_scores, k):
+        """Positions of the documents with the highest approximate scores, in file order."""
+        number_of_candidates = self.number_of_candidates(k)
+        if number_of_candidates >= len(approximate_scores):
+            return np.arange(len(approximate_scores))
+        return np.sort(np.argpartition(-approximate_scores, number_of_candidates - 1)[:number_of_candidates])
+
+    def rank_rows(self, rows, k, with_scores=False, trace=None):
+        """Returns the ids of the (approximately) k best documents for a query given as term ids (rows)."""
+        approximate_scores = self.document_embeddings @ self.query_embeddings([rows])[0]
+        candidates = self.candidates(approximate_scores, k)
+        accumulated = self.index.accumulate_candidates(rows, candidates)
+        if trace is not None:
+            trace.lap("accumulate")
+            trace.count(accumulators_touched=len(candidates))
+        return self.index.top_k_of_candidates(candidates, accumulated, k, with_scores, trace)
+
+    def rank_many_rows(self, rows_per_query, k, with_scores=False):
+        """rank_rows for a batch of queries; the dense products are computed for blocks of queries at once."""
+        batch_size = max(1, MAX_BATCH_CELLS // max(1, self.index.number_of_documents))
+        results = []
+        for start in range(0, len(rows_per_query), batch_size):
+            batch = rows_per_query[start:start + batch_size]
+            approximate_scores = self.query_embeddings(batch) @ self.document_embeddings.T
+            for rows, query_scores in zip(batch, approximate_scores):
+                candidates = self.candidates(query_scores, k)
+                results.append(self.index.top_k_of_candidates(
+                    candidates, self.index.accumulate_candidates(rows, candidates), k, with_scores))
+        return results
+
+    def recall_at_k(self, rows_per_query, k=RECALL_CUTOFF):
+        """
+        Compares the approximate top k with the exhaustive top k of the CSR index.
+
+        Only documents with a positive exact score count (the rest of an
+        exhaustive top k is padding in file order).
+
+        Returns
+        -------
+        dict
+            Mean recall, and mean and p95 latency in ms of the approximate and
+            the exhaustive ranking (single queries).
+        """
+        recalls = []
+        approximate_latencies = []
+        exhaustive_latencies = []
+        for rows in rows_per_query:
+            start_time = time.perf_counter()
+            approximate = self.rank_rows(rows, k)
+            approximate_latencies.append(time.perf_counter() - start_time)
+            start_time = time.perf_counter()
+            exhaustive = self.index.rank_rows(rows, k, with_scores=True)
+            exhaustive_latencies.append(time.perf_counter() - start_time)
+
+            relevant = [doc_id for doc_id, score in exhaustive if score > 0]
+            if relevant:
+                recalls.append(len(set(relevant).intersection(approximate)) / len(relevant))
+        approximate_latencies = np.array(approximate_latencies) * 1e3
+        exhaustive_latencies = np.array(exhaustive_latencies) * 1e3
+        return {
+            f"Recall@{k}": float(np.mean(recalls)) if recalls else None,
+            "LSI ms": float(approximate_latencies.mean()),
+            "LSI p95 ms": float(np.percentile(approximate_latencies, 95)),
+            "exhaustive ms": float(exhaustive_latencies.mean()),
+            "exhaustive p95 ms": float(np.percentile(exhaustive_latencies, 95)),
+        }
+
+
+def randomized_svd(index, dimensions, seed=0):
+    """
+    Truncated SVD of the normalized term-document matrix of a CSRIndex.
+
+    Randomized range finder with OVERSAMPLING extra columns and
+    POWER_ITERATIONS power iterations; A is never formed densely, all
+    products with A and A^T are computed from the posting arrays.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        (U: terms x dimensions, singular values, V: documents x dimensions).
+    """
+    number_of_terms = len(index.term_offsets) - 1
+    number_of_documents = index.number_of_documents
+    dimensions = min(dimensions, number_of_terms, number_of_documents)
+    sketch_size = min(dimensions + OVERSAMPLING, number_of_terms, number_of_documents)
+
+    posting_rows = np.repeat(np.arange(number_of_terms), index.document_frequency)
+    values = index.posting_weights / index.document_vector_length[index.posting_docs]
+    # A^T: dieselben Postings nach Dokument geordnet
+    document_order = np.argsort(index.posting_docs, kind="stable")
+    document_offsets = np.concatenate(([0], np.cumsum(np.bincount(index.posting_docs,
+                                                                  minlength=number_of_documents))))
+
+    def product(matrix):
+        return sparse_product(index.term_offsets, index.posting_docs, values, matrix)
+
+    def transposed_product(matrix):
+        return sparse_product(document_offsets, posting_rows[document_order], values[document_order], matrix)
+
+    rng = np.random.default_rng(seed)
+    basis, _ = np.linalg.qr(product(rng.standard_normal((number_of_documents, sketch_size))))
+    for _ in range(POWER_ITERATIONS):
+        document_basis, _ = np.linalg.qr(transposed_product(basis))
+        basis, _ = np.linalg.qr(product(document_basis))
+    # B = Q^T A ist klein (sketch_size x Dokumente); ihre SVD liefert die von A
+    small_u, singular_values, vt = np.linalg.svd(transposed_product(basis).T, full_matrices=False)
+    return basis @ small_u[:, :dimensions], singular_values[:dimensions], vt[:dimensions].T
+
+
+def sparse_product(offsets, columns, values, matrix):
+    """
+    Product of a sparse matrix in CSR layout with a dense matrix.
+
+    Row i of the result is the sum of values[p] * matrix[columns[p]] over the
+    entries p in offsets[i]:offsets[i + 1]. Rows are processed in chunks of
+    about PRODUCT_CHUNK_CELLS multiplied cells.
+    """
+    number_of_rows = len(offsets) - 1
+    result = np.zeros((number_of_rows, matrix.shape[1]))
+    chunk_entries = max(1, PRODUCT_CHUNK_CELLS // matrix.shape[1])
+    row = 0
+    while row < number_of_rows:
+        end_row = max(row + 1, int(np.searchsorted(offsets, offsets[row] + chunk_entries, side="right")) - 1)
+        end_row = min(end_row, number_of_rows)
+        start, end = offsets[row], offsets[end_row]
+        if end > start:
+            products = values[start:end, None] * matrix[columns[start:end]]
+            row_starts = offsets[row:end_row]
+            nonempty = row_starts < offsets[row + 1:end_row + 1]
+            # Leere Zeilen bleiben 0; reduceat summiert jeweils bis zum Anfang der nächsten nichtleeren Zeile
+            result[row:end_row][nonempty] = np.add.reduceat(products, row_starts[nonempty] - start, axis=0)
+        row = end_row
+    return result
+
+
+def print_dimension_sweep(results):
+    """Prints the build time, recall and latencies of every number of dimensions as a table."""
+    if not results:
+        return
+    metric_names = list(results[0][1].keys())
+    rows = [[dimensions] + [metrics[name] for name in metric_names] for dimensions, metrics in results]
+    print(tabulate(rows, ["dimensions"] + metric_names, tablefmt='fancy_grid', floatfmt=".4f"))
+
+
+def main():
+    # Dimensionen von der Kommandozeile, sonst das Raster aus config
+    dimension_values = [int(value) for value in sys.argv[1:]] or lsi_dimension_grid
+
+    from vec_space_model import VectorSpaceModel
+    from index_snapshot import SnapshotError
+    from evaluation_index import EvaluationIndex
+
+    vec_space_model = VectorSpaceModel(use_csr_index=True)
+    try:
+        vec_space_model.load_snapshot(index_snapshot_file, collection_file)
+    except SnapshotError as error:
+        print(f"Snapshot wird nicht verwendet: {error}")
+        vec_space_model.open_and_read(collection_file)
+
+    evaluation_index = EvaluationIndex()
+    rows_per_query = [vec_space_model.query_term_ids(query) for query in evaluation_index.queries.values()]
+
+    results = []
+    for dimensions in dimension_values:
+        lsi_index = LSIIndex(vec_space_model.csr_index, dimensions)
+        metrics = {"build s": lsi_index.build_seconds}
+        metrics.update(lsi_index.recall_at_k(rows_per_query))
+        results.append((lsi_index.dimensions, metrics))
+    print_dimension_sweep(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,22 +6,37 @@ from utility import *
 from retrieval_metrics import *
 from evaluation_index import *
 from tabulate import tabulate
+from ir_common.memory import print_memory_report
 
 
 def main():
     # Create the vector space model
-    vec_space_model = VectorSpaceModel()
+    vec_space_model = VectorSpaceModel(use_csr_index=True)
     retrival_scorer = RetrievalScorer(vec_space_model)
     evaluation_index = EvaluationIndex()
 
-    # Open and read the cisi file
-    vec_space_model.open_and_read(collection_file)
+    # Load the index snapshot; if it is missing or stale, read the cisi file and write a new snapshot
+    try:
+        vec_space_model.load_snapshot(index_snapshot_file, collection_file)
+    except SnapshotError as error:
+        print(f"Snapshot wird nicht verwendet: {error}")
+        vec_space_model.open_and_read(collection_file)
+        vec_space_model.save_snapshot(index_snapshot_file)
+
+    # Speicherbedarf des Index nach Struktur
+    print("\nSpeicherbedarf des Index:\n")
+    print_memory_report(vec_space_model.memory_report())
 
     # Print the first 5 results of all the dictionaries
     utility = Utility(vec_space_model, retrival_scorer, evaluation_index)
-    utility.print_dictionary("Dictionary", vec_space_model.dictionary)
-    utility.print_dictionary("term_index_mapping", vec_space_model.term_index_mapping)
-    utility.print_dictionary("doc_id_length_mapping", vec_space_model.doc_id_length_mapping)
+    utility.print_dictionary("Vocabulary", vec_space_model.vocabulary)
+    # Nach dem Laden eines Snapshots bleibt der Referenzpfad leer; die Dokumentlängen stehen im CSR-Index
+    doc_id_length_mapping = vec_space_model.doc_id_length_mapping or \
+        dict(zip(vec_space_model.csr_index.doc_ids.tolist(), vec_space_model.csr_index.doc_lengths.tolist()))
+    utility.print_dictionary("doc_id_length_mapping", doc_id_length_mapping)
+
+    # Alle Anfragen einmal abrufen (Run im TREC-Format speichern); alle Metriken werden aus diesem Run berechnet
+    retrival_scorer.build_run(evaluation_index.queries, trec_run_file)
 
     utility.calculate_and_print_MAP()
 
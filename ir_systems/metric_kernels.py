@@ -0,0 +1,203 @@
+import numpy as np
+
+# Recall-Stufen der 11-Punkt-Precision
+RECALL_LEVELS = np.linspace(0.0, 1.0, 11)
+
+
+class RunRelevance:
+    """
+    Binary relevance of the rankings of a run, one row per query.
+
+    Every metric kernel below works on these arrays for all queries at once.
+    Sums are built with cumulative sums along the rows, i.e. in rank order, so
+    the kernels return exactly the values of the per-query functions in
+    retrieval_metrics.
+
+    Parameters
+    ----------
+    rankings : list(list)
+        Retrieved document ids per query, best first (rankings may differ in length).
+    groundtruths : list(list)
+        Known relevant documents per query.
+
+    Attributes
+    ----------
+    hits : np.ndarray
+        hits[q, i] is True if the document at rank i + 1 of query q is relevant
+        (False beyond the end of a ranking).
+    cumulative_hits : np.ndarray
+        Number of relevant documents among the first i + 1 ranks.
+    lengths : np.ndarray
+        Length of every ranking.
+    relevant_counts : np.ndarray
+        Number of distinct relevant documents per query.
+    groundtruth_lengths : np.ndarray
+        Length of every groundtruth list (the cutoff of R-precision and 11-point AP).
+    """
+
+    def __init__(self, rankings, groundtruths):
+        self.lengths = np.array([len(ranking) for ranking in rankings], dtype=np.int64)
+        self.relevant_counts = np.array([len(set(groundtruth)) for groundtruth in groundtruths], dtype=np.int64)
+        self.groundtruth_lengths = np.array([len(groundtruth) for groundtruth in groundtruths], dtype=np.int64)
+
+        number_of_queries = len(rankings)
+        depth = int(self.lengths.max()) if number_of_queries else 0
+        documents = np.full((number_of_queries, depth), -1, dtype=np.int64)
+        documents[np.arange(depth) < self.lengths[:, None]] = np.fromiter(
+            (doc_id for ranking in rankings for doc_id in ranking), dtype=np.int64, count=int(self.lengths.sum()))
+        relevant = np.fromiter((doc_id for groundtruth in groundtruths for doc_id in groundtruth), dtype=np.int64,
+                               count=int(self.groundtruth_lengths.sum()))
+
+        # (Anfrage, Dokument)-Paare als eindeutige Schlüssel; Füllwerte (-1) treffen keinen Schlüssel
+        stride = int(max(documents.max(initial=0), relevant.max(initial=0))) + 1
+        relevant_keys = np.repeat(np.arange(number_of_queries), self.groundtruth_lengths) * stride + relevant
+        keys = np.where(documents >= 0, np.arange(number_of_queries)[:, None] * stride + documents, -1)
+        self.hits = np.isin(keys, relevant_keys)
+        self.cumulative_hits = np.cumsum(self.hits, axis=1)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def hits_at(self, cutoffs):
+        """Number of relevant documents among the first cutoffs[q] ranks of every query (cutoffs capped at the length)."""
+        cutoffs = np.minimum(cutoffs, self.lengths)
+        padded = np.concatenate((np.zeros((len(self), 1), dtype=np.int64), self.cumulative_hits), axis=1)
+        return padded[np.arange(len(self)), cutoffs], cutoffs
+
+
+def row_sums(values):
+    """Sums every row from left to right (the order of a Python loop)."""
+    if values.shape[1] == 0:
+        return np.zeros(values.shape[0])
+    return np.cumsum(values, axis=1)[:, -1]
+
+
+def divide(numerators, denominators):
+    """numerators / denominators with 0.0 where the denominator is 0 (the ZeroDivisionError case)."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominators != 0, numerators / np.where(denominators != 0, denominators, 1), 0.0)
+
+
+def average_precision(relevance):
+    """
+    Average precision per query as RetrievalScorer.MAP defines it.
+
+    For every relevant document at (0-based) rank i the precision of the first
+    i documents (without the document itself) is added; the sum is divided
+    by the number of relevant documents found.
+
+    Parameters
+    ----------
+    relevance : RunRelevance
+        Relevance of the full rankings.
+
+    Returns
+    -------
+    np.ndarray
+        AP per query.
+    """
+    ranks = np.arange(relevance.hits.shape[1])
+    precision_before = divide(relevance.cumulative_hits - relevance.hits, ranks)
+    summed = row_sums(np.where(relevance.hits, precision_before, 0.0))
+    found = relevance.cumulative_hits[:, -1] if relevance.hits.shape[1] else np.zeros(len(relevance), dtype=np.int64)
+    return divide(summed, found)
+
+
+def mean_average_precision(relevance):
+    """Mean of average_precision over all queries, summed in query order."""
+    return float(row_sums(average_precision(relevance)[None, :])[0] / len(relevance))
+
+
+def r_precision(relevance):
+    """
+    R-precision per query: relevant documents among the first R ranks divided by
+    the number of distinct relevant documents, with R the length of the groundtruth list.
+    """
+    hits, _ = relevance.hits_at(relevance.groundtruth_lengths)
+    return divide(hits, relevance.relevant_counts)
+
+
+def precision_recall_fscore_at(relevance, cutoffs, beta=1.0):
+    """
+    Precision, recall and f-measure of the first k documents for every k in cutoffs.
+
+    Parameters
+    ----------
+    relevance : RunRelevance
+        Relevance of rankings that are at least max(cutoffs) long (shorter
+        rankings are evaluated as retrieved).
+    cutoffs : list(int)
+        The values of k.
+    beta : float
+        beta parameter weighting precision vs. recall
+
+    Returns
+    -------
+    tuple of np.ndarray
+        (precision, recall, f-measure), each of shape (queries, len(cutoffs)).
+    """
+    precisions, recalls, fscores = [], [], []
+    for cutoff in cutoffs:
+        hits, retrieved = relevance.hits_at(np.full(len(relevance), cutoff))
+        calculated_precision = divide(hits, retrieved)
+        calculated_recall = divide(hits, relevance.relevant_counts)
+        precisions.append(calculated_precision)
+        recalls.append(calculated_recall)
+        fscores.append((1 + beta ** 2) * divide(calculated_precision * calculated_recall,
+                                                (beta ** 2 * calculated_precision) + calculated_recall))
+    return tuple(np.stack(values, axis=1) if values else np.zeros((len(relevance), 0))
+                 for values in (precisions, recalls, fscores))
+
+
+def eleven_point_average_precision(relevance):
+    """
+    11-point average precision per query as RetrievalScorer.elevenPointAP defines it.
+
+    The first R ranks are scanned (R = length of the groundtruth list); a rank
+    records its precision for the next recall level if its recall reaches that
+    level, so at most one level is filled per rank. Missing levels are 0.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        (11-point average precision per query, precision levels of shape (queries, 11)).
+    """
+    number_of_queries, depth = relevance.hits.shape
+    cutoffs = np.minimum(relevance.groundtruth_lengths, relevance.lengths)
+    steps = np.arange(1, depth + 1)
+    precision = relevance.cumulative_hits / steps
+    recall = divide(relevance.cumulative_hits, relevance.groundtruth_lengths[:, None])
+    # Erreichbare Stufen je Rang; gefüllte Stufen p_i = min(c_i, p_(i-1) + 1) = i + min_(j<=i)(c_j - j), c_0 = 0
+    reachable = np.searchsorted(RECALL_LEVELS, recall, side="right")
+    reachable = np.concatenate((np.zeros((number_of_queries, 1), dtype=np.int64), reachable), axis=1)
+    offsets = np.arange(depth + 1)
+    filled = np.minimum.accumulate(reachable - offsets, axis=1) + offsets
+    recorded = (np.diff(filled, axis=1) > 0) & (steps <= cutoffs[:, None])
+
+    precision_levels = np.zeros((number_of_queries, len(RECALL_LEVELS)))
+    rows, columns = np.nonzero(recorded)
+    precision_levels[rows, filled[rows, columns + 1] - 1] = precision[rows, columns]
+    return row_sums(precision_levels) / len(RECALL_LEVELS), precision_levels
+
+
+def ndcg_at(relevance, cutoffs):
+    """
+    nDCG of the first k documents for every k in cutoffs (binary gains, log2 discount).
+
+    Returns
+    -------
+    np.ndarray
+        nDCG of shape (queries, len(cutoffs)); 0 for queries without relevant documents.
+    """
+    depth = max(relevance.hits.shape[1], int(relevance.relevant_counts.max(initial=0)))
+    discounts = 1 / np.log2(np.arange(2, depth + 2))
+    gains = np.cumsum(np.where(relevance.hits, discounts[:relevance.hits.shape[1]], 0.0), axis=1)
+    gains = np.concatenate((np.zeros((len(relevance), 1)), gains), axis=1)
+    ideal_gains = np.concatenate(([0.0], np.cumsum(discounts)))
+
+    values = []
+    for cutoff in cutoffs:
+        retrieved = np.minimum(cutoff, relevance.lengths)
+        ideal = ideal_gains[np.minimum(cutoff, relevance.relevant_counts)]
+        values.append(divide(gains[np.arange(len(relevance)), retrieved], ideal))
+    return np.stack(values, axis=1) if values else np.zeros((len(relevance), 0))
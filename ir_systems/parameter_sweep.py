@@ -0,0 +1,117 @@
+import sys
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from vec_space_model import *
+from evaluation_index import EvaluationIndex
+from metric_kernels import *
+from scoring import TfIdfScoring
+from config import *
+
+# Schnitt-Tiefe der Metriken @k in der Tabelle
+SWEEP_CUTOFF = 10
+
+
+class WeightingParameterSweep:
+    """
+    Evaluates the vector space model for a grid of weighting parameters k without re-indexing.
+
+    The raw statistics (term frequencies, document frequencies and document
+    length ratios) are taken once from the CSR index and the evaluation queries are
+    tokenized once. For every k only the posting weights and document norms
+    are recomputed (vectorized, see CSRIndex.weights), all queries are ranked
+    with one batch product and the metrics are computed with the kernels of
+    metric_kernels. The rankings and metrics are identical to those of a model
+    built with config_k = k.
+
+    Parameters
+    ----------
+    csr_index : CSRIndex
+        The index; it is not changed (every k is evaluated on a reweighted copy).
+    query_rows : list(list)
+        Term ids (rows) of every evaluation query.
+    groundtruths : list(list)
+        Known relevant documents of every query.
+    cutoff : int
+        Depth of the metrics @k.
+    """
+
+    def __init__(self, csr_index, query_rows, groundtruths, cutoff=SWEEP_CUTOFF):
+        self.csr_index = csr_index
+        self.query_rows = query_rows
+        self.groundtruths = groundtruths
+        self.cutoff = cutoff
+
+    @classmethod
+    def from_model(cls, model, queries, groundtruths, cutoff=SWEEP_CUTOFF):
+        """Sweep over the CSR index of a VectorSpaceModel (built if necessary) for a list of query texts."""
+        if model.csr_index is None:
+            model.build_csr_index()
+        return cls(model.csr_index, [model.query_term_ids(query) for query in queries], groundtruths, cutoff)
+
+    def evaluate(self, k):
+        """
+        Ranks all queries with the weighting parameter k.
+
+        Returns
+        -------
+        dict
+            Maps a metric name to its value (mean over all queries).
+        """
+        index = self.csr_index.reweighted(TfIdfScoring(k))
+        rankings = index.rank_many_rows(self.query_rows, index.number_of_documents)
+        relevance = RunRelevance(rankings, self.groundtruths)
+        precisions, recalls, fscores = precision_recall_fscore_at(relevance, [self.cutoff])
+        return {
+            "MAP": mean_average_precision(relevance),
+            "R-Precision": float(np.mean(r_precision(relevance))),
+            "11-Point AP": float(np.mean(eleven_point_average_precision(relevance)[0])),
+            f"P@{self.cutoff}": float(np.mean(precisions)),
+            f"R@{self.cutoff}": float(np.mean(recalls)),
+            f"F@{self.cutoff}": float(np.mean(fscores)),
+            f"nDCG@{self.cutoff}": float(np.mean(ndcg_at(relevance, [self.cutoff]))),
+        }
+
+    def sweep(self, k_values):
+        """Returns (k, metrics) for every k of the grid, in grid order."""
+        return [(k, self.evaluate(k)) for k in k_values]
+
+
+def print_sweep(results):
+    """Prints the metrics of a sweep as a table (one row per k)."""
+    if not results:
+        return
+    metric_names = list(results[0][1].keys())
+    rows = [[k] + [metrics[name] for name in metric_names] for k, metrics in results]
+    print(tabulate(rows, ["k"] + metric_names, tablefmt='fancy_grid', floatfmt=".4f"))
+
+
+def main():
+    # Werte für k von der Kommandozeile, sonst das Raster aus config
+    k_values = [float(value) for value in sys.argv[1:]] or weighting_parameter_grid
+
+    vec_space_model = VectorSpaceModel(use_csr_index=True)
+    try:
+        vec_space_model.load_snapshot(index_snapshot_file, collection_file)
+    except SnapshotError as error:
+        print(f"Snapshot wird nicht verwendet: {error}")
+        vec_space_model.open_and_read(collection_file)
+
+    evaluation_index = EvaluationIndex()
+    query_ids = list(evaluation_index.queries.keys())
+    sweep = WeightingParameterSweep.from_model(vec_space_model,
+                                               [evaluation_index.queries[key] for key in query_ids],
+                                               [evaluation_index.relevant_documents[key] for key in query_ids])
+
+    start_time = time.perf_counter()
+    results = sweep.sweep(k_values)
+    elapsed_time = (time.perf_counter() - start_time) * 1e3
+
+    print_sweep(results)
+    print(f"Zeit für {len(k_values)} Werte von k: {elapsed_time:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,41 +1,281 @@
-class Postinglist:
+import bisect
+
+import numpy as np
+
+import config  # ergänzt sys.path um das Paket ir_common
+from ir_common.positional_postings import PositionalPostings
+
+
+class Postinglist(PositionalPostings):
+    """
+    Posting list of one term while the index is built.
+
+    Doc ids and positions are kept in the flat arrays of PositionalPostings
+    (ascending doc ids, no object per posting); get_positions_in_document
+    returns the positions of a document as an array (binary search), scoring
+    walks the list with iter_term_frequencies.
+    """
+    __slots__ = ("term",)
+
     def __init__(self, docid: int = None, position: int = None, term: str = None):
-        self.postinglist = []
-        self.occurrence = 0
-        self.seen_docids = set()
-        self.positions = {}
+        super().__init__()
         self.term = term
 
         if docid:
             self.append(docid, position)
 
-    def __len__(self):
-        return len(self.postinglist)
-
     def __getitem__(self, idx):
-        return self.postinglist[idx]
+        return self.doc_ids[idx]
 
     def append(self, docid: int, position: int) -> None:
-        try:
-            self.positions[docid].append(position)
-        except KeyError:
-            self.positions[docid] = [position]
-            self.occurrence += 1
-
-        if docid in self.seen_docids:
-            pass
-        else:
-            self.postinglist.append(docid)
-            self.seen_docids.add(docid)
+        self.add_position(docid, position)
 
     def sort_postinglist(self) -> None:
-        self.postinglist = sorted(self.postinglist)
+        # Die Doc-Ids werden schon beim Einfügen sortiert gehalten
+        pass
 
     def get_postinglist(self):
-        return self.postinglist
+        return self.doc_ids.tolist()
 
     def get_positions_in_document(self, doc_id):
-        return self.positions[doc_id]
+        positions = self.positions_in_document(doc_id)
+        if positions is None:
+            raise KeyError(doc_id)
+        return positions
 
     def get_document_frequency(self):
-        return self.occurrence
+        return len(self.doc_ids)
+
+
+def narrow(array):
+    """Casts a non-negative integer array to the smallest unsigned dtype that holds its values."""
+    return array.astype(np.min_scalar_type(int(array.max()) if len(array) else 0))
+
+
+def encode_varint(values):
+    """
+    Variable-byte encodes non-negative integers (7 bits per byte, high bit set on all but the last byte).
+
+    Returns the encoded bytes and the number of bytes used per value.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    byte_counts = np.ones(len(values), dtype=np.int64)
+    remaining = values >> np.uint64(7)
+    while remaining.any():
+        byte_counts += remaining > 0
+        remaining >>= np.uint64(7)
+
+    value_index = np.repeat(np.arange(len(values)), byte_counts)
+    starts = np.cumsum(byte_counts) - byte_counts
+    byte_number = np.arange(len(value_index)) - starts[value_index]
+    encoded = ((values[value_index] >> (np.uint64(7) * byte_number.astype(np.uint64))) & np.uint64(0x7f)) \
+        .astype(np.uint8)
+    encoded[byte_number < byte_counts[value_index] - 1] |= 0x80
+    return encoded, byte_counts
+
+
+# Kürzere Puffer werden in Python dekodiert; dort überwiegt sonst der Aufwand der NumPy-Aufrufe
+SMALL_VARINT_BUFFER = 48
+
+
+def decode_varint(encoded):
+    """Decodes a buffer produced by encode_varint."""
+    encoded = np.asarray(encoded, dtype=np.uint8)
+    if len(encoded) <= SMALL_VARINT_BUFFER:
+        values = []
+        value = 0
+        shift = 0
+        for byte in encoded.tobytes():
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                values.append(value)
+                value = 0
+                shift = 0
+            else:
+                shift += 7
+        return np.array(values, dtype=np.int64)
+    is_last = encoded < 0x80
+    starts = np.flatnonzero(np.concatenate(([True], is_last[:-1])))
+    value_index = np.cumsum(np.concatenate(([0], is_last[:-1])))
+    byte_number = np.arange(len(encoded)) - starts[value_index]
+    parts = (encoded & np.uint8(0x7f)).astype(np.uint64) << (np.uint64(7) * byte_number.astype(np.uint64))
+    return np.bitwise_or.reduceat(parts, starts).astype(np.int64)
+
+
+class CompactPostingStore:
+    """
+    Shared storage of the compact posting lists of a whole dictionary.
+
+    All postings are kept in three streams, term after term: doc id gaps
+    (the first posting of a term relative to 0), term frequencies and position
+    gaps (the first position of a document relative to 0). The streams are cut
+    into blocks of ``block_size`` postings. Per block the offsets into the
+    three streams and the last doc id are stored, so a single block can be
+    located with a binary search and decoded on its own.
+
+    Parameters
+    ----------
+    postinglists : list(Postinglist)
+        Sorted posting lists to store.
+    compression : str or None
+        "varint" for variable-byte encoded streams, None for plain uint32 arrays.
+    block_size : int
+        Postings per block.
+    """
+
+    def __init__(self, postinglists, compression="varint", block_size=128):
+        self.compression = compression
+        self.block_size = block_size
+
+        document_frequencies = np.array([len(postinglist) for postinglist in postinglists], dtype=np.int64)
+        self.document_frequencies = narrow(document_frequencies)
+        docs = np.fromiter((doc_id for postinglist in postinglists for doc_id in postinglist.get_postinglist()),
+                           dtype=np.int64, count=document_frequencies.sum())
+        positions = [postinglist.get_positions_in_document(doc_id)
+                     for postinglist in postinglists for doc_id in postinglist.get_postinglist()]
+        tfs = np.fromiter((len(document_positions) for document_positions in positions), dtype=np.int64,
+                          count=len(docs))
+        positions = np.fromiter((position for document_positions in positions for position in document_positions),
+                                dtype=np.int64, count=tfs.sum())
+
+        term_starts = np.cumsum(document_frequencies) - document_frequencies
+        is_term_start = np.zeros(len(docs), dtype=bool)
+        is_term_start[term_starts[document_frequencies > 0]] = True
+        doc_gaps = np.diff(docs, prepend=0)
+        doc_gaps[is_term_start] = docs[is_term_start]
+
+        position_starts = np.cumsum(tfs) - tfs
+        position_gaps = np.diff(positions, prepend=0)
+        position_gaps[position_starts[tfs > 0]] = positions[position_starts[tfs > 0]]
+
+        # Blöcke: pro Term start, start + B, ... (Blöcke reichen nie über Termgrenzen)
+        blocks_per_term = -(-document_frequencies // block_size)
+        self.term_block_offsets = narrow(np.concatenate(([0], np.cumsum(blocks_per_term))))
+        block_terms = np.repeat(np.arange(len(postinglists)), blocks_per_term)
+        block_starts = term_starts[block_terms] + \
+            (np.arange(len(block_terms)) - self.term_block_offsets[block_terms]) * block_size
+        block_ends = np.minimum(block_starts + block_size, term_starts[block_terms] + document_frequencies[block_terms])
+        self.block_last_doc = narrow(docs[block_ends - 1] if len(block_ends) else np.empty(0, dtype=np.int64))
+        self.block_first_is_term_start = is_term_start[block_starts] if len(block_starts) else np.empty(0, dtype=bool)
+
+        self.doc_stream, doc_units = self._encode(doc_gaps)
+        self.tf_stream, tf_units = self._encode(tfs)
+        self.position_stream, position_units = self._encode(position_gaps)
+
+        # Offsets der Blöcke in den Streams (in Bytes bzw. Elementen)
+        posting_offsets = np.concatenate((block_starts, [len(docs)]))
+        self.doc_block_offsets = narrow(np.concatenate(([0], np.cumsum(doc_units)))[posting_offsets])
+        self.tf_block_offsets = narrow(np.concatenate(([0], np.cumsum(tf_units)))[posting_offsets])
+        position_offsets = np.concatenate((position_starts, [len(positions)]))[posting_offsets]
+        self.position_block_offsets = narrow(np.concatenate(([0], np.cumsum(position_units)))[position_offsets])
+
+        self.cached_block = None
+        self.cached_decoded = None
+
+    def _encode(self, values):
+        if self.compression == "varint":
+            return encode_varint(values)
+        return values.astype(np.uint32), np.ones(len(values), dtype=np.int64)
+
+    def _decode(self, stream, start, end):
+        if self.compression == "varint":
+            return decode_varint(stream[start:end])
+        return stream[start:end].astype(np.int64)
+
+    def nbytes(self):
+        """Bytes used by the streams and the block tables."""
+        return sum(array.nbytes for array in (self.doc_stream, self.tf_stream, self.position_stream,
+                                             self.document_frequencies, self.term_block_offsets, self.block_last_doc,
+                                             self.block_first_is_term_start, self.doc_block_offsets,
+                                             self.tf_block_offsets, self.position_block_offsets))
+
+    def decode_docs(self, first_block, end_block):
+        """Decodes the doc ids of the consecutive blocks [first_block, end_block) of one term."""
+        gaps = self._decode(self.doc_stream, self.doc_block_offsets[first_block], self.doc_block_offsets[end_block])
+        if len(gaps) and not self.block_first_is_term_start[first_block]:
+            gaps[0] += self.block_last_doc[first_block - 1]
+        return np.cumsum(gaps)
+
+    def decode_block(self, block):
+        """
+        Decodes one block: doc ids, term frequencies, positions and position offsets per posting.
+
+        The last decoded block is cached (as lists), so walking a posting list in order decodes every block once.
+        """
+        if self.cached_block == block:
+            return self.cached_decoded
+        docs = self.decode_docs(block, block + 1)
+        tfs = self._decode(self.tf_stream, self.tf_block_offsets[block], self.tf_block_offsets[block + 1])
+        gaps = self._decode(self.position_stream, self.position_block_offsets[block],
+                            self.position_block_offsets[block + 1])
+        position_offsets = np.concatenate(([0], np.cumsum(tfs)))
+        # Positionen je Dokument aufsummieren: kumulierte Summe minus Summe vor dem Dokument
+        cumulated = np.cumsum(gaps)
+        before_document = np.repeat(cumulated[position_offsets[:-1]] - gaps[position_offsets[:-1]], tfs)
+        positions = cumulated - before_document
+        self.cached_block = block
+        self.cached_decoded = (docs.tolist(), tfs.tolist(), positions.tolist(), position_offsets.tolist())
+        return self.cached_decoded
+
+    def iter_blocks(self, first_block, end_block):
+        """Yields (doc ids, term frequencies) block by block."""
+        for block in range(first_block, end_block):
+            yield self.decode_docs(block, block + 1), \
+                self._decode(self.tf_stream, self.tf_block_offsets[block], self.tf_block_offsets[block + 1])
+
+    def postinglists(self, terms):
+        """Returns one CompactPostinglist per stored posting list (in storage order)."""
+        return [CompactPostinglist(self, term_number, term) for term_number, term in enumerate(terms)]
+
+
+class CompactPostinglist:
+    """
+    Read-only posting list backed by a CompactPostingStore.
+
+    Offers the read interface of Postinglist (get_postinglist,
+    get_positions_in_document, get_document_frequency, len, indexing) while
+    the postings stay delta and variable-byte encoded in the shared store.
+    """
+    __slots__ = ("store", "first_block", "end_block", "document_frequency", "term")
+
+    def __init__(self, store, term_number, term=None):
+        self.store = store
+        self.first_block = int(store.term_block_offsets[term_number])
+        self.end_block = int(store.term_block_offsets[term_number + 1])
+        self.document_frequency = int(store.document_frequencies[term_number])
+        self.term = term
+
+    def __len__(self):
+        return self.document_frequency
+
+    def __getitem__(self, idx):
+        return self.get_postinglist()[idx]
+
+    def get_postinglist(self):
+        return self.store.decode_docs(self.first_block, self.end_block).tolist()
+
+    def get_positions_in_document(self, doc_id):
+        store = self.store
+        block = store.cached_block
+        # Schneller Weg: zuletzt dekodierter Block dieses Terms enthält den Bereich von doc_id
+        if block is None or not (self.first_block <= block < self.end_block) \
+                or not (store.cached_decoded[0][0] <= doc_id <= store.cached_decoded[0][-1]):
+            block = bisect.bisect_left(store.block_last_doc, doc_id, self.first_block, self.end_block)
+        if block < self.end_block:
+            docs, _, positions, position_offsets = store.decode_block(block)
+            i = bisect.bisect_left(docs, doc_id)
+            if i < len(docs) and docs[i] == doc_id:
+                return positions[position_offsets[i]:position_offsets[i + 1]]
+        raise KeyError(doc_id)
+
+    def get_document_frequency(self):
+        return self.document_frequency
+
+    def iter_blocks(self):
+        """Decodes the list one block at a time and yields (doc ids, term frequencies) as arrays."""
+        return self.store.iter_blocks(self.first_block, self.end_block)
+
+    def iter_term_frequencies(self):
+        """Yields (doc_id, tf) for all documents of the term, decoding every block once."""
+        for docs, tfs in self.iter_blocks():
+            yield from zip(docs.tolist(), tfs.tolist())
@@ -0,0 +1,199 @@
+import bisect
+import json
+import time
+
+# Obergrenzen der Histogramm-Buckets in Sekunden (10 µs bis 10 s)
+DEFAULT_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+# Stufen einer Anfrage in Reihenfolge der Abarbeitung
+STAGES = ("tokenize", "lookup", "cache", "accumulate", "normalize", "select")
+
+COUNTERS = {
+    "postings_scanned": "Postings read while accumulating scores.",
+    "postings_skipped": "Postings skipped by dynamic pruning.",
+    "tier_fallbacks": "Queries answered by the full index because the pruned tier had fewer than k results.",
+    "accumulators_touched": "Documents that received a score accumulator.",
+    "results_returned": "Documents returned to the caller.",
+    "cache_hits": "Queries answered from the result cache.",
+    "cache_misses": "Queries that missed the result cache.",
+}
+
+
+class LatencyHistogram:
+    """
+    Histogram of durations with fixed bucket bounds (Prometheus semantics: a
+    value is counted in the first bucket whose upper bound is >= the value).
+
+    Parameters
+    ----------
+    bounds : tuple(float)
+        Increasing upper bounds in seconds; the implicit last bucket is +Inf.
+    """
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative_counts(self):
+        counts = []
+        total = 0
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+    def quantile(self, q):
+        """
+        Estimates the q-quantile in seconds by linear interpolation inside the
+        bucket that contains it (like histogram_quantile of Prometheus).
+        Returns None for an empty histogram.
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        lower = 0.0
+        previous = 0
+        for bound, cumulative in zip(self.bounds, self.cumulative_counts()):
+            if cumulative >= rank:
+                if cumulative == previous:
+                    return bound
+                return lower + (bound - lower) * (rank - previous) / (cumulative - previous)
+            lower, previous = bound, cumulative
+        # Im +Inf-Bucket: die größte endliche Grenze
+        return self.bounds[-1]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum_seconds": self.sum,
+            "mean_ms": self.sum / self.count * 1e3 if self.count else None,
+            "p50_ms": _milliseconds(self.quantile(0.5)),
+            "p95_ms": _milliseconds(self.quantile(0.95)),
+            "p99_ms": _milliseconds(self.quantile(0.99)),
+            "buckets": {_format_bound(bound): count
+                        for bound, count in zip(self.bounds + (float("inf"),), self.cumulative_counts())},
+        }
+
+
+class QueryTrace:
+    """
+    Timing of one query: every call of lap(stage) books the time since the
+    previous lap to that stage. Created by QueryMetrics.trace.
+    """
+
+    __slots__ = ("metrics", "start", "last")
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.start = self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.metrics.stages[stage].observe(now - self.last)
+        self.last = now
+
+    def count(self, **counters):
+        metrics_counters = self.metrics.counters
+        for name, value in counters.items():
+            metrics_counters[name] += value
+
+    def finish(self, results_returned):
+        self.metrics.latency.observe(time.perf_counter() - self.start)
+        self.metrics.queries += 1
+        self.metrics.counters["results_returned"] += results_returned
+
+
+class QueryMetrics:
+    """
+    Hot-path instrumentation of single queries of the VectorSpaceModel.
+
+    Per stage (tokenize, lookup, cache, accumulate, normalize, select) a
+    latency histogram is kept, plus one for the whole query and counters of
+    the work done (postings scanned, accumulators touched, ...). The model
+    only creates a QueryTrace per query if instrumentation is enabled; when
+    disabled, every stage boundary costs a single ``is not None`` check.
+
+    Stages that a query path does not have separately are booked to the
+    stage that contains them (MaxScore pruning scores and selects in one
+    pass, which is booked to accumulate).
+    """
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.latency = LatencyHistogram(self.bounds)
+        self.stages = {stage: LatencyHistogram(self.bounds) for stage in STAGES}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def trace(self):
+        return QueryTrace(self)
+
+    def stats(self):
+        """
+        Returns all metrics as a dict (the structure of to_json).
+
+        Stage histograms only count queries that passed through the stage.
+        """
+        return {
+            "queries": self.queries,
+            "latency": self.latency.to_dict(),
+            "stages": {stage: histogram.to_dict() for stage, histogram in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.stats(), indent=indent)
+
+    def to_prometheus(self, prefix="vsm"):
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines = [f"# HELP {prefix}_queries_total Queries answered by retrieve and retrieve_k.",
+                 f"# TYPE {prefix}_queries_total counter",
+                 f"{prefix}_queries_total {self.queries}",
+                 f"# HELP {prefix}_query_latency_seconds Latency of single queries.",
+                 f"# TYPE {prefix}_query_latency_seconds histogram"]
+        lines += _histogram_lines(f"{prefix}_query_latency_seconds", self.latency, "")
+        lines += [f"# HELP {prefix}_query_stage_seconds Latency of the stages of single queries.",
+                  f"# TYPE {prefix}_query_stage_seconds histogram"]
+        for stage, histogram in self.stages.items():
+            lines += _histogram_lines(f"{prefix}_query_stage_seconds", histogram, f'stage="{stage}",')
+        for name, description in COUNTERS.items():
+            lines += [f"# HELP {prefix}_{name}_total {description}",
+                      f"# TYPE {prefix}_{name}_total counter",
+                      f"{prefix}_{name}_total {self.counters[name]}"]
+        return "\n".join(lines) + "\n"
+
+    def dump(self, file_path, format="json"):
+        """Writes the metrics to file_path as "json" or "prometheus" text."""
+        if format not in ("json", "prometheus"):
+            raise ValueError(f"Unbekanntes Format: {format}")
+        with open(file_path, "w") as file:
+            file.write(self.to_json() if format == "json" else self.to_prometheus())
+
+
+def _histogram_lines(name, histogram, labels):
+    lines = [f'{name}_bucket{{{labels}le="{_format_bound(bound)}"}} {count}'
+             for bound, count in zip(histogram.bounds + (float("inf"),), histogram.cumulative_counts())]
+    labels = labels.rstrip(",")
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {histogram.sum!r}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def _milliseconds(seconds):
+    return None if seconds is None else seconds * 1e3
@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import json
+import time
+
+from vec_space_model import *
+from query_metrics import LatencyHistogram
+from config import *
+
+# Höchstens so viele Anfragen werden zusammen bewertet
+MAX_BATCH_SIZE = 32
+# So lange wartet ein Batch nach der ersten Anfrage auf weitere (Sekunden)
+MAX_BATCH_WAIT = 0.002
+# Zeitlimit einer Anfrage (Warteschlange + Bewertung) in Sekunden
+REQUEST_TIMEOUT = 5.0
+# Anfragen in der Warteschlange, ab denen mit 503 abgelehnt wird
+MAX_QUEUED_REQUESTS = 4096
+MAX_BODY_BYTES = 1 << 20
+MAX_K = 10000
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+                504: "Gateway Timeout"}
+
+
+class BadRequest(Exception):
+    """A request that cannot be read; answered with status and the connection closed."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def load_model(use_dynamic_pruning=False, shards=0):
+    """
+    The VectorSpaceModel of main.py: from the snapshot, or read from the
+    collection (and snapshotted). With shards, the collection is read into a
+    ShardedIndex of that many worker processes.
+    """
+    if shards:
+        vec_space_model = VectorSpaceModel(shards=shards)
+        vec_space_model.open_and_read(collection_file)
+        return vec_space_model
+    vec_space_model = VectorSpaceModel(use_csr_index=True, use_dynamic_pruning=use_dynamic_pruning)
+    try:
+        vec_space_model.load_snapshot(index_snapshot_file, collection_file)
+    except SnapshotError as error:
+        print(f"Snapshot wird nicht verwendet: {error}")
+        vec_space_model.open_and_read(collection_file)
+        vec_space_model.save_snapshot(index_snapshot_file)
+    return vec_space_model
+
+
+# Modell eines Prozesses des Worker-Pools (--processes); die Snapshot-Seiten teilen sich alle Prozesse
+_worker_model = None
+
+
+def _load_worker_model():
+    global _worker_model
+    with contextlib.redirect_stdout(io.StringIO()):
+        _worker_model = load_model()
+
+
+def _score_in_worker(queries, k):
+    return _worker_model.retrieve_many_with_scores(queries, k)
+
+
+class MicroBatcher:
+    """
+    Collects concurrent queries into small batches and scores each batch with one call.
+
+    A batch is closed when it has max_batch_size queries or max_wait seconds
+    after its first query arrived. It is scored with score_batch(queries, k)
+    in the executor, for the largest k of the batch; every request gets the
+    prefix of its own k (rankings are prefix-consistent, ties are broken by
+    file order). At most ``parallel_batches`` batches are scored at the same time.
+
+    Parameters
+    ----------
+    score_batch : callable
+        (list of query texts, k) -> list of [(doc_id, score), ...]; must be
+        picklable for a process pool.
+    executor : concurrent.futures.Executor
+        Pool that runs score_batch off the event loop.
+    """
+
+    def __init__(self, score_batch, executor, parallel_batches=1, max_batch_size=MAX_BATCH_SIZE,
+                 max_wait=MAX_BATCH_WAIT):
+        self.score_batch = score_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(parallel_batches)
+        self.batches = 0
+        self.batched_queries = 0
+        self.batch_sizes = {}
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.collect())
+
+    async def submit(self, query, k):
+        """Queues a query and waits for its ranking."""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((query, k, future))
+        return await future
+
+    async def collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                # Bereits wartende Anfragen ohne Verzögerung übernehmen
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Abgelaufene (abgebrochene) Anfragen nicht mehr bewerten
+            batch = [item for item in batch if not item[2].done()]
+            if batch:
+                await self.slots.acquire()
+                loop.create_task(self.score(batch))
+
+    async def score(self, batch):
+        try:
+            k = max(item[1] for item in batch)
+            self.batches += 1
+            self.batched_queries += len(batch)
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self.score_batch, [item[0] for item in batch], k)
+            except Exception as error:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                return
+            for (_, query_k, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result[:query_k])
+        finally:
+            self.slots.release()
+
+
+class QueryServer:
+    """
+    Local HTTP/JSON server around a loaded VectorSpaceModel.
+
+    Endpoints:
+
+    - POST /search with {"query": "...", "k": 10} returns
+      {"query": ..., "k": ..., "results": [{"doc_id": ..., "score": ...}, ...]}
+    - GET /health returns the status and the size of the index
+    - GET /stats returns request, batch and latency statistics
+
+    Concurrent searches are scored together in micro-batches (see
+    MicroBatcher) in a worker pool, so the event loop only parses requests
+    and writes responses. A request that is not answered within
+    request_timeout seconds gets 504; with more than max_queued_requests
+    waiting, new searches get 503. Connections are kept alive (HTTP/1.1).
+    """
+
+    def __init__(self, model, batcher, request_timeout=REQUEST_TIMEOUT, max_queued_requests=MAX_QUEUED_REQUESTS):
+        self.model = model
+        self.batcher = batcher
+        self.request_timeout = request_timeout
+        self.max_queued_requests = max_queued_requests
+        self.started = time.time()
+        self.latency = LatencyHistogram()
+        self.responses = {}
+        self.timeouts = 0
+        self.rejected = 0
+
+    async def serve(self, host, port):
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Server läuft auf http://{host}:{port} (POST /search, GET /health, GET /stats)")
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                start_time = time.perf_counter()
+                status, payload = await self.dispatch(method, path, body)
+                if path == "/search":
+                    self.latency.observe(time.perf_counter() - start_time)
+                self.responses[status] = self.responses.get(status, 0) + 1
+                await write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except BadRequest as error:
+            # Nicht lesbare Anfrage (Kopfzeilen, Länge): antworten und Verbindung schließen
+            with contextlib.suppress(ConnectionError):
+                await write_response(writer, error.status, {"error": str(error)}, False)
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def dispatch(self, method, path, body):
+        if path == "/search":
+            if method != "POST":
+                return 405, {"error": "POST erwartet"}
+            return await self.search(body)
+        if path == "/health":
+            return 200, {"status": "ok", "documents": self.model.get_document_count(),
+                         "terms": len(self.model.vocabulary)}
+        if path == "/stats":
+            return 200, self.stats()
+        return 404, {"error": f"Unbekannter Pfad {path}"}
+
+    async def search(self, body):
+        try:
+            request = json.loads(body)
+            query = request["query"]
+            k = int(request.get("k", 10))
+            if not isinstance(query, str) or not 0 < k <= MAX_K:
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": f'Erwartet: {{"query": "...", "k": 1..{MAX_K}}}'}
+
+        if self.batcher.queue.qsize() >= self.max_queued_requests:
+            self.rejected += 1
+            return 503, {"error": "Überlastet"}
+        try:
+            results = await asyncio.wait_for(self.batcher.submit(query, k), self.request_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return 504, {"error": f"Zeitlimit von {self.request_timeout} s überschritten"}
+        except Exception as error:
+            return 500, {"error": str(error)}
+        return 200, {"query": query, "k": k,
+                     "results": [{"doc_id": doc_id, "score": score} for doc_id, score in results]}
+
+    def stats(self):
+        batcher = self.batcher
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "responses": {str(status): count for status, count in sorted(self.responses.items())},
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "queued": batcher.queue.qsize(),
+            "batches": batcher.batches,
+            "mean_batch_size": batcher.batched_queries / batcher.batches if batcher.batches else None,
+            "batch_sizes": {str(size): count for size, count in sorted(batcher.batch_sizes.items())},
+            "search_latency": self.latency.to_dict(),
+        }
+
+
+async def read_request(reader):
+    """
+    Reads one HTTP/1.x request; returns (method, path, body, keep_alive)
+    or None if the client closed the connection.
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise BadRequest(400, "Ungültige Anfragezeile") from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise BadRequest(400, "Ungültige Content-Length") from None
+    if length > MAX_BODY_BYTES:
+        raise BadRequest(413, "Anfrage zu groß")
+    body = await reader.readexactly(length) if length else b""
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+    return method, target.split("?", 1)[0], body, keep_alive
+
+
+async def write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                 .encode("latin-1") + body)
+    await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON server for the vector space model.")
+    parser.add_argument("--host", default=server_host)
+    parser.add_argument("--port", type=int, default=server_port)
+    parser.add_argument("--threads", type=int, default=1, help="worker threads that score batches")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="score in this many worker processes (each maps the index snapshot) instead")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="split the collection into this many shard processes (scatter-gather)")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--batch-wait-ms", type=float, default=MAX_BATCH_WAIT * 1e3)
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="request timeout in seconds")
+    arguments = parser.parse_args()
+
+    vec_space_model = load_model(shards=arguments.shards)
+    if arguments.processes > 0 and not arguments.shards:
+        executor = concurrent.futures.ProcessPoolExecutor(arguments.processes, initializer=_load_worker_model)
+        score_batch, parallel_batches = _score_in_worker, arguments.processes
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(arguments.threads)
+        score_batch, parallel_batches = vec_space_model.retrieve_many_with_scores, arguments.threads
+
+    batcher = MicroBatcher(score_batch, executor, parallel_batches, arguments.batch_size,
+                           arguments.batch_wait_ms / 1e3)
+    server = QueryServer(vec_space_model, batcher, arguments.timeout)
+    try:
+        asyncio.run(server.serve(arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+if __name__ == '__main__':
+    main()
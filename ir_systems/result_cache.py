@@ -0,0 +1,99 @@
+import sys
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Bounded LRU cache for ranked query results.
+
+    Entries are keyed on the sorted multiset of query term ids and the
+    key of the scoring function. An entry keeps the largest k computed for its key, so a cached
+    top-100 also answers a top-10 request (prefix reuse). Entries are evicted
+    in least-recently-used order once either ``max_entries`` or the estimated
+    ``max_bytes`` is exceeded. All entries are dropped as soon as the index
+    version passed to get/put changes.
+
+    Parameters
+    ----------
+    max_entries : int
+        Maximum number of cached queries.
+    max_bytes : int
+        Maximum estimated memory of all entries (keys and result lists).
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.index_version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query_terms, scoring_key):
+        return tuple(sorted(query_terms)), scoring_key
+
+    def get(self, key, k, index_version):
+        """Returns the cached top-k for key or None (a miss)."""
+        self._check_version(index_version)
+        try:
+            cached_k, results, _ = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        # Ein Eintrag mit weniger Ergebnissen als angefragt enthält bereits alle Dokumente
+        if k <= cached_k or len(results) < cached_k:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return results[:k]
+        self.misses += 1
+        return None
+
+    def put(self, key, k, results, index_version):
+        self._check_version(index_version)
+        if key in self.entries:
+            cached_k, cached_results, size = self.entries.pop(key)
+            self.current_bytes -= size
+            # Das längere Ergebnis behalten
+            if cached_k > k:
+                k, results = cached_k, cached_results
+        size = self._estimate_size(key, results)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (k, list(results), size)
+        self.current_bytes += size
+        while len(self.entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self.entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.current_bytes = 0
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _check_version(self, index_version):
+        if index_version != self.index_version:
+            if self.entries:
+                self.invalidations += 1
+            self.clear()
+            self.index_version = index_version
+
+    @staticmethod
+    def _estimate_size(key, results):
+        terms, _ = key
+        return sys.getsizeof(key) + sys.getsizeof(terms) + sum(sys.getsizeof(term) for term in terms) \
+            + sys.getsizeof(results) + sum(sys.getsizeof(doc_id) for doc_id in results)
@@ -16,3 +16,16 @@ class InitRetrievalSystem(ABC):
     @abstractmethod
     def retrieve_k(self, query, k):
         pass
+
+    def retrieve_many(self, queries, k=None):
+        # Standard: Anfragen einzeln abarbeiten; k=None liefert wie retrieve alle Dokumente
+        if k is None:
+            return [self.retrieve(query) for query in queries]
+        return [self.retrieve_k(query, k) for query in queries]
+
+    def retrieve_many_with_scores(self, queries, k=None):
+        # Standard für Systeme ohne Scores: absteigende Rangwerte (Anzahl - Rang) als Score
+        results = []
+        for ranking in self.retrieve_many(queries, k):
+            results.append([(doc_id, float(len(ranking) - rank)) for rank, doc_id in enumerate(ranking)])
+        return results
@@ -1,6 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from config import *
+from run import Run
+from metric_kernels import *
 
 
 def precision(y_true, y_pred):
@@ -129,6 +131,8 @@ class RetrievalScorer:
         Calculate the average precision score for a query.
     MAP(queries, groundtruths)
         Calculate the mean average precision for a list of queries.
+    build_run(queries, run_file=None)
+        Retrieve all queries once; the metrics of these queries are then computed from the run.
 
     """
     def __init__(self, system):
@@ -142,7 +146,51 @@ class RetrievalScorer:
         """
 
         self.retrieval_system = system
-    
+        # Run der Evaluationsanfragen (build_run); Anfragetext -> Anfrage-Id des Runs
+        self.run = None
+        self.run_query_ids = {}
+
+    def build_run(self, queries, run_file=None, tag="vsm", k=None):
+        """
+        Retrieves the full ranking (the k best documents with k) of every query once and caches it as a Run.
+
+        All metrics of these queries are afterwards computed from prefixes of the
+        cached rankings instead of retrieving them again.
+
+        Parameters
+        ----------
+        queries : dict
+            Maps a query id to the query text.
+        run_file : str
+            If given, the run is also written to this file in TREC run format.
+        k : int
+            Depth of the rankings; metrics of deeper prefixes see only these k documents.
+
+        Returns
+        -------
+        Run
+            The cached run.
+        """
+        self.run = Run.retrieve(self.retrieval_system, queries, k, tag)
+        self.run_query_ids = {query: query_id for query_id, query in queries.items()}
+        if run_file is not None:
+            self.run.save_trec(run_file)
+        return self.run
+
+    def ranking(self, query, k=None):
+        """The k best documents (all for k=None) for a query, taken from the run if the query is part of it."""
+        if self.run is not None and query in self.run_query_ids:
+            return self.run.ranking(self.run_query_ids[query], k)
+        if k is None:
+            return self.retrieval_system.retrieve(query)
+        return self.retrieval_system.retrieve_k(query, k)
+
+    def rankings(self, queries):
+        """Full rankings for a list of queries; queries missing from the run are retrieved in one batch."""
+        missing = [query for query in queries if query not in self.run_query_ids]
+        retrieved = dict(zip(missing, self.retrieval_system.retrieve_many(missing))) if missing else {}
+        return [retrieved[query] if query in retrieved else self.ranking(query) for query in queries]
+
     def rPrecision(self, y_true, query):
         """
         Calculates the precision at R where R denotes the number of all relevant
@@ -161,16 +209,8 @@ class RetrievalScorer:
             R-precision = TP / (TP + FN)
         """
 
-        result = self.retrieval_system.retrieve_k(query, len(y_true))
-        y_pred_set = set(result)
-        y_true_set = set(y_true)
-
-        tp = y_pred_set.intersection(y_true_set)
-
-        try:
-            return len(tp) / len(y_true_set)
-        except ZeroDivisionError:
-            return 0.0
+        relevance = RunRelevance([self.ranking(query, len(y_true))], [y_true])
+        return float(r_precision(relevance)[0])
 
     def elevenPointAP(self, query, y_true):
         """
@@ -188,42 +228,16 @@ class RetrievalScorer:
         Tuple: (float, list, list)
             (11-point average precision score, recall levels, precision levels).
         """
-        #Abrufen Ergebnisse fuer Abfrage
-        results = self.retrieval_system.retrieve_k(query, len(y_true))
-
-        #Initialisierung von Variablen fuer Berechnung der 11point..
-        relevant_results = 0
-        precision_levels = []
-        recall_levels = np.linspace(0.0, 1.0, 11)  #Festgelegte recalllvl Parameter
-
-        #Durchlaufen Ergebnisse
-        for i, result in enumerate(results, start=1):
-            #Ergebnis in  y_true-Liste ist dann ist es relevant
-            if result in y_true:
-                relevant_results += 1
-
-            precision = relevant_results / i
-            recall = relevant_results / len(y_true)
-
-            #Wenn aktuelle Abruf gleich oder groesser als das naechste recall lvl ist speichert man die precision
-            if recall >= recall_levels[len(precision_levels)]:
-                precision_levels.append(precision)
-
-        #Wenn nicht alle relevant realls erreicht, fuellt man restliche preciscion levels mit 0 auf
-        while len(precision_levels) < 11:
-            precision_levels.append(0.0)
-
-        #Berechnung der 11point...
-        average_precision = sum(precision_levels) / 11
-
-        return average_precision, list(recall_levels), precision_levels
+        relevance = RunRelevance([self.ranking(query, len(y_true))], [y_true])
+        average_precision, precision_levels = eleven_point_average_precision(relevance)
+        return float(average_precision[0]), list(RECALL_LEVELS), precision_levels[0].tolist()
 
     def eleven_point_precision_recall_curve(self, query, y_true):
         # result = self.elevenPointAP(query, y_true)
         # plt.plot(result[1], result[2], marker='o')
-        result = self.retrieval_system.retrieve_k(query, 11)
-        recall_array = [recall(y_true, result[:i]) for i in range(1, 11)]
-        precision_array = [precision(y_true, result[:i]) for i in range(1, 11)]
+        relevance = RunRelevance([self.ranking(query, 11)], [y_true])
+        precision_array, recall_array, _ = precision_recall_fscore_at(relevance, range(1, 11))
+        recall_array, precision_array = recall_array[0].tolist(), precision_array[0].tolist()
 
         plt.plot(recall_array, precision_array, marker='o')
 
@@ -249,30 +263,43 @@ class RetrievalScorer:
         Score: float
             MAP = frac{1}{|Q|} \cdot \sum_{q \in Q} AP(q).
         """
-        map = 0
-        for query_number in range(len(queries)):
-            query = queries[query_number]
-            result = self.retrieval_system.retrieve(query)
-            summ = 0
-            number_of_relevant_documents = 0
-            for i in range(len(result)):
-                if result[i] in groundtruths[query_number]:
-                    summ += precision(groundtruths[query_number], result[:i])
-                    number_of_relevant_documents += 1
-            try:
-                map += summ / number_of_relevant_documents
-            except ZeroDivisionError:
-                map += 0
-        return map / len(queries)
+        return mean_average_precision(self.relevance(queries, groundtruths))
+
+    def relevance(self, queries, groundtruths):
+        """RunRelevance of the full rankings of the queries (taken from the run where possible)."""
+        return RunRelevance(self.rankings(queries), groundtruths)
+
+    def r_precisions(self, queries, groundtruths):
+        """rPrecision of every query, computed for all queries at once."""
+        return r_precision(self.relevance(queries, groundtruths)).tolist()
+
+    def eleven_point_average_precisions(self, queries, groundtruths):
+        """The 11-point average precision (first value of elevenPointAP) of every query."""
+        return eleven_point_average_precision(self.relevance(queries, groundtruths))[0].tolist()
+
+    def precision_recall_fscore_at(self, queries, groundtruths, k_values, beta=1.0):
+        """
+        Precision, recall and f-measure of the first k documents of every query for every k.
+
+        Returns
+        -------
+        tuple of np.ndarray
+            (precision, recall, f-measure), each of shape (queries, len(k_values)).
+        """
+        return precision_recall_fscore_at(self.relevance(queries, groundtruths), k_values, beta)
+
+    def ndcg_at(self, queries, groundtruths, k_values):
+        """nDCG@k of every query for every k, shape (queries, len(k_values))."""
+        return ndcg_at(self.relevance(queries, groundtruths), k_values)
 
     def precision_at_k(self, query, y_true, k):
-        result = self.retrieval_system.retrieve_k(query, config_k)
+        result = self.ranking(query, k)
         return precision(y_true, result[:k])
 
     def recall_at_k(self, query, y_true, k):
-        result = self.retrieval_system.retrieve_k(query, config_k)
+        result = self.ranking(query, k)
         return recall(y_true, result[:k])
 
     def fscore_at_k(self, query, y_true, k):
-        result = self.retrieval_system.retrieve_k(query, config_k)
+        result = self.ranking(query, k)
         return fscore(y_true, result[:k])
@@ -0,0 +1,80 @@
+class Run:
+    """
+    Ranked documents with scores for a set of queries.
+
+    A run is retrieved once and every evaluation metric is computed from it.
+    It can be written to and read from the TREC run format: one line
+    ``query_id Q0 doc_id rank score tag`` per retrieved document, ranks
+    starting at 1.
+
+    Attributes
+    ----------
+    rankings : dict
+        Maps a query id to the list of retrieved document ids, best first.
+    scores : dict
+        Maps a query id to the score of every retrieved document.
+    tag : str
+        Name of the run (last column of the TREC format).
+    """
+
+    def __init__(self, rankings, scores, tag="vsm"):
+        self.rankings = rankings
+        self.scores = scores
+        self.tag = tag
+
+    @classmethod
+    def retrieve(cls, system, queries, k=None, tag="vsm"):
+        """
+        Retrieves the k best documents (all for k=None) of every query with one batch call.
+
+        Parameters
+        ----------
+        system : InitRetrievalSystem
+            The retrieval system.
+        queries : dict
+            Maps a query id to the query text.
+        """
+        rankings = {}
+        scores = {}
+        for query_id, result in zip(queries.keys(), system.retrieve_many_with_scores(list(queries.values()), k)):
+            rankings[query_id] = [doc_id for doc_id, _ in result]
+            scores[query_id] = [score for _, score in result]
+        return cls(rankings, scores, tag)
+
+    def __len__(self):
+        return len(self.rankings)
+
+    def __contains__(self, query_id):
+        return query_id in self.rankings
+
+    def ranking(self, query_id, k=None):
+        """Returns the k best document ids of a query (all for k=None)."""
+        if k is None:
+            return self.rankings[query_id]
+        return self.rankings[query_id][:k]
+
+    def save_trec(self, file_path):
+        with open(file_path, "w") as file:
+            for query_id, ranking in self.rankings.items():
+                for rank, (doc_id, score) in enumerate(zip(ranking, self.scores[query_id]), start=1):
+                    file.write(f"{query_id} Q0 {doc_id} {rank} {score!r} {self.tag}\n")
+
+    @classmethod
+    def load_trec(cls, file_path):
+        """Reads a run in TREC format; documents are ordered by their rank column."""
+        entries = {}
+        tag = None
+        with open(file_path, "r") as file:
+            for line in file:
+                fields = line.split()
+                if not fields:
+                    continue
+                query_id, _, doc_id, rank, score, tag = fields
+                entries.setdefault(int(query_id), []).append((int(rank), int(doc_id), float(score)))
+        rankings = {}
+        scores = {}
+        for query_id, query_entries in entries.items():
+            query_entries.sort()
+            rankings[query_id] = [doc_id for _, doc_id, _ in query_entries]
+            scores[query_id] = [score for _, _, score in query_entries]
+        return cls(rankings, scores, tag)
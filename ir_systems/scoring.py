@@ -0,0 +1,137 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class ScoringFunction(ABC):
+    """
+    Weighting scheme of the vector space model.
+
+    The weight of a term in a document is split into two vectorized kernels:
+    a per-term part (idf) computed from the document frequencies and a
+    per-posting part (term_frequency_weight) computed from the term frequency
+    and the ratio of the document length to the average document length.
+    Both only depend on index statistics, so the CSR index evaluates them
+    once for all postings when the scoring function is set, and a query only
+    gathers and adds the precomputed weights. With ``normalize`` the scores
+    are divided by the Euclidean norm of the document vector (cosine), which
+    is precomputed as well; otherwise the norms are 1.
+
+    The kernels accept NumPy arrays (CSR index) and scalars (dictionary-based
+    reference path) alike.
+
+    Attributes
+    ----------
+    name : str
+        Name under which the scoring function is registered in SCORING_FUNCTIONS.
+    normalize : bool
+        True for cosine scoring (division by the document vector length).
+    parameters : dict
+        The parameters of the scheme (part of the key).
+    """
+
+    name = None
+    normalize = True
+
+    def __init__(self, **parameters):
+        self.parameters = parameters
+
+    @property
+    def key(self):
+        """Hashable identity of the scheme and its parameters (e.g. for cache keys)."""
+        return (self.name,) + tuple(sorted(self.parameters.items()))
+
+    @abstractmethod
+    def idf(self, document_frequency, number_of_documents):
+        pass
+
+    @abstractmethod
+    def term_frequency_weight(self, term_frequency, length_ratio):
+        pass
+
+    def weight(self, term_frequency, length_ratio, document_frequency, number_of_documents):
+        """w(t, d) = term_frequency_weight(tf, len(d) / avg_len) * idf(df, N)."""
+        return self.term_frequency_weight(term_frequency, length_ratio) * \
+            self.idf(document_frequency, number_of_documents)
+
+    def __eq__(self, other):
+        return isinstance(other, ScoringFunction) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        parameters = ", ".join(f"{name}={value!r}" for name, value in sorted(self.parameters.items()))
+        return f"{type(self).__name__}({parameters})"
+
+
+class TfIdfScoring(ScoringFunction):
+    """
+    The original weighting of the system: length-normalized tf times idf, cosine scored.
+
+    w(t, d) = tf / (tf + k * (len(d) / avg_len)) * log(N / df)
+    """
+
+    name = "tfidf"
+
+    def __init__(self, k=0.01):
+        super().__init__(k=k)
+        self.k = k
+
+    def idf(self, document_frequency, number_of_documents):
+        return np.log(number_of_documents / document_frequency)
+
+    def term_frequency_weight(self, term_frequency, length_ratio):
+        return term_frequency / (term_frequency + self.k * length_ratio)
+
+
+class LogTfCosineScoring(ScoringFunction):
+    """
+    Classic log-tf idf weighting, cosine scored.
+
+    w(t, d) = (1 + log(tf)) * log(N / df)
+    """
+
+    name = "logtf"
+
+    def idf(self, document_frequency, number_of_documents):
+        return np.log(number_of_documents / document_frequency)
+
+    def term_frequency_weight(self, term_frequency, length_ratio):
+        return 1 + np.log(term_frequency)
+
+
+class BM25Scoring(ScoringFunction):
+    """
+    Okapi BM25 (without normalization by the document vector length).
+
+    w(t, d) = log(1 + (N - df + 0.5) / (df + 0.5)) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(d) / avg_len))
+
+    The idf variant is never negative, so the weights stay valid upper bounds
+    for dynamic pruning.
+    """
+
+    name = "bm25"
+    normalize = False
+
+    def __init__(self, k1=1.2, b=0.75):
+        super().__init__(k1=k1, b=b)
+        self.k1 = k1
+        self.b = b
+
+    def idf(self, document_frequency, number_of_documents):
+        return np.log(1 + (number_of_documents - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def term_frequency_weight(self, term_frequency, length_ratio):
+        return term_frequency * (self.k1 + 1) / (term_frequency + self.k1 * (1 - self.b + self.b * length_ratio))
+
+
+SCORING_FUNCTIONS = {scoring.name: scoring for scoring in (TfIdfScoring, LogTfCosineScoring, BM25Scoring)}
+
+
+def make_scoring(name, **parameters):
+    """Creates the scoring function registered under name (e.g. from a snapshot header)."""
+    try:
+        return SCORING_FUNCTIONS[name](**parameters)
+    except KeyError:
+        raise ValueError(f"Unbekannte Gewichtungsfunktion: {name}") from None
@@ -0,0 +1,544 @@
+import threading
+
+import numpy as np
+
+from csr_index import accumulate_touched, permute_rows, top_k_order
+from vocabulary import Vocabulary
+
+# So viele benachbarte Segmente derselben Stufe werden zu einem zusammengeführt
+MERGE_FACTOR = 10
+# Segmente mit weniger lebenden Dokumenten gehören alle zur untersten Stufe
+MIN_MERGE_DOCUMENTS = 1000
+# Ab diesem Anteil gelöschter Dokumente wird ein Segment neu geschrieben
+MAX_DELETED_FRACTION = 0.2
+# Alle Segmente werden neu gewichtet, wenn sich seit der letzten vollständigen Gewichtung
+# mehr als dieser Anteil der Dokumente geändert hat (hinzugefügt oder gelöscht)
+REWEIGHT_DRIFT = 0.1
+
+
+class Segment:
+    """
+    Immutable CSR index of a batch of documents; only the tombstones change.
+
+    The postings of row ``r`` are stored in
+    ``posting_docs[term_offsets[r]:term_offsets[r + 1]]`` (local document
+    positions, ascending) and the parallel ``posting_tfs``. Rows are ordered
+    by the first appearance of their term in the segment, like the term ids of
+    a full build, so a segment that holds the whole collection sums every
+    document norm in the same order as the CSRIndex.
+
+    Attributes
+    ----------
+    doc_ids : np.ndarray
+        Document ids in collection order.
+    doc_lengths : np.ndarray
+        Number of tokens per document.
+    term_ids : np.ndarray
+        Term id (in the vocabulary of the SegmentedIndex) of every row.
+    posting_first_positions : np.ndarray
+        Token position of the first occurrence of the term in the document;
+        orders the rows when segments are merged.
+    deleted : np.ndarray
+        Tombstones (bool per document); deleted documents are skipped by
+        queries and dropped by the next merge of the segment.
+    posting_weights, document_vector_length : np.ndarray
+        Weights and norms for the collection statistics at the time the
+        segment was weighted (see SegmentedIndex).
+    """
+
+    def __init__(self, doc_ids, doc_lengths, term_ids, term_offsets, posting_docs, posting_tfs,
+                 posting_first_positions):
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.int64)
+        self.term_ids = np.asarray(term_ids, dtype=np.int64)
+        self.term_offsets = np.asarray(term_offsets, dtype=np.int64)
+        self.posting_docs = np.asarray(posting_docs, dtype=np.int64)
+        self.posting_tfs = np.asarray(posting_tfs, dtype=np.int64)
+        self.posting_first_positions = np.asarray(posting_first_positions, dtype=np.int64)
+
+        self.doc_positions = dict(zip(self.doc_ids.tolist(), range(len(self.doc_ids))))
+        self.term_rows = dict(zip(self.term_ids.tolist(), range(len(self.term_ids))))
+        self.deleted = np.zeros(len(self.doc_ids), dtype=bool)
+        self.number_of_deleted = 0
+
+        self.posting_weights = None
+        self.document_vector_length = None
+        # Wiederverwendeter Akkumulator pro Thread (siehe csr_index.accumulate_touched)
+        self.accumulators = threading.local()
+
+    @classmethod
+    def from_documents(cls, documents, vocabulary):
+        """
+        Builds a segment from (doc_id, tokens) pairs in collection order.
+
+        New terms are added to the vocabulary (with their occurrences).
+        """
+        doc_ids = []
+        doc_lengths = []
+        # Pro Term in Reihenfolge des ersten Vorkommens: (Dokumentposition, tf, erste Position)
+        postings = {}
+        for doc_position, (doc_id, tokens) in enumerate(documents):
+            doc_ids.append(doc_id)
+            doc_lengths.append(len(tokens))
+            counts = {}
+            for position, token in enumerate(tokens):
+                try:
+                    counts[token][1] += 1
+                except KeyError:
+                    counts[token] = [position, 1]
+            for token, (first_position, term_frequency) in counts.items():
+                postings.setdefault(token, []).append((doc_position, term_frequency, first_position))
+
+        term_ids = []
+        term_offsets = [0]
+        posting_docs = []
+        posting_tfs = []
+        posting_first_positions = []
+        for token, row in postings.items():
+            term_ids.append(vocabulary.add(token, sum(term_frequency for _, term_frequency, _ in row)))
+            posting_docs.extend(doc_position for doc_position, _, _ in row)
+            posting_tfs.extend(term_frequency for _, term_frequency, _ in row)
+            posting_first_positions.extend(first_position for _, _, first_position in row)
+            term_offsets.append(len(posting_docs))
+        return cls(doc_ids, doc_lengths, term_ids, term_offsets, posting_docs, posting_tfs, posting_first_positions)
+
+    @property
+    def live_documents(self):
+        return len(self.doc_ids) - self.number_of_deleted
+
+    @property
+    def deleted_fraction(self):
+        return self.number_of_deleted / len(self.doc_ids) if len(self.doc_ids) else 0.0
+
+    def delete(self, doc_id):
+        """Sets the tombstone of a document; returns False if it is not in the segment or already deleted."""
+        position = self.doc_positions.get(doc_id)
+        if position is None or self.deleted[position]:
+            return False
+        self.deleted[position] = True
+        self.number_of_deleted += 1
+        return True
+
+    def live_document_frequency(self):
+        """Number of live documents per row."""
+        if self.number_of_deleted == 0:
+            return np.diff(self.term_offsets)
+        if len(self.term_ids) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.add.reduceat((~self.deleted[self.posting_docs]).astype(np.int64), self.term_offsets[:-1])
+
+    def posting_term_ids(self):
+        """Term id of every posting."""
+        return np.repeat(self.term_ids, np.diff(self.term_offsets))
+
+    def reweight(self, scoring, row_idf, average_doc_len):
+        """
+        Computes the posting weights and document norms from the collection
+        statistics (idf per row and average document length).
+
+        Like CSRIndex.weights; the squares are summed per document in row order.
+        """
+        posting_idf = np.repeat(row_idf, np.diff(self.term_offsets))
+        length_ratios = self.doc_lengths[self.posting_docs] / average_doc_len
+        self.posting_weights = scoring.term_frequency_weight(self.posting_tfs, length_ratios) * posting_idf
+        if not scoring.normalize:
+            self.document_vector_length = np.ones(len(self.doc_ids))
+        else:
+            self.document_vector_length = np.sqrt(np.bincount(
+                self.posting_docs, weights=self.posting_weights * self.posting_weights, minlength=len(self.doc_ids)))
+
+    def score_rows(self, term_ids):
+        """
+        Accumulates the weights of the query terms (term ids, duplicates added
+        once per occurrence) and returns the live candidate positions with
+        their normalized scores.
+        """
+        rows = [self.term_rows[term_id] for term_id in term_ids if term_id in self.term_rows]
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0), 0
+        candidates, accumulated = accumulate_touched(self.accumulators, len(self.doc_ids), self.term_offsets,
+                                                     self.posting_docs, self.posting_weights, rows)
+        live = ~self.deleted[candidates]
+        candidates = candidates[live]
+        candidate_scores = accumulated[live] / self.document_vector_length[candidates]
+        positive = candidate_scores > 0
+        postings_scanned = int(sum(self.term_offsets[row + 1] - self.term_offsets[row] for row in rows))
+        return candidates[positive], candidate_scores[positive], postings_scanned
+
+
+def merge_segments(segments, tombstones):
+    """
+    Merges adjacent segments into one, dropping the documents deleted in tombstones.
+
+    Documents keep their order; the rows of the new segment are ordered by the
+    first appearance of their term among the remaining documents, so merging
+    all segments gives the rows (and summation order) of a full build.
+    """
+    doc_ids, doc_lengths = [], []
+    term_ids, posting_docs, posting_tfs, posting_first_positions = [], [], [], []
+    base = 0
+    for segment, deleted in zip(segments, tombstones):
+        live = ~deleted
+        new_positions = np.cumsum(live) - 1 + base
+        keep = live[segment.posting_docs]
+        term_ids.append(np.repeat(segment.term_ids, np.diff(segment.term_offsets))[keep])
+        posting_docs.append(new_positions[segment.posting_docs[keep]])
+        posting_tfs.append(segment.posting_tfs[keep])
+        posting_first_positions.append(segment.posting_first_positions[keep])
+        doc_ids.append(segment.doc_ids[live])
+        doc_lengths.append(segment.doc_lengths[live])
+        base += int(live.sum())
+
+    term_ids, posting_docs, posting_tfs, posting_first_positions = (
+        np.concatenate(arrays) for arrays in (term_ids, posting_docs, posting_tfs, posting_first_positions))
+    if len(term_ids) == 0:
+        return Segment(np.concatenate(doc_ids), np.concatenate(doc_lengths), [], [0], [], [], [])
+
+    # Postings nach Term und innerhalb eines Terms nach Dokument sortieren
+    order = np.lexsort((posting_docs, term_ids))
+    term_ids, posting_docs, posting_tfs, posting_first_positions = (
+        array[order] for array in (term_ids, posting_docs, posting_tfs, posting_first_positions))
+    starts = np.flatnonzero(np.concatenate(([True], term_ids[1:] != term_ids[:-1])))
+
+    # Zeilen nach erstem Vorkommen: erstes Dokument des Terms, darin die erste Position
+    row_order = np.lexsort((posting_first_positions[starts], posting_docs[starts]))
+    term_offsets, posting_order = permute_rows(np.append(starts, len(term_ids)), row_order)
+    return Segment(np.concatenate(doc_ids), np.concatenate(doc_lengths), term_ids[starts][row_order], term_offsets,
+                   posting_docs[posting_order], posting_tfs[posting_order], posting_first_positions[posting_order])
+
+
+class LogMergePolicy:
+    """
+    Chooses the merges of a SegmentedIndex.
+
+    The level of a segment is the number of times its live document count
+    reaches min_merge_documents multiplied by merge_factor (segments below
+    min_merge_documents * merge_factor are level 0). Runs of merge_factor
+    adjacent segments of the same level are merged into one; a segment with
+    more than max_deleted_fraction deleted documents is rewritten on its own
+    to drop them. Only adjacent segments are merged, so the documents keep
+    their collection order.
+    """
+
+    def __init__(self, merge_factor=MERGE_FACTOR, min_merge_documents=MIN_MERGE_DOCUMENTS,
+                 max_deleted_fraction=MAX_DELETED_FRACTION):
+        self.merge_factor = merge_factor
+        self.min_merge_documents = min_merge_documents
+        self.max_deleted_fraction = max_deleted_fraction
+
+    def level(self, segment):
+        level = 0
+        size = self.min_merge_documents * self.merge_factor
+        while segment.live_documents >= size:
+            level += 1
+            size *= self.merge_factor
+        return level
+
+    def find_merges(self, segments, merging):
+        """Returns lists of adjacent segments to merge; segments in merging are already being merged."""
+        merges = []
+        run = []
+        for segment in segments:
+            if segment in merging:
+                run = []
+            elif segment.deleted_fraction > self.max_deleted_fraction:
+                merges.append([segment])
+                run = []
+            else:
+                if run and self.level(run[-1]) != self.level(segment):
+                    run = []
+                run.append(segment)
+                if len(run) == self.merge_factor:
+                    merges.append(run)
+                    run = []
+        return merges
+
+
+class SegmentedIndex:
+    """
+    Incremental index of immutable segments with tombstones.
+
+    Every call of add_documents writes a new segment; delete_documents only
+    sets tombstones. A query is scored on all segments and the candidates are
+    ranked together. The collection statistics (number of live documents,
+    document frequencies, average document length) are kept up to date with
+    every change, at the cost of the postings of the added or deleted
+    documents' segments. Weights and norms are not: a segment is weighted
+    with the statistics of the moment it is added or written by a merge, so
+    segments weighted at different times score with slightly different idf
+    and norms. Once more than REWEIGHT_DRIFT of the documents changed since
+    the last full reweight (and after set_scoring or force_merge), all
+    segments are reweighted before the next query; the scores then equal
+    those of a full build of the live documents up to floating point
+    rounding, and exactly after force_merge. A change therefore costs
+    O(postings of the touched segments), the full reweight is amortized over
+    REWEIGHT_DRIFT * N changed documents.
+
+    The merge policy (LogMergePolicy) compacts small segments and segments
+    with many deletions, synchronously after every change or in a background
+    thread (background_merges). A merge works on a copy of the tombstones and
+    only holds the lock to swap the segments; documents deleted in the
+    meantime are deleted in the merged segment as well.
+
+    Attributes
+    ----------
+    vocabulary : Vocabulary
+        Term ids of all segments (terms are never removed).
+    segments : list
+        The segments in collection order.
+    segment_of : dict
+        Maps the id of every live document to its segment.
+    """
+
+    def __init__(self, scoring, merge_policy=None, background_merges=False):
+        self.vocabulary = Vocabulary()
+        self.scoring = scoring
+        self.merge_policy = merge_policy if merge_policy is not None else LogMergePolicy()
+        self.segments = []
+        self.segment_of = {}
+
+        self.lock = threading.RLock()
+        self.merges_changed = threading.Condition(self.lock)
+        self.merging = set()
+        self.closed = False
+
+        # Statistiken der lebenden Dokumente, bei jeder Änderung fortgeschrieben
+        self.total_length = 0
+        self.document_frequency = np.zeros(0, dtype=np.int64)
+        # Vollständige Neugewichtung vor der nächsten Anfrage (neue Gewichtung, force_merge, zu viele Änderungen)
+        self.weights_stale = False
+        self.changes_since_reweight = 0
+        self.documents_at_reweight = 0
+
+        self.merge_thread = None
+        if background_merges:
+            self.merge_thread = threading.Thread(target=self.merge_loop, daemon=True)
+            self.merge_thread.start()
+
+    @property
+    def number_of_documents(self):
+        return len(self.segment_of)
+
+    @property
+    def average_doc_len(self):
+        return self.total_length / self.number_of_documents if self.number_of_documents else 0.0
+
+    def row_idf(self, segment):
+        """idf of the rows of a segment for the current statistics (0 for terms without live documents)."""
+        document_frequency = self.document_frequency[segment.term_ids]
+        idf = np.zeros(len(document_frequency))
+        # Terme ohne lebende Dokumente haben nur Postings gelöschter Dokumente; ihr idf wird nie verwendet
+        present = document_frequency > 0
+        idf[present] = self.scoring.idf(document_frequency[present], self.number_of_documents)
+        return idf
+
+    def weight_segment(self, segment):
+        segment.reweight(self.scoring, self.row_idf(segment), self.average_doc_len)
+
+    def forget_documents(self, segment, positions):
+        """Removes the documents at positions of a segment (just deleted) from the collection statistics."""
+        deleted = np.zeros(len(segment.doc_ids), dtype=bool)
+        deleted[positions] = True
+        term_ids = segment.posting_term_ids()[deleted[segment.posting_docs]]
+        self.document_frequency -= np.bincount(term_ids, minlength=len(self.document_frequency))
+        self.total_length -= int(segment.doc_lengths[positions].sum())
+        self.changes_since_reweight += len(positions)
+
+    def add_documents(self, documents):
+        """
+        Indexes (doc_id, tokens) pairs as a new segment.
+
+        A document whose id is already indexed replaces the old version (which
+        is deleted), so it moves to the end of the collection order. Raises
+        ValueError, before anything is changed, if an id occurs twice in documents.
+        """
+        documents = list(documents)
+        # Vor jeder Änderung prüfen: ein abgelehnter Stapel darf keine Terme im Vokabular hinterlassen
+        doc_ids = [doc_id for doc_id, _ in documents]
+        if len(set(doc_ids)) < len(doc_ids):
+            raise ValueError("Doppelte doc_id in den neuen Dokumenten")
+        if not documents:
+            return
+        with self.lock:
+            segment = Segment.from_documents(documents, self.vocabulary)
+            replaced = {}
+            for doc_id in segment.doc_ids.tolist():
+                old_segment = self.segment_of.get(doc_id)
+                if old_segment is not None:
+                    old_segment.delete(doc_id)
+                    replaced.setdefault(old_segment, []).append(old_segment.doc_positions[doc_id])
+                self.segment_of[doc_id] = segment
+            for old_segment, positions in replaced.items():
+                self.forget_documents(old_segment, positions)
+
+            # Statistiken fortschreiben, dann nur das neue Segment gewichten
+            self.document_frequency = np.concatenate((
+                self.document_frequency, np.zeros(len(self.vocabulary) - len(self.document_frequency), dtype=np.int64)))
+            self.document_frequency[segment.term_ids] += np.diff(segment.term_offsets)
+            self.total_length += int(segment.doc_lengths.sum())
+            self.changes_since_reweight += len(segment.doc_ids)
+            self.weight_segment(segment)
+            self.segments.append(segment)
+            self.maybe_merge()
+
+    def delete_documents(self, doc_ids):
+        """Deletes documents by id; unknown ids are ignored. Returns the number of deleted documents."""
+        with self.lock:
+            deleted = {}
+            for doc_id in doc_ids:
+                segment = self.segment_of.pop(doc_id, None)
+                if segment is not None:
+                    segment.delete(doc_id)
+                    deleted.setdefault(segment, []).append(segment.doc_positions[doc_id])
+            for segment, positions in deleted.items():
+                self.forget_documents(segment, positions)
+            if deleted:
+                self.maybe_merge()
+            return sum(len(positions) for positions in deleted.values())
+
+    def set_scoring(self, scoring):
+        with self.lock:
+            self.scoring = scoring
+            self.weights_stale = True
+
+    def maybe_merge(self):
+        """Runs the merges of the merge policy (or wakes up the merge thread)."""
+        if self.merge_thread is not None:
+            self.merges_changed.notify_all()
+            return
+        while True:
+            merges = self.merge_policy.find_merges(self.segments, self.merging)
+            if not merges:
+                return
+            for segments in merges:
+                tombstones = self.start_merge(segments)
+                self.finish_merge(segments, tombstones, merge_segments(segments, tombstones))
+
+    def start_merge(self, segments):
+        self.merging.update(segments)
+        return [segment.deleted.copy() for segment in segments]
+
+    def finish_merge(self, segments, tombstones, merged):
+        """Replaces the merged segments by the new one (with the lock held)."""
+        # Während des Zusammenführens gelöschte Dokumente auch im neuen Segment löschen
+        for segment, deleted in zip(segments, tombstones):
+            for position in np.flatnonzero(segment.deleted & ~deleted):
+                merged.delete(int(segment.doc_ids[position]))
+        for doc_id in merged.doc_ids[~merged.deleted].tolist():
+            if self.segment_of[doc_id] in segments:
+                self.segment_of[doc_id] = merged
+        start = next(i for i, segment in enumerate(self.segments) if segment is segments[0])
+        self.segments[start:start + len(segments)] = [merged] if len(merged.doc_ids) else []
+        self.merging.difference_update(segments)
+        # Das neue Segment mit den aktuellen Statistiken gewichten (die Statistiken selbst ändern sich nicht)
+        if len(merged.doc_ids):
+            self.weight_segment(merged)
+
+    def merge_loop(self):
+        while True:
+            with self.merges_changed:
+                merges = self.merge_policy.find_merges(self.segments, self.merging)
+                while not merges and not self.closed:
+                    self.merges_changed.wait()
+                    merges = self.merge_policy.find_merges(self.segments, self.merging)
+                if self.closed:
+                    return
+                merges = [(segments, self.start_merge(segments)) for segments in merges]
+            for segments, tombstones in merges:
+                try:
+                    merged = merge_segments(segments, tombstones)
+                except BaseException:
+                    with self.merges_changed:
+                        self.merging.difference_update(segments)
+                        self.merges_changed.notify_all()
+                    raise
+                with self.merges_changed:
+                    self.finish_merge(segments, tombstones, merged)
+                    self.merges_changed.notify_all()
+
+    def wait_for_merges(self):
+        """Blocks until the merge thread has no pending merges."""
+        with self.merges_changed:
+            self.merges_changed.wait_for(lambda: self.merge_thread is None or self.closed or not self.merging and not
+                                         self.merge_policy.find_merges(self.segments, self.merging))
+
+    def force_merge(self):
+        """Merges all segments into one without deleted documents."""
+        with self.merges_changed:
+            self.merges_changed.wait_for(lambda: not self.merging)
+            if len(self.segments) > 1 or any(segment.number_of_deleted for segment in self.segments):
+                segments = list(self.segments)
+                tombstones = self.start_merge(segments)
+                self.finish_merge(segments, tombstones, merge_segments(segments, tombstones))
+            self.weights_stale = True
+
+    def close(self):
+        """Stops the merge thread (running merges are finished first)."""
+        with self.merges_changed:
+            self.closed = True
+            self.merges_changed.notify_all()
+        if self.merge_thread is not None:
+            self.merge_thread.join()
+
+    def refresh(self):
+        """
+        Recomputes the collection statistics from scratch and reweights all
+        segments if the weights are stale or more than REWEIGHT_DRIFT of the
+        documents changed since the last full reweight.
+        """
+        if not self.weights_stale and self.changes_since_reweight <= REWEIGHT_DRIFT * self.documents_at_reweight:
+            return
+        self.total_length = sum(int(segment.doc_lengths[~segment.deleted].sum()) for segment in self.segments)
+        self.document_frequency = np.zeros(len(self.vocabulary), dtype=np.int64)
+        for segment in self.segments:
+            self.document_frequency[segment.term_ids] += segment.live_document_frequency()
+        for segment in self.segments:
+            self.weight_segment(segment)
+        self.weights_stale = False
+        self.changes_since_reweight = 0
+        self.documents_at_reweight = self.number_of_documents
+
+    def rank_rows(self, term_ids, k, with_scores=False, trace=None):
+        """
+        Returns the ids of the k best live documents for a query given as term ids.
+
+        Ties are broken by collection order, and documents without a positive
+        score follow in collection order if fewer than k documents scored (as
+        in CSRIndex.rank_rows). With with_scores, (doc_id, score) pairs are returned.
+        """
+        with self.lock:
+            self.refresh()
+            positions, scores, doc_ids, candidates_per_segment = [], [], [], []
+            postings_scanned = 0
+            segment_bases = np.cumsum([0] + [len(segment.doc_ids) for segment in self.segments[:-1]])
+            for segment, base in zip(self.segments, segment_bases):
+                candidates, candidate_scores, scanned = segment.score_rows(term_ids)
+                positions.append(candidates + base)
+                scores.append(candidate_scores)
+                doc_ids.append(segment.doc_ids[candidates])
+                candidates_per_segment.append(candidates)
+                postings_scanned += scanned
+            positions = np.concatenate(positions) if positions else np.empty(0, dtype=np.int64)
+            scores = np.concatenate(scores) if scores else np.empty(0)
+            doc_ids = np.concatenate(doc_ids) if doc_ids else np.empty(0, dtype=np.int64)
+            if trace is not None:
+                trace.lap("accumulate")
+                trace.count(postings_scanned=postings_scanned, accumulators_touched=len(positions))
+
+            order = top_k_order(positions, scores, k)
+            top_k = doc_ids[order].tolist()
+            top_k_scores = scores[order].tolist()
+            # Auffüllen mit lebenden Dokumenten ohne positiven Score in Sammlungsreihenfolge
+            for segment, candidates in zip(self.segments, candidates_per_segment):
+                if len(top_k) >= k:
+                    break
+                remaining = ~segment.deleted
+                remaining[candidates] = False
+                padding = segment.doc_ids[np.flatnonzero(remaining)[:k - len(top_k)]].tolist()
+                top_k.extend(padding)
+                top_k_scores.extend([0.0] * len(padding))
+            if trace is not None:
+                trace.lap("select")
+        if with_scores:
+            return list(zip(top_k, top_k_scores))
+        return top_k
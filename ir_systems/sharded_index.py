@@ -0,0 +1,193 @@
+import heapq
+import multiprocessing
+import threading
+
+import numpy as np
+
+from csr_index import CSRIndex, permute_rows
+from segments import Segment
+from vocabulary import Vocabulary
+from ir_common.memory import deep_getsizeof
+from ir_common.cisi_reader import iter_records
+from ir_common.parallel_build import split_collection, read_range
+
+
+class ShardedIndex:
+    """
+    Document-sharded index: scatter-gather retrieval over worker processes.
+
+    The collection file is split at record boundaries into number_of_shards
+    contiguous ranges of documents (see split_collection); every range is
+    read, tokenized and indexed by its own worker process, which holds only
+    the CSRIndex of its shard. The index is built in two phases: the workers
+    report their document count, total document length and terms with local
+    document frequencies; the coordinator assigns global term ids in order of
+    first appearance, sums N, df and the average document length and sends
+    every shard the global statistics of its terms. The shards weight their
+    postings with these statistics and order their rows by global term id,
+    so every weight, norm and score equals the one of a single CSRIndex of
+    the whole collection.
+
+    A batch of queries is sent to all shards at once; every shard returns its
+    k best (doc_id, score) pairs, and the coordinator merges them. Equal
+    scores are ordered by shard and then by rank within the shard, which is
+    the file order of a single index.
+
+    Attributes
+    ----------
+    vocabulary : Vocabulary
+        Global term ids (the queries are sent as term ids).
+    number_of_documents : int
+        Number of documents of all shards.
+    average_doc_len : float
+        Average document length of the collection.
+    document_frequency : np.ndarray
+        Global document frequency per term id.
+    """
+
+    def __init__(self, file_path, number_of_shards, tokenizer, scoring):
+        self.lock = threading.Lock()
+        self.connections = []
+        self.processes = []
+        for start, end in split_collection(file_path, number_of_shards):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=run_shard, args=(worker_connection, file_path, start, end,
+                                                                      tokenizer), daemon=True)
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+        # Phase 1: lokale Statistiken der Shards einsammeln; globale Term-Ids in Reihenfolge des ersten Vorkommens
+        shard_statistics = self.gather()
+        self.vocabulary = Vocabulary()
+        shard_term_ids = []
+        for _, _, terms, occurences, _ in shard_statistics:
+            shard_term_ids.append(np.array([self.vocabulary.add(term, count) for term, count in zip(terms, occurences)],
+                                           dtype=np.int64))
+        self.document_frequency = np.zeros(len(self.vocabulary), dtype=np.int64)
+        for term_ids, (_, _, _, _, document_frequency) in zip(shard_term_ids, shard_statistics):
+            self.document_frequency[term_ids] += document_frequency
+        self.number_of_documents = sum(statistics[0] for statistics in shard_statistics)
+        self.average_doc_len = sum(statistics[1] for statistics in shard_statistics) / self.number_of_documents
+
+        # Phase 2: globale Statistiken verteilen, die Shards gewichten ihre Postings damit
+        self.send([("build", term_ids, self.document_frequency[term_ids], self.number_of_documents,
+                    self.average_doc_len, scoring) for term_ids in shard_term_ids])
+        self.gather()
+
+    @property
+    def number_of_shards(self):
+        return len(self.connections)
+
+    def send(self, messages):
+        for connection, message in zip(self.connections, messages):
+            connection.send(message)
+
+    def gather(self):
+        """Receives one reply per shard; an exception of a shard is raised here."""
+        replies = [connection.recv() for connection in self.connections]
+        for reply in replies:
+            if isinstance(reply, BaseException):
+                raise reply
+        return replies
+
+    def reweight(self, scoring):
+        """Switches all shards to another scoring function."""
+        with self.lock:
+            self.send([("reweight", scoring)] * self.number_of_shards)
+            self.gather()
+
+    def rank_many_rows(self, rows_per_query, k, with_scores=False, trace=None):
+        """
+        Returns the ids of the k best documents for every query of a batch
+        (queries given as global term ids), or (doc_id, score) pairs with
+        with_scores. Documents without a positive score follow in file order
+        if fewer than k documents scored, as in CSRIndex.rank_many_rows.
+        """
+        with self.lock:
+            self.send([("rank", rows_per_query, k)] * self.number_of_shards)
+            results_per_shard = self.gather()
+        if trace is not None:
+            trace.lap("accumulate")
+
+        results = []
+        for i in range(len(rows_per_query)):
+            top_k = heapq.nsmallest(k, ((-score, shard, rank, doc_id)
+                                        for shard, shard_results in enumerate(results_per_shard)
+                                        for rank, (doc_id, score) in enumerate(shard_results[i])))
+            if with_scores:
+                results.append([(doc_id, -score) for score, _, _, doc_id in top_k])
+            else:
+                results.append([doc_id for _, _, _, doc_id in top_k])
+        if trace is not None:
+            trace.lap("select")
+        return results
+
+    def memory_bytes(self):
+        """Sum of the bytes of the shard indexes in the worker processes (see deep_getsizeof)."""
+        with self.lock:
+            self.send([("memory",)] * self.number_of_shards)
+            return sum(self.gather())
+
+    def close(self):
+        """Stops the worker processes."""
+        with self.lock:
+            for connection in self.connections:
+                connection.send(("close",))
+                connection.close()
+            for process in self.processes:
+                process.join()
+            self.connections = []
+            self.processes = []
+
+
+def run_shard(connection, file_path, start, end, tokenizer):
+    """
+    Worker of a ShardedIndex: indexes the records of a byte range and answers
+    the requests of the coordinator until it is closed.
+    """
+    try:
+        records = list(iter_records(read_range(file_path, start, end)))
+        abstracts = tokenizer.tokenize_batch([fields[".W"].strip() for _, fields in records])
+        local_vocabulary = Vocabulary()
+        segment = Segment.from_documents([(doc_id, abstract) for (doc_id, _), abstract in zip(records, abstracts)],
+                                         local_vocabulary)
+        del records, abstracts
+        connection.send((len(segment.doc_ids), int(segment.doc_lengths.sum()), local_vocabulary.terms,
+                         local_vocabulary.occurences, np.diff(segment.term_offsets)))
+    except Exception as error:
+        connection.send(error)
+        return
+
+    index = None
+    term_rows = None
+    while True:
+        message = connection.recv()
+        if message[0] == "close":
+            return
+        try:
+            if message[0] == "build":
+                _, term_ids, document_frequency, number_of_documents, average_doc_len, scoring = message
+                # Zeilen nach globaler Term-Id ordnen: gleiche Summationsreihenfolge wie ein einzelner Index
+                row_order = np.argsort(term_ids, kind="stable")
+                term_offsets, posting_order = permute_rows(segment.term_offsets, row_order)
+                term_rows = dict(zip(term_ids[row_order].tolist(), range(len(row_order))))
+                index = CSRIndex(segment.doc_ids, segment.doc_lengths, term_rows, term_offsets,
+                                 segment.posting_docs[posting_order], segment.posting_tfs[posting_order], scoring,
+                                 collection_statistics=(number_of_documents, average_doc_len,
+                                                        document_frequency[row_order]))
+                segment = None
+                connection.send(None)
+            elif message[0] == "reweight":
+                index.reweight(message[1])
+                connection.send(None)
+            elif message[0] == "memory":
+                connection.send(deep_getsizeof((index, term_rows), set()))
+            elif message[0] == "rank":
+                _, rows_per_query, k = message
+                local_rows = [[term_rows[term_id] for term_id in term_ids if term_id in term_rows]
+                              for term_ids in rows_per_query]
+                connection.send(index.rank_many_rows(local_rows, k, with_scores=True))
+        except Exception as error:
+            connection.send(error)
@@ -0,0 +1,322 @@
+import sys
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from csr_index import CSRIndex, MAX_BATCH_CELLS
+from config import *
+
+# Tiefe der Rankings für MAP und Fallback-Entscheidung sowie Schnitt-Tiefe von P@k in der Tabelle
+EVALUATION_DEPTH = 100
+PRECISION_CUTOFF = 10
+# Durchläufe aller Anfragen für die Latenz (nach einem Aufwärmdurchlauf)
+LATENCY_REPETITIONS = 5
+# Kandidaten für die exakte Nachbewertung: max(CANDIDATE_FACTOR * k, MIN_CANDIDATES),
+# höchstens MAX_CANDIDATE_FRACTION der Sammlung (aber immer mindestens k)
+CANDIDATE_FACTOR = 10
+MIN_CANDIDATES = 100
+MAX_CANDIDATE_FRACTION = 0.1
+
+
+class TieredIndex:
+    """
+    Statically pruned first tier over a CSRIndex, with fallback to the full index.
+
+    The first tier keeps only the postings with the largest normalized
+    contributions w(t, d) / |d| (the summands of the cosine score): with
+    ``champions`` the r best postings of every term (champion lists), with
+    ``weight_threshold`` the postings whose contribution reaches the
+    threshold; with both, a posting has to pass both. Weights and norms are
+    those of the full index, so a document's tier score is the part of its
+    exact score that comes from the kept postings.
+
+    The first tier only chooses the candidates: a query is scored on it, and
+    if at least k documents get a positive score there, the documents with
+    the highest tier scores are rescored exactly and the k best of them are
+    returned with their exact scores; otherwise the query falls back to
+    exhaustive scoring of the full index. Documents that are reached only
+    through pruned postings, or whose tier score is too low to be a
+    candidate, are missed; evaluate and print_quality_report measure the
+    effect on MAP and P@k.
+
+    For the rescoring, the pruned postings are kept a second time ordered by
+    document (rest_offsets, rest_rows, rest_weights). The exact sum of a
+    candidate is its tier sum plus the weights of its pruned postings in the
+    query rows, gathered for all candidates with a few array operations
+    instead of one binary search per query row in the full index; it equals
+    the sum of CSRIndex.accumulate_rows up to rounding. The copy has as many
+    postings as the full index minus the tier.
+
+    Parameters
+    ----------
+    index : CSRIndex
+        The full index. The tier is rebuilt when its scoring function changes.
+    champions : int or None
+        Postings kept per term.
+    weight_threshold : float or None
+        Minimum contribution w(t, d) / |d| of a kept posting.
+    candidate_factor, min_candidates : int
+        A query for k documents rescores max(candidate_factor * k, min_candidates) candidates ...
+    max_candidate_fraction : float
+        ... but at most this share of the collection (and at least k).
+
+    Attributes
+    ----------
+    pruned_index : CSRIndex
+        The first tier.
+    queries, fallbacks : int
+        Ranked queries, and how many of them were answered by the full index.
+    """
+
+    def __init__(self, index, champions=None, weight_threshold=None, candidate_factor=CANDIDATE_FACTOR,
+                 min_candidates=MIN_CANDIDATES, max_candidate_fraction=MAX_CANDIDATE_FRACTION):
+        self.index = index
+        self.champions = champions
+        self.weight_threshold = weight_threshold
+        self.candidate_factor = candidate_factor
+        self.min_candidates = min_candidates
+        self.max_candidate_fraction = max_candidate_fraction
+        self.scoring = None
+        self.pruned_index = None
+        self.rest_offsets = self.rest_rows = self.rest_weights = None
+        self.build_seconds = 0.0
+        self.queries = 0
+        self.fallbacks = 0
+        self.build()
+
+    def build(self):
+        start_time = time.perf_counter()
+        index = self.index
+        number_of_rows = len(index.term_offsets) - 1
+        contributions = index.posting_weights / index.document_vector_length[index.posting_docs]
+        posting_rows = np.repeat(np.arange(number_of_rows), index.document_frequency)
+
+        keep = np.ones(len(contributions), dtype=bool)
+        if self.weight_threshold is not None:
+            keep &= contributions >= self.weight_threshold
+        if self.champions is not None:
+            # Pro Zeile absteigend nach Beitrag, bei Gleichstand in Dateireihenfolge; die ersten r bleiben
+            order = np.lexsort((-contributions, posting_rows))
+            rank_in_row = np.arange(len(order)) - index.term_offsets[posting_rows[order]]
+            champion = np.zeros(len(contributions), dtype=bool)
+            champion[order[rank_in_row < self.champions]] = True
+            keep &= champion
+
+        kept = np.flatnonzero(keep)
+        term_offsets = np.concatenate(([0], np.cumsum(np.bincount(posting_rows[kept], minlength=number_of_rows))))
+        self.pruned_index = CSRIndex(index.doc_ids, index.doc_lengths, index.term_rows, term_offsets,
+                                     index.posting_docs[kept], index.posting_tfs[kept], index.scoring,
+                                     posting_weights=index.posting_weights[kept],
+                                     document_vector_length=index.document_vector_length,
+                                     collection_statistics=(index.collection_size, index.average_doc_len,
+                                                            index.collection_document_frequency))
+
+        # Beschnittene Postings nach Dokument geordnet (innerhalb eines Dokuments nach Zeile) für die Nachbewertung
+        rest = np.flatnonzero(~keep)
+        rest = rest[np.argsort(index.posting_docs[rest], kind="stable")]
+        self.rest_offsets = np.concatenate(([0], np.cumsum(np.bincount(index.posting_docs[rest],
+                                                                       minlength=index.number_of_documents))))
+        self.rest_rows = posting_rows[rest]
+        self.rest_weights = index.posting_weights[rest]
+        self.scoring = index.scoring
+        self.build_seconds = time.perf_counter() - start_time
+
+    @property
+    def kept_fraction(self):
+        """Share of the postings of the full index that the first tier keeps."""
+        return len(self.pruned_index.posting_docs) / max(1, len(self.index.posting_docs))
+
+    def number_of_candidates(self, k):
+        """Candidates rescored for a query for k documents."""
+        limit = int(self.max_candidate_fraction * self.index.number_of_documents)
+        return max(k, min(max(self.candidate_factor * k, self.min_candidates), limit))
+
+    def candidates(self, touched, accumulated, k):
+        """The touched documents with the highest (normalized) tier scores, in file order, and their tier sums."""
+        number_of_candidates = self.number_of_candidates(k)
+        if len(touched) <= number_of_candidates:
+            return touched, accumulated
+        tier_scores = accumulated / self.index.document_vector_length[touched]
+        chosen = np.sort(np.argpartition(-tier_scores, number_of_candidates - 1)[:number_of_candidates])
+        return touched[chosen], accumulated[chosen]
+
+    def rescore(self, rows, candidates, accumulated):
+        """Adds the weights of the pruned postings in the rows to the tier sums of the candidates."""
+        # Beschnittene Postings aller Kandidaten hintereinander, wie in CSRIndex.accumulate_batch
+        lengths = self.rest_offsets[candidates + 1] - self.rest_offsets[candidates]
+        ends = np.cumsum(lengths)
+        posting_index = np.arange(ends[-1] if len(ends) else 0) + np.repeat(self.rest_offsets[candidates]
+                                                                            - (ends - lengths), lengths)
+        # Wiederholte Anfrageterme zählen mehrfach, wie in accumulate_rows
+        query_counts = np.bincount(rows, minlength=len(self.index.term_offsets) - 1)
+        weights = self.rest_weights[posting_index] * query_counts[self.rest_rows[posting_index]]
+        return accumulated + np.bincount(np.repeat(np.arange(len(candidates)), lengths), weights=weights,
+                                         minlength=len(candidates))
+
+    def rank_rows(self, rows, k, with_scores=False, trace=None):
+        """Returns the ids of the k best documents for a query given as term ids (rows), see the class docstring."""
+        if self.scoring != self.index.scoring:
+            self.build()
+        pruned_index = self.pruned_index
+        candidates, accumulated = pruned_index.accumulate_touched(rows)
+        self.queries += 1
+        fallback = np.count_nonzero(accumulated > 0) < k
+        if trace is not None:
+            trace.count(postings_scanned=int(pruned_index.document_frequency[rows].sum()),
+                        tier_fallbacks=int(fallback))
+        if fallback:
+            self.fallbacks += 1
+            return self.index.rank_rows(rows, k, with_scores, trace)
+        # Beste Kandidaten der ersten Stufe um die beschnittenen Postings ergänzt exakt bewerten
+        candidates, accumulated = self.candidates(candidates, accumulated, k)
+        accumulated = self.rescore(rows, candidates, accumulated)
+        if trace is not None:
+            trace.lap("accumulate")
+            trace.count(accumulators_touched=len(candidates))
+        return self.index.top_k_of_candidates(candidates, accumulated, k, with_scores, trace)
+
+    def rank_many_rows(self, rows_per_query, k, with_scores=False):
+        """rank_rows for a batch of queries; the first tier and the fallbacks are scored as batches."""
+        if self.scoring != self.index.scoring:
+            self.build()
+        pruned_index = self.pruned_index
+        batch_size = max(1, MAX_BATCH_CELLS // max(1, pruned_index.number_of_documents))
+
+        results = []
+        fallbacks = []
+        for start in range(0, len(rows_per_query), batch_size):
+            scores = pruned_index.accumulate_batch(rows_per_query[start:start + batch_size])
+            for query_scores in scores:
+                candidates = np.flatnonzero(query_scores)
+                if np.count_nonzero(query_scores[candidates] > 0) < k:
+                    fallbacks.append(len(results))
+                    results.append(None)
+                else:
+                    rows = rows_per_query[len(results)]
+                    candidates, accumulated = self.candidates(candidates, query_scores[candidates], k)
+                    results.append(self.index.top_k_of_candidates(
+                        candidates, self.rescore(rows, candidates, accumulated), k, with_scores))
+        if fallbacks:
+            fallback_results = self.index.rank_many_rows([rows_per_query[i] for i in fallbacks], k, with_scores)
+            for i, result in zip(fallbacks, fallback_results):
+                results[i] = result
+        self.queries += len(rows_per_query)
+        self.fallbacks += len(fallbacks)
+        return results
+
+
+def evaluate(model, queries, groundtruths, depth=EVALUATION_DEPTH, cutoff=PRECISION_CUTOFF):
+    """
+    Quality and latency of a VectorSpaceModel on the evaluation queries.
+
+    The rankings of the depth best documents are retrieved once through a
+    RetrievalScorer (build_run); MAP and P@cutoff are computed from them with
+    the CISI relevance judgements. The latency is measured for single queries
+    (fast_cosine_scores with k = cutoff, the depth of a result page) over
+    LATENCY_REPETITIONS passes after a warm-up pass.
+
+    Returns
+    -------
+    dict
+        MAP@depth, P@cutoff, mean and p95 latency in ms and, for a model
+        with a tiered index, the share of queries that fell back to the full index.
+    """
+    from retrieval_metrics import RetrievalScorer
+
+    tiered_index = model.tiered_index
+    if tiered_index is not None:
+        tiered_index.queries = tiered_index.fallbacks = 0
+    retrieval_scorer = RetrievalScorer(model)
+    retrieval_scorer.build_run(dict(enumerate(queries)), k=depth)
+    precisions, _, _ = retrieval_scorer.precision_recall_fscore_at(queries, groundtruths, [cutoff])
+    metrics = {
+        f"MAP@{depth}": retrieval_scorer.MAP(queries, groundtruths),
+        f"P@{cutoff}": float(np.mean(precisions)),
+    }
+    if tiered_index is not None:
+        metrics["fallbacks"] = tiered_index.fallbacks / max(1, tiered_index.queries)
+
+    rows_per_query = [model.query_term_ids(query) for query in queries]
+    for term_ids in rows_per_query:
+        model.fast_cosine_scores(term_ids, cutoff)
+    latencies = []
+    for _ in range(LATENCY_REPETITIONS):
+        for term_ids in rows_per_query:
+            start_time = time.perf_counter()
+            model.fast_cosine_scores(term_ids, cutoff)
+            latencies.append(time.perf_counter() - start_time)
+    latencies = np.array(latencies) * 1e3
+    metrics["ms"] = float(latencies.mean())
+    metrics["p95 ms"] = float(np.percentile(latencies, 95))
+    return metrics
+
+
+def posting_bytes(index):
+    """Bytes of the posting arrays (offsets, documents, term frequencies, weights) of a CSRIndex."""
+    return sum(array.nbytes for array in (index.term_offsets, index.posting_docs, index.posting_tfs,
+                                          index.posting_weights))
+
+
+def print_quality_report(results):
+    """
+    Prints size, quality and latency of every configuration as a table.
+
+    results holds (name, CSRIndex, metrics) triples, the index being the
+    full index or a first tier; the first triple is the full index, and the
+    loss of MAP and P@k is given relative to it.
+    """
+    if not results:
+        return
+    metric_names = list(results[0][2].keys())
+    full_index = results[0][1]
+    reference = results[0][2]
+    headers = ["tier", "postings", "kept", "MiB"]
+    for name in metric_names:
+        headers.append(name)
+        if name.startswith(("MAP", "P@")):
+            headers.append(f"Δ {name}")
+    headers.append("fallbacks")
+    rows = []
+    for name, index, metrics in results:
+        postings = len(index.posting_docs)
+        row = [name, postings, postings / len(full_index.posting_docs), posting_bytes(index) / 2 ** 20]
+        for metric_name in metric_names:
+            row.append(metrics[metric_name])
+            if metric_name.startswith(("MAP", "P@")):
+                row.append(metrics[metric_name] - reference[metric_name])
+        row.append(metrics.get("fallbacks"))
+        rows.append(row)
+    print(tabulate(rows, headers, tablefmt='fancy_grid', floatfmt=".4f"))
+
+
+def main():
+    # Größen der Champion-Listen von der Kommandozeile, sonst die Raster aus config
+    champion_values = [int(value) for value in sys.argv[1:]] or champion_list_grid
+    threshold_values = [] if sys.argv[1:] else pruning_weight_threshold_grid
+
+    from vec_space_model import VectorSpaceModel
+    from evaluation_index import EvaluationIndex
+
+    # Kein Snapshot: der volle Index liegt wie die erste Stufe im Arbeitsspeicher, die Latenzen sind vergleichbar
+    vec_space_model = VectorSpaceModel(use_csr_index=True)
+    vec_space_model.open_and_read(collection_file)
+
+    evaluation_index = EvaluationIndex()
+    query_ids = list(evaluation_index.queries.keys())
+    queries = [evaluation_index.queries[key] for key in query_ids]
+    groundtruths = [evaluation_index.relevant_documents[key] for key in query_ids]
+
+    results = [("full", vec_space_model.csr_index, evaluate(vec_space_model, queries, groundtruths))]
+    configurations = [(f"r = {champions}", champions, None) for champions in champion_values] \
+        + [(f"w >= {threshold:g}", None, threshold) for threshold in threshold_values]
+    for name, champions, weight_threshold in configurations:
+        vec_space_model.build_tiered_index(champions, weight_threshold)
+        results.append((name, vec_space_model.tiered_index.pruned_index,
+                        evaluate(vec_space_model, queries, groundtruths)))
+    vec_space_model.tiered_index = None
+    print_quality_report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,12 @@
-import re
+import config  # ergänzt sys.path um das Paket ir_common
+from ir_common.tokenizer_engine import TokenizerEngine
+
 
 class Tokenizer:
-    def __init__(self):
-        pass
+    def __init__(self, query_cache_size=1024):
+        self.engine = TokenizerEngine()
+        # Eigene Engine mit Memo-Cache für (wiederholte) Anfragetexte
+        self.query_engine = TokenizerEngine(cache_size=query_cache_size)
 
     # Methode zum Aufteilen von Text in Wörter
     def tokenize(self, text):
@@ -10,7 +14,12 @@ class Tokenizer:
         Diese Methode nimmt einen Text als Eingabe, konvertiert ihn in Kleinbuchstaben,
         entfernt Sonderzeichen und Unterstriche und gibt eine Liste von Wörtern zurück.
         """
-        text = text.lower()
-        text = re.sub(r'[^\w\s\']|_', '', text)
-        text = re.sub(r"\s'|'\s", ' ', text)
-        return text.split()
+        return self.engine.tokenize(text)
+
+    def tokenize_batch(self, texts):
+        """Tokenisiert viele Texte auf einmal (gleiche Tokens wie tokenize)."""
+        return self.engine.tokenize_batch(texts)
+
+    def tokenize_query(self, text):
+        """Wie tokenize, aber mit Memo-Cache für wiederholte Anfragen."""
+        return self.query_engine.tokenize(text)
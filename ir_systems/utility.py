@@ -36,40 +36,39 @@ class Utility:
         print("------------------------------------------------\n")
 
     def calculate_retrievals(self):
-        retrievals = {}
-        for key in self.evaluation_index.queries.keys():
-            retrievals[key] = self.vec_space_model.retrieve(self.evaluation_index.queries[key])
-        return retrievals
+        # Ein Retrieval-Durchlauf für alle Anfragen, danach aus dem Run des RetrievalScorers
+        if self.retrival_scorer.run is None:
+            self.retrival_scorer.build_run(self.evaluation_index.queries)
+        return self.retrival_scorer.run.rankings
 
     def calculate_and_print_MAP(self):
         print("MAP:")
         print(self.retrival_scorer.MAP(list(self.evaluation_index.queries.values()),
                                   list(self.evaluation_index.relevant_documents.values())))
 
+    def evaluation_queries(self):
+        # Anfragetexte und Relevanzurteile in Reihenfolge der Anfrage-Ids
+        query_ids = list(self.evaluation_index.queries.keys())
+        queries = [self.evaluation_index.queries[key] for key in query_ids]
+        groundtruths = [self.evaluation_index.relevant_documents[key] for key in query_ids]
+        return query_ids, queries, groundtruths
+
     def calculate_and_print_r_precision(self):
         print("\nR-Precision:")
-        categories = []
-        values = []
-        for key in self.evaluation_index.queries.keys():
-            relevant_documents = self.evaluation_index.relevant_documents[key]
-            categories.append(str(key))
-            values.append(str(self.retrival_scorer.rPrecision(relevant_documents, self.evaluation_index.queries[key])))
+        query_ids, queries, groundtruths = self.evaluation_queries()
+        categories = [str(key) for key in query_ids]
+        values = [str(value) for value in self.retrival_scorer.r_precisions(queries, groundtruths)]
         print(tabulate([values], categories, tablefmt='fancy_grid'))
 
     def calculate_and_print_precision_recall_fscore_at_k(self, k_values):
-        retrievals = self.calculate_retrievals()
-        for k in k_values:
-            at_k_categories = ['@{}:'.format(k)]
-            precision_at_k_values = ['Precision']
-            recall_at_k_values = ['Recall']
-            fscore_at_k_values = ['F-Score']
-
-            for key in self.evaluation_index.queries.keys():
-                relevant_documents = self.evaluation_index.relevant_documents[key]
-                at_k_categories.append(key)
-                precision_at_k_values.append(str(precision(relevant_documents, retrievals[key][:k])))
-                recall_at_k_values.append(str(recall(relevant_documents, retrievals[key][:k])))
-                fscore_at_k_values.append(str(fscore(relevant_documents, retrievals[key][:k])))
+        query_ids, queries, groundtruths = self.evaluation_queries()
+        # Precision, Recall und F-Score für alle Anfragen und alle k auf einmal
+        precisions, recalls, fscores = self.retrival_scorer.precision_recall_fscore_at(queries, groundtruths, k_values)
+        for i, k in enumerate(k_values):
+            at_k_categories = ['@{}:'.format(k)] + query_ids
+            precision_at_k_values = ['Precision'] + [str(value) for value in precisions[:, i].tolist()]
+            recall_at_k_values = ['Recall'] + [str(value) for value in recalls[:, i].tolist()]
+            fscore_at_k_values = ['F-Score'] + [str(value) for value in fscores[:, i].tolist()]
 
             data = [precision_at_k_values, recall_at_k_values, fscore_at_k_values]
             print(tabulate(data, at_k_categories, tablefmt='fancy_grid'))
@@ -81,10 +80,7 @@ class Utility:
 
     def calculate_and_print_eleven_point_average_precision(self):
         print("\nEleven point average precision:")
-        categories = []
-        values = []
-        for key in self.evaluation_index.queries.keys():
-            relevant_documents = self.evaluation_index.relevant_documents[key]
-            categories.append(str(key))
-            values.append(str(self.retrival_scorer.elevenPointAP(self.evaluation_index.queries[key], relevant_documents)[0]))
+        query_ids, queries, groundtruths = self.evaluation_queries()
+        categories = [str(key) for key in query_ids]
+        values = [str(value) for value in self.retrival_scorer.eleven_point_average_precisions(queries, groundtruths)]
         print(tabulate([values], categories, tablefmt='fancy_grid'))
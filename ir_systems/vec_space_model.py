@@ -1,96 +1,218 @@
+import heapq
 import math
 
 from retrieval import InitRetrievalSystem  # Abstract class
 from tokenizer import *
-from termIndex import *
+from vocabulary import Vocabulary
 from postinglist import *
+from csr_index import CSRIndex
+from dynamic_pruning import DynamicPruningIndex
+from segments import SegmentedIndex
+from sharded_index import ShardedIndex
+from lsi_index import LSIIndex
+from static_pruning import TieredIndex
+from result_cache import ResultCache
+from scoring import TfIdfScoring
+from query_metrics import QueryMetrics
+from index_snapshot import save_snapshot, load_snapshot, SnapshotError
 from config import *
+from ir_common.cisi_reader import read_records
+from ir_common.parallel_build import run_partial_builds
+from ir_common.positional_postings import compact_postings, iter_compact_postings
+from ir_common.memory import structure_sizes
 import time
 import numpy as np
 
 
 class VectorSpaceModel(InitRetrievalSystem):
-    def __init__(self):
-        self.dictionary = {}
-        self.term_index_mapping = {}
+    def __init__(self, use_csr_index=False, use_dynamic_pruning=False, use_compact_postings=False,
+                 use_result_cache=False, scoring=None, use_query_metrics=False, use_segments=False,
+                 background_merges=False, shards=0, use_lsi=False, use_tiered_index=False):
+        # Termen werden fortlaufende Ids zugeordnet; postinglists[term_id] ist die Postingliste des Terms
+        self.vocabulary = Vocabulary()
+        self.postinglists = []
         self.doc_id_length_mapping = {}
+        self.doc_positions = {}
         self.average_doc_len = 0.0
         self.document_vector_length = {}
+        # Gewichtungsfunktion (scoring.py); Standard ist die ursprüngliche TF-IDF-Gewichtung mit config_k
+        self.scoring = scoring if scoring is not None else TfIdfScoring(config_k)
+        self.collection_file = None
+
+        # Optionaler NumPy-Index (CSR-Layout); das Dictionary bleibt der Referenzpfad
+        self.use_csr_index = use_csr_index or use_dynamic_pruning or use_lsi or use_tiered_index
+        self.csr_index = None
+
+        # Dynamisches Pruning (MaxScore mit Block-Max-Schranken) über dem CSR-Index
+        self.use_dynamic_pruning = use_dynamic_pruning
+        self.pruning_index = None
+        self.pruning_statistics = None
+
+        # Näherungsweise Suche: Kandidaten aus LSI-Einbettungen (lsi_dimensions), exakt nachbewertet
+        self.use_lsi = use_lsi
+        self.lsi_index = None
+
+        # Statisch beschnittene erste Stufe (Champion-Listen, Gewichtsschwelle) mit Rückfall auf den CSR-Index
+        self.use_tiered_index = use_tiered_index
+        self.tiered_index = None
+
+        # Postinglisten nach dem Aufbau delta- und varint-kodiert ablegen
+        self.use_compact_postings = use_compact_postings
+
+        # LRU-Cache für Anfrageergebnisse; index_version wird bei jeder Änderung des Index erhöht
+        self.result_cache = ResultCache() if use_result_cache else None
+        self.index_version = 0
+
+        # Optionale Messung der Stufen einzelner Anfragen (retrieve, retrieve_k); None = ausgeschaltet
+        self.query_metrics = QueryMetrics() if use_query_metrics else None
+
+        # Inkrementeller Index aus Segmenten (add_documents, delete_documents) statt Dictionary und CSR-Index
+        if use_segments and self.use_csr_index:
+            raise ValueError("Segmente lassen sich nicht mit CSR-Index oder dynamischem Pruning kombinieren")
+        self.segment_index = None
+        if use_segments:
+            self.segment_index = SegmentedIndex(self.scoring, background_merges=background_merges)
+            self.vocabulary = self.segment_index.vocabulary
+
+        # Verteilung der Sammlung auf so viele Worker-Prozesse (Shards); 0 = ein Index in diesem Prozess
+        if shards and (self.use_csr_index or use_segments):
+            raise ValueError("Shards lassen sich nicht mit CSR-Index, dynamischem Pruning oder Segmenten kombinieren")
+        self.shards = shards
+        self.sharded_index = None
 
         self.tokenizer = Tokenizer()
 
-    def open_and_read(self, file_path):
-        with open(file_path, "r") as file:
-            lines = file.readlines()
-            num_lines = len(lines)
+    def open_and_read(self, file_path, processes=1):
+        """
+        Reads and indexes the collection in file_path.
 
-            print(f"Öffne Datei {file_path}")
-            print(f"Datei enthält {num_lines} Zeilen.")
+        With processes > 1 the file is split at record boundaries and the ranges
+        are tokenized and indexed in a process pool; the partial indexes are
+        merged in file order, so the result is identical to the serial build.
+        This only pays off with free CPUs for the workers (see
+        benchmarks/bench_parallel_build.py); the default is the serial build.
+        With use_segments the collection is added as a new segment (see add_documents);
+        with shards it is indexed by a ShardedIndex of that many worker processes.
+        """
+        self.collection_file = file_path
+        self.index_version += 1
+        print(f"Öffne Datei {file_path}")
 
-            start_time = time.perf_counter()
-            i = 0
-            while i < num_lines:
-                if lines[i].startswith(".I"):
-                    # Hole Dokumenten-ID aus der Zeile (letztes Zeichen)
-                    doc_id = int(lines[i].split()[-1])
-                    i += 1
+        start_time = time.perf_counter()
+        if self.segment_index is not None:
+            self.add_documents(read_records(file_path))
+            elapsed_time_indexing = (time.perf_counter() - start_time) * 1e3
+            print(f"Datei enthält {self.get_document_count()} Dokumente.")
+            print("\nEinlesen und Indexierung beendet.")
+            print(f"Zeit für Einlesen und Indexierung: {elapsed_time_indexing:.2f} ms\n")
+            return
+        if self.shards:
+            if self.sharded_index is not None:
+                self.sharded_index.close()
+            self.sharded_index = ShardedIndex(file_path, self.shards, self.tokenizer, self.scoring)
+            self.vocabulary = self.sharded_index.vocabulary
+            self.average_doc_len = self.sharded_index.average_doc_len
+            elapsed_time_indexing = (time.perf_counter() - start_time) * 1e3
+            print(f"Datei enthält {self.get_document_count()} Dokumente in "
+                  f"{self.sharded_index.number_of_shards} Shards.")
+            print("\nEinlesen und Indexierung beendet.")
+            print(f"Zeit für Einlesen und Indexierung: {elapsed_time_indexing:.2f} ms\n")
+            return
+        if processes > 1:
+            self.merge_partial_indexes(run_partial_builds(file_path, build_partial_index, processes, self.tokenizer))
+            print(f"Datei mit {processes} Prozessen indexiert.")
+        else:
+            self.read_records(read_records(file_path))
 
-                    while not lines[i].startswith(".W"):
-                        i += 1
+        elapsed_time_indexing = (time.perf_counter() - start_time) * 1e3
+        start_time = time.perf_counter()
 
-                    # Zur nächsten Zeile nach einem ".W" (Beginn eines Abstract)
-                    i += 1
+        # Sort posting lists
+        for postinglist in self.postinglists:
+            postinglist.sort_postinglist()
 
-                    abstract = ""
+        elapsed_time_sorting = (time.perf_counter() - start_time) * 1e3
 
-                    # Füge alle Zeilen bis zur Referenzsektion (.X) dem Abstract hinzu
-                    while not lines[i].startswith(".X"):
-                        abstract += lines[i]
-                        i += 1
+        self.calc_avg_doc_length()
+        self.calc_document_vector_length()
 
-                    # Packe den Abstract in den Tokenizer (ohne führende und nachfolgende Leerzeichen)
-                    abstract = self.tokenizer.tokenize(abstract.strip())
+        if self.use_csr_index:
+            self.build_csr_index()
+        if self.use_compact_postings:
+            self.compact_postinglists()
 
-                    # Mapping zwischen doc_id und Länge des Abstracts
-                    self.doc_id_length_mapping[doc_id] = len(abstract)
+        # Print some file statistics
+        print("\nEinlesen und Indexierung beendet.")
+        print(f"Zeit für Einlesen und Indexierung: {elapsed_time_indexing:.2f} ms")
+        print(f"Zeit fürs Sortieren der Postinglisten: {elapsed_time_sorting:.2f} ms\n")
 
-                    for token in abstract:
+    def read_records(self, records):
+        for doc_id, fields in records:
+            # Packe den Abstract in den Tokenizer (ohne führende und nachfolgende Leerzeichen)
+            abstract = self.tokenizer.tokenize(fields[".W"].strip())
 
-                        # If there is no term index for the given token in the dictionary
-                        # create a new term index and add it
-                        try:
-                            term_index = self.term_index_mapping[token]
-                        except KeyError:
-                            term_index = TermIndex(token)
-                            self.term_index_mapping[token] = term_index
+            # Mapping zwischen doc_id und Länge des Abstracts
+            self.doc_id_length_mapping[doc_id] = len(abstract)
+            self.doc_positions[doc_id] = len(self.doc_positions)
 
-                        # Add doc_id + position for that term_index to the existing posting list
-                        # Increment occurrence counter
-                        # If there is no posting list for that term; create a new one
-                        try:
-                            self.dictionary[term_index].append(doc_id, i)
-                            term_index.occurence += 1
-                        except KeyError:
-                            self.dictionary[term_index] = Postinglist(doc_id, i, token)
+            for position, token in enumerate(abstract):
+                # Id des Terms (neue Terme bekommen die nächste freie Id), Vorkommen mitzählen
+                term_id = self.vocabulary.add(token)
 
-                i += 1
+                # Add doc_id + position to the posting list of the term; for a new term create one
+                if term_id < len(self.postinglists):
+                    self.postinglists[term_id].append(doc_id, position)
+                else:
+                    self.postinglists.append(Postinglist(doc_id, position, token))
 
-            elapsed_time_indexing = (time.perf_counter() - start_time) * 1e3
-            start_time = time.perf_counter()
+        print(f"Datei enthält {len(self.doc_id_length_mapping)} Dokumente.")
 
-            # Sort posting lists
-            for key, val in self.dictionary.items():
-                val.sort_postinglist()
+    def merge_partial_indexes(self, partial_indexes):
+        """
+        Merges (documents, postings) partial indexes of consecutive file ranges.
 
-            elapsed_time_sorting = (time.perf_counter() - start_time) * 1e3
+        Terms and documents are added in order of first appearance, as in
+        read_records; the postings of a term are appended as whole arrays (see
+        compact_postings).
+        """
+        for documents, postings in partial_indexes:
+            for doc_id, doc_length in documents:
+                self.doc_id_length_mapping[doc_id] = doc_length
+                self.doc_positions[doc_id] = len(self.doc_positions)
 
-            self.calc_avg_doc_length()
-            self.calc_document_vector_length()
+            for token, doc_ids, term_frequencies, positions in iter_compact_postings(postings):
+                term_id = self.vocabulary.add(token, len(positions))
+                if term_id == len(self.postinglists):
+                    self.postinglists.append(Postinglist(term=token))
+                self.postinglists[term_id].extend(doc_ids, term_frequencies, positions)
 
-            # Print some file statistics
-            print("\nEinlesen und Indexierung beendet.")
-            print(f"Zeit für Einlesen und Indexierung: {elapsed_time_indexing:.2f} ms")
-            print(f"Zeit fürs Sortieren der Postinglisten: {elapsed_time_sorting:.2f} ms\n")
+    def add_documents(self, records):
+        """
+        Indexes (doc_id, fields) records (as yielded by read_records) as a new segment.
+
+        A document whose id is already indexed replaces the old version and
+        moves to the end of the collection order. Requires use_segments.
+        """
+        if self.segment_index is None:
+            raise ValueError("Inkrementelles Indexieren erfordert use_segments=True")
+        records = list(records)
+        abstracts = self.tokenizer.tokenize_batch([fields[".W"].strip() for _, fields in records])
+        self.segment_index.add_documents([(doc_id, abstract) for (doc_id, _), abstract in zip(records, abstracts)])
+        self.index_version += 1
+
+    def delete_documents(self, doc_ids):
+        """Deletes documents by id (unknown ids are ignored); returns the number deleted. Requires use_segments."""
+        if self.segment_index is None:
+            raise ValueError("Inkrementelles Indexieren erfordert use_segments=True")
+        deleted = self.segment_index.delete_documents(doc_ids)
+        self.index_version += 1
+        return deleted
+
+    def force_merge(self):
+        """Merges all segments into one; the rankings then equal those of a full build of the live documents."""
+        if self.segment_index is not None:
+            self.segment_index.force_merge()
+            self.index_version += 1
 
     def calc_avg_doc_length(self):
         average_length = 0
@@ -99,61 +221,370 @@ class VectorSpaceModel(InitRetrievalSystem):
         self.average_doc_len = average_length / len(self.doc_id_length_mapping.items())
 
     def calc_document_vector_length(self):
+        # Ein Durchlauf über alle Postings: Dokumente ohne den Term tragen w = 0 nicht zur Norm bei.
+        # Die Quadratsummen werden pro Dokument in derselben Reihenfolge der Terme aufaddiert.
+        if not self.scoring.normalize:
+            # Ohne Kosinus-Normierung (z.B. BM25) haben alle Dokumente die Länge 1
+            self.document_vector_length = dict.fromkeys(self.doc_id_length_mapping.keys(), 1.0)
+            return
         number_of_documents = len(self.doc_id_length_mapping.keys())
-        for doc_id, doc_length in self.doc_id_length_mapping.items():
-            sum_wtd = 0
-            for term in self.term_index_mapping.keys():
-                query_term_posting_list = self.dictionary[self.term_index_mapping[term]]
-                try:
-                    term_frequency = len(query_term_posting_list.get_positions_in_document(doc_id))
-                except KeyError:
-                    term_frequency = 0
-                document_frequency = query_term_posting_list.get_document_frequency()
-                wtd = self.calculate_weight_of_term_in_document(doc_id, term_frequency, number_of_documents, document_frequency, config_k)
-                sum_wtd += wtd * wtd
-            self.document_vector_length[doc_id] = math.sqrt(sum_wtd)
+        sum_wtd = dict.fromkeys(self.doc_id_length_mapping.keys(), 0)
+        for query_term_posting_list in self.postinglists:
+            document_frequency = query_term_posting_list.get_document_frequency()
+            for doc_id, term_frequency in query_term_posting_list.iter_term_frequencies():
+                wtd = self.calculate_weight_of_term_in_document(doc_id, term_frequency, number_of_documents,
+                                                                document_frequency)
+                sum_wtd[doc_id] += wtd * wtd
+        for doc_id, sum_of_squares in sum_wtd.items():
+            self.document_vector_length[doc_id] = math.sqrt(sum_of_squares)
+
+    def set_scoring(self, scoring):
+        """
+        Switches to another scoring function (see scoring.py) and brings the
+        document norms (and the CSR weights, if built) up to date without
+        re-reading the collection. Dynamic pruning rebuilds its bounds and the
+        tiered index its first tier on the next query.
+        """
+        if scoring == self.scoring:
+            return
+        self.scoring = scoring
+        self.index_version += 1
+        if self.segment_index is not None:
+            self.segment_index.set_scoring(scoring)
+        if self.sharded_index is not None:
+            self.sharded_index.reweight(scoring)
+        self.calc_document_vector_length()
+        if self.csr_index is not None:
+            self.csr_index.reweight(scoring)
+            if self.use_lsi:
+                self.build_lsi_index()
+
+    def set_weighting_parameter(self, k):
+        """Switches to the original TF-IDF weighting with the weighting parameter k."""
+        self.set_scoring(TfIdfScoring(k))
+
+    def compact_postinglists(self, compression="varint"):
+        """Replaces every Postinglist by a read-only CompactPostinglist."""
+        start_time = time.perf_counter()
+        store = CompactPostingStore(self.postinglists, compression)
+        self.postinglists = store.postinglists(self.vocabulary.terms)
+        elapsed_time = (time.perf_counter() - start_time) * 1e3
+        print(f"Zeit für das Komprimieren der Postinglisten: {elapsed_time:.2f} ms")
+
+    def build_csr_index(self):
+        start_time = time.perf_counter()
+        self.csr_index = CSRIndex.from_model(self, self.scoring)
+        elapsed_time = (time.perf_counter() - start_time) * 1e3
+        print(f"Zeit für den Aufbau des CSR-Index: {elapsed_time:.2f} ms")
+        if self.use_dynamic_pruning:
+            self.pruning_index = DynamicPruningIndex(self.csr_index)
+        if self.use_lsi:
+            self.build_lsi_index()
+        if self.use_tiered_index:
+            self.build_tiered_index()
+
+    def build_lsi_index(self):
+        self.lsi_index = LSIIndex(self.csr_index, lsi_dimensions)
+        print(f"Zeit für den Aufbau des LSI-Index ({self.lsi_index.dimensions} Dimensionen): "
+              f"{self.lsi_index.build_seconds * 1e3:.2f} ms")
+
+    def build_tiered_index(self, champions=champion_list_size, weight_threshold=pruning_weight_threshold):
+        """Builds the pruned first tier over the CSR index (see TieredIndex); queries use it from now on."""
+        self.tiered_index = TieredIndex(self.csr_index, champions, weight_threshold)
+        self.index_version += 1
+        print(f"Zeit für den Aufbau der ersten Stufe ({self.tiered_index.kept_fraction:.1%} der Postings): "
+              f"{self.tiered_index.build_seconds * 1e3:.2f} ms")
+
+    def save_snapshot(self, file_path):
+        """Writes the CSR index (built if necessary) to a memory-mappable snapshot file."""
+        if self.segment_index is not None or self.shards:
+            raise ValueError("Ein Index aus Segmenten oder Shards kann nicht als Snapshot gespeichert werden")
+        if self.csr_index is None:
+            self.build_csr_index()
+        save_snapshot(self.csr_index, file_path, self.collection_file, self.tokenizer)
+
+    def load_snapshot(self, file_path, collection_file):
+        """
+        Loads the CSR index from a snapshot instead of reading the collection.
+
+        The dictionary-based reference path stays empty; queries are answered
+        from the memory-mapped arrays, and the vocabulary is the one of the
+        snapshot. The model keeps its scoring function: if the snapshot was
+        written with another one (or other parameters, e.g. another config_k),
+        the weights and norms are recomputed from the mapped term frequencies.
+        Raises SnapshotError (StaleSnapshotError if the snapshot does not match
+        collection_file or the tokenizer).
+        """
+        start_time = time.perf_counter()
+        self.csr_index = load_snapshot(file_path, collection_file, self.tokenizer)
+        if self.csr_index.scoring != self.scoring:
+            # Gewichte des Snapshots gehören zu einer anderen Gewichtung: im Arbeitsspeicher neu berechnen
+            print(f"Snapshot wurde mit {self.csr_index.scoring!r} gespeichert, "
+                  f"Gewichte werden mit {self.scoring!r} neu berechnet")
+            self.csr_index.reweight(self.scoring)
+        self.vocabulary = self.csr_index.term_rows
+        self.postinglists = []
+        self.index_version += 1
+        self.collection_file = collection_file
+        self.average_doc_len = self.csr_index.average_doc_len
+        if self.use_dynamic_pruning:
+            self.pruning_index = DynamicPruningIndex(self.csr_index)
+        if self.use_lsi:
+            self.build_lsi_index()
+        if self.use_tiered_index:
+            self.build_tiered_index()
+        elapsed_time = (time.perf_counter() - start_time) * 1e3
+        print(f"Snapshot {file_path} geladen: {elapsed_time:.2f} ms")
+
+    def get_document_count(self):
+        if self.segment_index is not None:
+            return self.segment_index.number_of_documents
+        if self.sharded_index is not None:
+            return self.sharded_index.number_of_documents
+        if self.csr_index is not None:
+            return self.csr_index.number_of_documents
+        return len(self.doc_id_length_mapping.keys())
+
+    def memory_report(self):
+        """
+        Bytes of the in-memory index by structure.
+
+        vocabulary, postings (doc ids and term frequencies), positions and
+        documents (lengths, norms, positions in file order) are the structures
+        of the dictionary-based reference path, or of the compact posting
+        store. Optional indexes follow with one entry each: CSR index, dynamic
+        pruning, LSI, tiered index, segments, shards (the indexes of the worker processes)
+        and result cache. Objects shared by several structures are counted
+        once; arrays memory-mapped from a snapshot count with their header only.
+        """
+        positions = []
+        for postinglist in self.postinglists:
+            if isinstance(postinglist, Postinglist):
+                positions.append(postinglist.positions)
+        if self.postinglists and isinstance(self.postinglists[0], CompactPostinglist):
+            store = self.postinglists[0].store
+            positions.extend((store.position_stream, store.position_block_offsets))
+
+        # Positionen zuerst, damit sie nicht über die Postinglisten den Postings zugerechnet werden
+        structures = [("positions", positions),
+                      ("vocabulary", [self.vocabulary]),
+                      ("postings", [self.postinglists]),
+                      ("documents", [self.doc_id_length_mapping, self.doc_positions, self.document_vector_length])]
+        for name, index in (("csr index", self.csr_index), ("dynamic pruning", self.pruning_index),
+                            ("lsi", self.lsi_index), ("tiered index", self.tiered_index),
+                            ("segments", self.segment_index),
+                            ("result cache", self.result_cache)):
+            if index is not None:
+                structures.append((name, [index]))
+        sizes = structure_sizes(structures)
+
+        report = {name: sizes.pop(name) for name in ("vocabulary", "postings", "positions", "documents")}
+        report.update(sizes)
+        if self.sharded_index is not None:
+            report["shards"] = self.sharded_index.memory_bytes()
+        return report
+
+    def enable_query_metrics(self):
+        """Starts (or restarts) the per-stage instrumentation of retrieve and retrieve_k."""
+        self.query_metrics = QueryMetrics()
+
+    def disable_query_metrics(self):
+        self.query_metrics = None
+
+    def query_stats(self):
+        """Returns the collected query metrics (see QueryMetrics.stats), or None if disabled."""
+        if self.query_metrics is None:
+            return None
+        return self.query_metrics.stats()
+
+    def query_term_ids(self, query, trace=None):
+        """Tokenizes a query and returns the ids of its known terms (in query order, duplicates kept)."""
+        tokens = self.tokenizer.tokenize_query(query)
+        if trace is not None:
+            trace.lap("tokenize")
+        term_ids = self.vocabulary.ids(tokens)
+        if trace is not None:
+            trace.lap("lookup")
+        return term_ids
 
     def retrieve(self, query):
-        query_terms = self.tokenizer.tokenize(query)
-        return self.fast_cosine_scores(query_terms, len(self.doc_id_length_mapping.keys()))
+        return self.retrieve_k(query, self.get_document_count())
 
     def retrieve_k(self, query, k):
-        query_terms = self.tokenizer.tokenize(query)
-        return self.fast_cosine_scores(query_terms, k)
+        if self.query_metrics is None:
+            return self.cached_cosine_scores(self.query_term_ids(query), k)
+        trace = self.query_metrics.trace()
+        result = self.cached_cosine_scores(self.query_term_ids(query, trace), k, trace)
+        trace.finish(len(result))
+        return result
+
+    def retrieve_many(self, queries, k=None):
+        """
+        Retrieves the k best documents (all documents for k=None) for a batch of queries.
+
+        With the CSR index the whole batch is scored with one sparse matrix
+        product; otherwise the queries are processed one at a time. With the
+        result cache only the cache misses are scored.
+        """
+        if k is None:
+            k = self.get_document_count()
+        queries_term_ids = [self.query_term_ids(query) for query in queries]
+        if self.result_cache is None:
+            return self.score_batch(queries_term_ids, k)
+
+        results = []
+        misses = []
+        for term_ids in queries_term_ids:
+            key = ResultCache.make_key(term_ids, self.scoring.key)
+            results.append(self.result_cache.get(key, k, self.index_version))
+            if results[-1] is None:
+                misses.append((len(results) - 1, key))
+        for (i, key), result in zip(misses, self.score_batch([list(key[0]) for _, key in misses], k)):
+            self.result_cache.put(key, k, result, self.index_version)
+            results[i] = result
+        return results
+
+    def retrieve_many_with_scores(self, queries, k=None):
+        """
+        Like retrieve_many, but returns lists of (doc_id, cosine score) pairs.
+
+        The result cache is bypassed (it stores no scores); the rankings equal
+        those of retrieve_many without the cache.
+        """
+        if k is None:
+            k = self.get_document_count()
+        return self.score_batch([self.query_term_ids(query) for query in queries], k, with_scores=True)
+
+    def score_batch(self, queries_term_ids, k, with_scores=False):
+        if self.sharded_index is not None:
+            return self.sharded_index.rank_many_rows(queries_term_ids, k, with_scores)
+        if self.lsi_index is not None:
+            return self.lsi_index.rank_many_rows(queries_term_ids, k, with_scores)
+        if self.tiered_index is not None:
+            return self.tiered_index.rank_many_rows(queries_term_ids, k, with_scores)
+        if self.csr_index is not None:
+            return self.csr_index.rank_many_rows(queries_term_ids, k, with_scores)
+        return [self.fast_cosine_scores(term_ids, k, with_scores) for term_ids in queries_term_ids]
+
+    def cached_cosine_scores(self, term_ids, k, trace=None):
+        """
+        fast_cosine_scores behind the result cache (if enabled).
+
+        With the cache, queries are scored with their term ids in sorted order,
+        so the result depends only on the cache key and not on the (floating
+        point) summation order of the original term order.
+        """
+        if self.result_cache is None:
+            return self.fast_cosine_scores(term_ids, k, trace=trace)
+        key = ResultCache.make_key(term_ids, self.scoring.key)
+        result = self.result_cache.get(key, k, self.index_version)
+        if trace is not None:
+            trace.lap("cache")
+            trace.count(cache_hits=int(result is not None), cache_misses=int(result is None))
+        if result is None:
+            result = self.fast_cosine_scores(list(key[0]), k, trace=trace)
+            self.result_cache.put(key, k, result, self.index_version)
+        return result
+
+    def fast_cosine_scores(self, term_ids, k, with_scores=False, trace=None):
+        """
+        Returns the ids of the k best documents for a query given as term ids (see query_term_ids).
+
+        With with_scores, (doc_id, cosine score) pairs are returned instead. A
+        QueryTrace (see query_metrics) records the time of every stage.
+        """
+        if self.segment_index is not None:
+            return self.segment_index.rank_rows(term_ids, k, with_scores, trace)
+        if self.sharded_index is not None:
+            return self.sharded_index.rank_many_rows([term_ids], k, with_scores, trace)[0]
+        if self.lsi_index is not None:
+            return self.lsi_index.rank_rows(term_ids, k, with_scores, trace)
+        if self.tiered_index is not None:
+            return self.tiered_index.rank_rows(term_ids, k, with_scores, trace)
+        if with_scores and self.csr_index is not None:
+            return self.csr_index.rank_rows(term_ids, k, with_scores, trace)
+        if self.pruning_index is not None:
+            # Statistik der letzten Anfrage (übersprungene Postings) in self.pruning_statistics
+            top_k, self.pruning_statistics = self.pruning_index.rank_rows(term_ids, k)
+            if trace is not None:
+                trace.lap("accumulate")
+                trace.count(postings_scanned=self.pruning_statistics.postings_scored,
+                            postings_skipped=self.pruning_statistics.postings_skipped,
+                            accumulators_touched=self.pruning_statistics.candidates)
+            return top_k
+        if self.csr_index is not None:
+            return self.csr_index.rank_rows(term_ids, k, trace=trace)
 
-    def fast_cosine_scores(self, query_terms, k):
         number_of_documents = len(self.doc_id_length_mapping.keys())
+        # Nur Dokumente aus den Postinglisten bekommen einen Akkumulator
         scores = {}
-        for doc_id in self.doc_id_length_mapping.keys():
-            scores[doc_id] = 0
         # for each query term t
-        for query_term in query_terms:
-            # do fetch posting list for t
-            try:
-                query_term_posting_list = self.dictionary[self.term_index_mapping[query_term]]
-            except KeyError:
-                # print("Term {} is not known. It will be ignored in the query.".format(query_term))
-                continue
+        for term_id in term_ids:
+            # do fetch posting list for t (unknown terms have no id and are ignored)
+            query_term_posting_list = self.postinglists[term_id]
             document_frequency = query_term_posting_list.get_document_frequency()
             # for each pair(d, tf(t,d)) in postinglist
-            for doc_id in query_term_posting_list.get_postinglist():
-                term_frequency = len(query_term_posting_list.get_positions_in_document(doc_id))
+            for doc_id, term_frequency in query_term_posting_list.iter_term_frequencies():
                 # do Scored[d] += w(t,d)
                 try:
                     scores[doc_id] += self.calculate_weight_of_term_in_document(
-                        doc_id, term_frequency, number_of_documents, document_frequency, config_k)
+                        doc_id, term_frequency, number_of_documents, document_frequency)
                 except KeyError:
                     scores[doc_id] = self.calculate_weight_of_term_in_document(
-                        doc_id, term_frequency, number_of_documents, document_frequency, config_k)
+                        doc_id, term_frequency, number_of_documents, document_frequency)
+        if trace is not None:
+            trace.lap("accumulate")
+            trace.count(postings_scanned=sum(self.postinglists[term_id].get_document_frequency()
+                                             for term_id in term_ids),
+                        accumulators_touched=len(scores))
         # for each d
         for doc_id in scores.keys():
             # do Scored[d] = Scored[d] / Length[d]
             scores[doc_id] = scores[doc_id] / self.document_vector_length[doc_id]
-        sorted_scores = dict(sorted(scores.items(), key=lambda item: item[1], reverse=True))
+        if trace is not None:
+            trace.lap("normalize")
         # return components of Scores[]
-        return list(sorted_scores.keys())[:k]
+        result = self.select_top_k(scores, k, with_scores)
+        if trace is not None:
+            trace.lap("select")
+        return result
+
+    def select_top_k(self, scores, k, with_scores=False):
+        """
+        Selects the k best documents from the accumulators with a bounded heap.
+
+        Equal scores are ordered by position in the collection file, which is the
+        order the former stable sort over all documents produced. Documents
+        without a positive score are only appended (in file order) if fewer than
+        k documents scored. With with_scores, (doc_id, score) pairs are returned.
+        """
+        top_k = heapq.nsmallest(k, ((-score, self.doc_positions[doc_id], doc_id)
+                                    for doc_id, score in scores.items() if score > 0))
+        result = [doc_id for _, _, doc_id in top_k]
+        if len(result) < k:
+            ranked = set(result)
+            for doc_id in self.doc_id_length_mapping.keys():
+                if len(result) >= k:
+                    break
+                if doc_id not in ranked:
+                    result.append(doc_id)
+        if with_scores:
+            return [(doc_id, scores.get(doc_id, 0.0)) for doc_id in result]
+        return result
+
+    def calculate_weight_of_term_in_document(self, doc_id, term_frequency, number_of_documents, document_frequency):
+        return self.scoring.weight(term_frequency, self.doc_id_length_mapping[doc_id] / self.average_doc_len,
+                                   document_frequency, number_of_documents)
+
+
+def build_partial_index(records, tokenizer):
+    """
+    Indexes the records of one file range (worker of VectorSpaceModel.open_and_read).
 
-    def calculate_weight_of_term_in_document(self, doc_id, term_frequency, number_of_documents, document_frequency, k):
-        return term_frequency / \
-               (term_frequency + k * (self.doc_id_length_mapping[doc_id] /
-                                      self.average_doc_len)) * np.log(number_of_documents/document_frequency)
+    Returns the (doc_id, length) pairs in file order and the postings of the
+    range as flat arrays (see compact_postings).
+    """
+    records = list(records)
+    abstracts = tokenizer.tokenize_batch([fields[".W"].strip() for _, fields in records])
+    documents = [(doc_id, len(abstract)) for (doc_id, _), abstract in zip(records, abstracts)]
+    return documents, compact_postings(zip((doc_id for doc_id, _ in records), abstracts))
@@ -0,0 +1,62 @@
+from collections.abc import Mapping
+
+
+class BaseVocabulary(Mapping):
+    """Read-only term -> term id mapping; ids are dense (0 .. len - 1) and index all per-term arrays."""
+
+    def ids(self, terms):
+        """Returns the ids of all known terms in query order (unknown terms are dropped, duplicates kept)."""
+        term_ids = []
+        for term in terms:
+            try:
+                term_ids.append(self[term])
+            except KeyError:
+                pass
+        return term_ids
+
+
+class Vocabulary(BaseVocabulary):
+    """
+    Interns terms to dense integer ids in order of first appearance.
+
+    Attributes
+    ----------
+    term_ids : dict
+        Maps a term to its id.
+    terms : list
+        The term of every id.
+    occurences : list
+        Number of occurrences of every term in the collection.
+    """
+
+    def __init__(self):
+        self.term_ids = {}
+        self.terms = []
+        self.occurences = []
+
+    def add(self, term, occurences=1):
+        """Returns the id of term (a new id for an unknown term) and counts its occurrences."""
+        try:
+            term_id = self.term_ids[term]
+        except KeyError:
+            term_id = len(self.terms)
+            self.term_ids[term] = term_id
+            self.terms.append(term)
+            self.occurences.append(0)
+        self.occurences[term_id] += occurences
+        return term_id
+
+    def term(self, term_id):
+        return self.terms[term_id]
+
+    def __getitem__(self, term):
+        return self.term_ids[term]
+
+    def __contains__(self, term):
+        return term in self.term_ids
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __iter__(self):
+        return iter(self.terms)
@@ -0,0 +1,89 @@
+import contextlib
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ir_systems"))
+
+from index_snapshot import SNAPSHOT_MAGIC, SnapshotError, load_snapshot, read_header
+from vec_space_model import VectorSpaceModel
+
+COLLECTION = """.I 1
+.T
+Dewey Decimal Classification
+.W
+A history of the Dewey Decimal Classification.
+.X
+.I 2
+.T
+Library catalogues
+.W
+Catalogues of university libraries and their use.
+.X
+.I 3
+.T
+Information retrieval
+.W
+Retrieval of information from library catalogues.
+.X
+"""
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    collection_file = str(tmp_path / "collection.all")
+    with open(collection_file, "w") as file:
+        file.write(COLLECTION)
+    model = VectorSpaceModel(use_csr_index=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.open_and_read(collection_file)
+    snapshot_file = str(tmp_path / "index.snapshot")
+    model.save_snapshot(snapshot_file)
+    return snapshot_file, collection_file, model.tokenizer
+
+
+def write_header(file_path, encoded_header):
+    with open(file_path, "wb") as file:
+        file.write(SNAPSHOT_MAGIC)
+        file.write(len(encoded_header).to_bytes(8, "little"))
+        file.write(encoded_header)
+
+
+def test_snapshot_round_trip(snapshot):
+    snapshot_file, collection_file, tokenizer = snapshot
+    index = load_snapshot(snapshot_file, collection_file, tokenizer)
+    assert index.doc_ids.tolist() == [1, 2, 3]
+
+
+@pytest.mark.parametrize("encoded_header", [b'{"version": 2', b"\xff\xfe", b"[2]", b'{"version": 2}'])
+def test_corrupt_header_raises_snapshot_error(tmp_path, encoded_header):
+    snapshot_file = str(tmp_path / "index.snapshot")
+    write_header(snapshot_file, encoded_header)
+    with pytest.raises(SnapshotError):
+        read_header(snapshot_file)
+
+
+def test_truncated_snapshot_raises_snapshot_error(snapshot):
+    snapshot_file, collection_file, tokenizer = snapshot
+    header = read_header(snapshot_file)
+    with open(snapshot_file, "r+b") as file:
+        file.truncate(header["arrays"]["posting_weights"]["offset"])
+    with pytest.raises(SnapshotError):
+        load_snapshot(snapshot_file, collection_file, tokenizer)
+
+
+def test_bad_array_offset_raises_snapshot_error(snapshot):
+    snapshot_file, collection_file, tokenizer = snapshot
+    header = read_header(snapshot_file)
+    header["arrays"]["doc_ids"]["offset"] = os.path.getsize(snapshot_file)
+    # Kompakt geschrieben und mit Leerzeichen aufgefüllt bleibt der Header so lang wie vorher
+    with open(snapshot_file, "r+b") as file:
+        file.seek(len(SNAPSHOT_MAGIC))
+        header_length = int.from_bytes(file.read(8), "little")
+        encoded_header = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        file.write(encoded_header.ljust(header_length))
+    with pytest.raises(SnapshotError):
+        load_snapshot(snapshot_file, collection_file, tokenizer)
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import matplotlib
+import pytest
+
+matplotlib.use("Agg")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ir_systems"))
+
+from retrieval import InitRetrievalSystem
+from retrieval_metrics import RetrievalScorer
+
+
+class FixedRankingSystem(InitRetrievalSystem):
+    """Returns the same ranking of five documents for every query."""
+
+    def __init__(self):
+        super().__init__([1, 2, 3, 4, 5])
+
+    def retrieve(self, query):
+        return [3, 1, 5, 2, 4]
+
+    def retrieve_k(self, query, k):
+        return self.retrieve(query)[:k]
+
+
+QUERIES = ["information retrieval", "library catalogues"]
+GROUNDTRUTHS = [[3, 2], [1, 4, 5]]
+
+
+def scores(scorer):
+    return (
+        [scorer.rPrecision(y_true, query) for query, y_true in zip(QUERIES, GROUNDTRUTHS)],
+        [scorer.elevenPointAP(query, y_true)[0] for query, y_true in zip(QUERIES, GROUNDTRUTHS)],
+        [scorer.precision_at_k(query, y_true, 2) for query, y_true in zip(QUERIES, GROUNDTRUTHS)],
+        [scorer.recall_at_k(query, y_true, 2) for query, y_true in zip(QUERIES, GROUNDTRUTHS)],
+        [scorer.fscore_at_k(query, y_true, 2) for query, y_true in zip(QUERIES, GROUNDTRUTHS)],
+        scorer.MAP(QUERIES, GROUNDTRUTHS),
+    )
+
+
+def test_metrics_without_build_run():
+    scorer = RetrievalScorer(FixedRankingSystem())
+    r_precisions, _, precisions, recalls, _, _ = scores(scorer)
+    assert r_precisions == [0.5, pytest.approx(2 / 3)]
+    assert precisions == [0.5, 0.5]
+    assert recalls == [0.5, pytest.approx(1 / 3)]
+
+
+def test_metrics_from_run_equal_metrics_without_run():
+    without_run = scores(RetrievalScorer(FixedRankingSystem()))
+    scorer = RetrievalScorer(FixedRankingSystem())
+    scorer.build_run(dict(enumerate(QUERIES)))
+    assert scores(scorer) == without_run